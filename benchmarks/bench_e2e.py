@@ -0,0 +1,284 @@
+"""End-to-end benchmark for gitai and the releaser, against the offline mock provider.
+
+Builds synthetic repositories with diffs of different sizes (and commit ranges
+of different lengths for the releaser), runs gitai's main() and
+releaser.main() in child processes pointed at benchmarks/mock_provider.py via
+PROVIDER_BASE_URL, and reports for every scenario:
+
+  * wall time of the whole process
+  * the phase breakdown recorded by gitai (git status, git diff, generate message...)
+  * peak RSS of the child process
+  * requests and prompt tokens received by the mock provider
+
+No API key or network access is needed.
+
+Usage:
+    python benchmarks/bench_e2e.py [--runs 3] [--scenarios small,large,release-3000]
+                                   [--provider openai] [--latency 0.3] [--tokens-per-second 200]
+                                   [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GITAI_DIR = os.path.join(ROOT_DIR, 'src', 'gitai')
+RELEASER_SCRIPT = os.path.join(GITAI_DIR, 'releaser.py')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_provider import start_mock_provider  # noqa: E402
+
+# name: (changed files, changed lines per file, include a lockfile)
+DIFF_SCENARIOS = {
+    'small': (1, 20, False),
+    'medium': (40, 50, False),
+    'large': (600, 80, True),
+}
+
+# name: (commits in the range, share of Conventional Commit subjects)
+RELEASE_SCENARIOS = {
+    'release-300': (300, 0.8),
+    'release-3000': (3000, 0.8),
+}
+
+# Runs gitai.main() in the child and saves its phase timings, which only exist inside that process
+GITAI_RUNNER = """
+import json, sys, time
+sys.path.insert(0, {gitai_dir!r})
+started = time.perf_counter()
+import gitai
+exit_code = 0
+try:
+    gitai.main([{repo!r}, 'benchmark run', '--no-cache', '--no-stream'])
+except SystemExit as e:
+    exit_code = e.code or 0
+phases = {{}}
+for span in gitai.trace_spans.get():
+    if span.category == 'phase':
+        phases[span.name] = phases.get(span.name, 0) + span.end - span.start
+with open({result_path!r}, 'w') as file:
+    json.dump({{'exit': exit_code, 'phases': phases, 'in_process': time.perf_counter() - started}}, file)
+"""
+
+GIT_IDENTITY = {
+    'GIT_AUTHOR_NAME': 'bench', 'GIT_AUTHOR_EMAIL': 'bench@example.com',
+    'GIT_COMMITTER_NAME': 'bench', 'GIT_COMMITTER_EMAIL': 'bench@example.com',
+}
+
+
+def git(args, cwd, env=None):
+    subprocess.run(['git', *args], cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+
+
+def source_lines(file_index, count, version):
+    return ''.join(f'def function_{file_index}_{line}(value):\n    return value * {line + version}\n\n'
+                   for line in range(count))
+
+
+def create_diff_repository(base_dir, files, lines, lockfile, env):
+    """Create a clone with a pushed baseline, then modify files (and a lockfile) without committing."""
+    remote = os.path.join(base_dir, 'remote.git')
+    work = os.path.join(base_dir, 'work')
+    git(['init', '--bare', '-q', remote], base_dir, env)
+    git(['clone', '-q', remote, work], base_dir, env)
+    os.makedirs(os.path.join(work, 'src'))
+    with open(os.path.join(work, 'pyproject.toml'), 'w', encoding='utf-8') as file:
+        file.write('[project]\nname = "bench"\n')
+    for index in range(files):
+        with open(os.path.join(work, 'src', f'module_{index}.py'), 'w', encoding='utf-8') as file:
+            file.write(source_lines(index, lines, 0))
+    if lockfile:
+        with open(os.path.join(work, 'poetry.lock'), 'w', encoding='utf-8') as file:
+            file.writelines(f'[[package]]\nname = "dep{index}"\nversion = "1.0.{index}"\n\n' for index in range(5000))
+    git(['add', '.'], work, env)
+    git(['commit', '-q', '-m', 'baseline'], work, env)
+    git(['push', '-q', 'origin', 'HEAD'], work, env)
+
+    for index in range(files):
+        with open(os.path.join(work, 'src', f'module_{index}.py'), 'w', encoding='utf-8') as file:
+            file.write(source_lines(index, lines, 1))
+    if lockfile:
+        with open(os.path.join(work, 'poetry.lock'), 'w', encoding='utf-8') as file:
+            file.writelines(f'[[package]]\nname = "dep{index}"\nversion = "2.0.{index}"\n\n' for index in range(5000))
+    return work
+
+
+def create_release_repository(base_dir, commits, conventional_share, env):
+    """Create a repository with a tag followed by a range of commits, written with git fast-import."""
+    work = os.path.join(base_dir, 'release')
+    git(['init', '-q', work], base_dir, env)
+    git(['commit', '-q', '--allow-empty', '-m', 'chore: initial commit'], work, env)
+    git(['tag', 'v1.0.0'], work, env)
+
+    types = ['feat', 'fix', 'docs', 'chore', 'refactor']
+    conventional_every = max(1, round(1 / (1 - conventional_share))) if conventional_share < 1 else 0
+    stream = []
+    for index in range(commits):
+        if conventional_every and index % conventional_every == 0:
+            subject = f'Update component {index} after review'
+        else:
+            subject = f'{types[index % len(types)]}(module{index % 12}): change number {index} in the component'
+        message = subject.encode('utf-8')
+        stream.append(b'commit refs/heads/main\n'
+                      b'committer bench <bench@example.com> 1700000000 +0000\n'
+                      + f'data {len(message)}\n'.encode() + message + b'\n'
+                      + (b'from refs/heads/main^0\n' if index == 0 else b'') + b'\n')
+    git(['branch', '-M', 'main'], work, env)
+    subprocess.run(['git', 'fast-import', '--quiet'], cwd=work, env=env, input=b''.join(stream), check=True)
+    git(['reset', '-q', '--hard', 'main'], work, env)
+    return work
+
+
+def run_child(command, cwd, env):
+    """Run a child process and return its wall time and peak RSS in MB."""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return wall, peak_rss, process.returncode
+
+
+def benchmark_env(args, mock, home):
+    env = dict(os.environ)
+    env.update(GIT_IDENTITY)
+    base_url = mock.url + '/v1' if args.provider == 'openai' else mock.url
+    env.update({
+        'PROVIDER': args.provider,
+        'MODEL': 'mock-model',
+        'API_KEY': 'benchmark',
+        'LANGUAGE': 'en',
+        'PROVIDER_BASE_URL': base_url,
+        'GITAI_NO_DAEMON': '1',
+        # Keep latency histograms and other state of the benchmark out of the real home directory
+        'HOME': home,
+    })
+    return env
+
+
+def read_stats(mock):
+    stats = mock.stats.snapshot()
+    mock.stats.reset()
+    return stats
+
+
+def run_diff_scenario(name, args, mock, env):
+    files, lines, lockfile = DIFF_SCENARIOS[name]
+    samples = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory(prefix='gitai-e2e-') as base_dir:
+            repo = create_diff_repository(base_dir, files, lines, lockfile, env)
+            result_path = os.path.join(base_dir, 'result.json')
+            runner = GITAI_RUNNER.format(gitai_dir=GITAI_DIR, repo=repo, result_path=result_path)
+            read_stats(mock)
+            wall, peak_rss, returncode = run_child([sys.executable, '-c', runner], base_dir, env)
+            stats = read_stats(mock)
+            with open(result_path, encoding='utf-8') as file:
+                result = json.load(file)
+            if returncode or result['exit']:
+                print(f'  {name}: gitai exited with status {returncode or result["exit"]}')
+            samples.append({'wall': wall, 'peak_rss_mb': peak_rss, 'phases': result['phases'],
+                            'requests': stats['requests'], 'prompt_tokens': stats['prompt_tokens']})
+    return samples
+
+
+def run_release_scenario(name, args, mock, env):
+    commits, conventional_share = RELEASE_SCENARIOS[name]
+    samples = []
+    with tempfile.TemporaryDirectory(prefix='gitai-e2e-release-') as base_dir:
+        repo = create_release_repository(base_dir, commits, conventional_share, env)
+        for _ in range(args.runs):
+            read_stats(mock)
+            wall, peak_rss, returncode = run_child([sys.executable, RELEASER_SCRIPT, 'v1.0.0', 'v2.0.0'], repo, env)
+            stats = read_stats(mock)
+            if returncode:
+                print(f'  {name}: releaser exited with status {returncode}')
+            samples.append({'wall': wall, 'peak_rss_mb': peak_rss, 'phases': {},
+                            'requests': stats['requests'], 'prompt_tokens': stats['prompt_tokens']})
+    return samples
+
+
+def summarize(samples):
+    phases = {}
+    for sample in samples:
+        for phase, seconds in sample['phases'].items():
+            phases.setdefault(phase, []).append(seconds)
+    return {
+        'wall_median': statistics.median(sample['wall'] for sample in samples),
+        'wall_max': max(sample['wall'] for sample in samples),
+        'peak_rss_mb': max(sample['peak_rss_mb'] for sample in samples),
+        'requests': statistics.median(sample['requests'] for sample in samples),
+        'prompt_tokens': statistics.median(sample['prompt_tokens'] for sample in samples),
+        'phases': {phase: statistics.median(values) for phase, values in phases.items()},
+    }
+
+
+def report(results):
+    print(f"\n{'Scenario':<14}{'wall median':>13}{'wall max':>11}{'peak RSS':>11}{'requests':>10}{'prompt tokens':>15}")
+    for name, summary in results.items():
+        print(f"{name:<14}{summary['wall_median']:>12.2f}s{summary['wall_max']:>10.2f}s"
+              f"{summary['peak_rss_mb']:>8.1f} MB{summary['requests']:>10g}{summary['prompt_tokens']:>15g}")
+    for name, summary in results.items():
+        if summary['phases']:
+            print(f'\n{name} phases (median):')
+            for phase, seconds in sorted(summary['phases'].items(), key=lambda item: -item[1]):
+                print(f'  {phase:<24}{seconds:>8.3f}s')
+
+
+def main():
+    scenarios = list(DIFF_SCENARIOS) + list(RELEASE_SCENARIOS)
+    parser = argparse.ArgumentParser(description='Benchmark gitai and the releaser end to end against a mock provider.')
+    parser.add_argument('--runs', type=int, default=3, help='Number of runs for each scenario.')
+    parser.add_argument('--scenarios', type=str, default=','.join(scenarios),
+                        help=f"Comma-separated scenarios to run (default: {','.join(scenarios)}).")
+    parser.add_argument('--provider', type=str, default='openai', choices=['openai', 'groq', 'anthropic'],
+                        help='Wire format used by gitai and the mock provider.')
+    parser.add_argument('--latency', type=float, default=0.3, help='Mock provider latency before the first byte.')
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help='Mock provider throughput.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of mock requests that fail.')
+    parser.add_argument('--json', type=str, default=None, dest='json_path', help='Write the results to this file.')
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    mock = start_mock_provider(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                               error_rate=args.error_rate, seed=0)
+    print(f'Mock provider ({args.provider} format) at {mock.url} - latency {args.latency}s, '
+          f'{args.tokens_per_second:g} tokens/s, error rate {args.error_rate:g}')
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='gitai-e2e-home-') as home:
+        env = benchmark_env(args, mock, home)
+        for name in selected:
+            print(f'Running {name} ({args.runs} runs)...')
+            if name in DIFF_SCENARIOS:
+                samples = run_diff_scenario(name, args, mock, env)
+            else:
+                samples = run_release_scenario(name, args, mock, env)
+            results[name] = summarize(samples)
+    mock.shutdown()
+
+    print(f"\nPython {sys.version.split()[0]} - provider format {args.provider}")
+    report(results)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as file:
+            json.dump({'provider': args.provider, 'latency': args.latency,
+                       'tokens_per_second': args.tokens_per_second, 'runs': args.runs, 'results': results},
+                      file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Language detection benchmark for gitai.
+
+Builds a synthetic repository tree (1M files by default) where most files live
+in dependency and build directories, the way real JavaScript/Python projects
+look, and compares:
+
+  * legacy   - the former detector's unpruned os.walk fallback, which returns
+               the first matching file (and walks everything when none matches)
+  * cold     - detect_project_language with an empty cache
+  * cached   - detect_project_language again, served from .git/gitai
+
+Creating a million files takes a while; use --files to benchmark smaller trees
+and --keep to reuse a tree between runs.
+
+Usage:
+    python benchmarks/bench_language_detection.py [--files 1000000] [--tree DIR] [--keep]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src', 'gitai'))
+
+import gitai  # noqa: E402
+
+# Share of the files created in each area of the synthetic tree
+TREE_LAYOUT = [
+    ('node_modules', 0.80, ['.js', '.json', '.md', '.ts']),
+    ('build', 0.10, ['.js', '.map', '.css']),
+    ('src', 0.08, ['.go']),
+    ('docs', 0.02, ['.md']),
+]
+FILES_PER_DIR = 200
+
+
+def create_tree(base_dir, total_files):
+    """Create a git repository whose own code is Go, buried under dependency and build output.
+
+    There is no manifest in the root, so the former detector falls back to its os.walk.
+    """
+    subprocess.run(['git', 'init', '-q', base_dir], check=True)
+    with open(os.path.join(base_dir, '.gitignore'), 'w', encoding='utf-8') as file:
+        file.write('node_modules/\nbuild/\n')
+    os.makedirs(os.path.join(base_dir, 'src'))
+    with open(os.path.join(base_dir, 'src', 'go.mod'), 'w', encoding='utf-8') as file:
+        file.write('module example.com/bench\n')
+
+    created = 0
+    for area, share, extensions in TREE_LAYOUT:
+        area_files = int(total_files * share)
+        for index in range(area_files):
+            directory = os.path.join(base_dir, area, f'pkg{index // FILES_PER_DIR}', f'sub{index % 7}')
+            if index % FILES_PER_DIR == 0 or not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            name = 'package.json' if area == 'node_modules' and index % 50 == 0 else \
+                f'file{index}{extensions[index % len(extensions)]}'
+            open(os.path.join(directory, name), 'w').close()
+            created += 1
+        print(f'  {area:<14} {area_files:>9} files')
+    return created
+
+
+def legacy_detect(project_path):
+    """The former fallback: os.walk over every directory, returning the first matching file."""
+    for root, dirs, files in os.walk(project_path):
+        for file in files:
+            if file in ['package.json', 'yarn.lock', 'package-lock.json']:
+                return 'Node.js'
+            if file.endswith('.php'):
+                return 'PHP'
+            if file.endswith('.py'):
+                return 'Python'
+            if file.endswith('.java'):
+                return 'Java'
+            if file in ['Gemfile', 'Rakefile']:
+                return 'Ruby'
+            if file in ['Cargo.toml', 'Cargo.lock']:
+                return 'Rust'
+            if file.endswith('.csproj'):
+                return 'C#'
+            if file == 'pubspec.yaml':
+                return 'Dart'
+            if file == 'Package.swift':
+                return 'Swift'
+    return 'Unknown'
+
+
+def legacy_full_walk(project_path):
+    """Cost of the unpruned walk when no early match exists (the worst case of the former detector)."""
+    count = 0
+    for _, _, files in os.walk(project_path):
+        count += len(files)
+    return count
+
+
+def measure(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<34} {elapsed * 1000:10.1f} ms   -> {result}')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark project language detection on a synthetic tree.')
+    parser.add_argument('--files', type=int, default=1_000_000, help='Number of files in the synthetic tree.')
+    parser.add_argument('--tree', type=str, default=None, help='Directory for the tree (default: a temp dir).')
+    parser.add_argument('--keep', action='store_true', help='Keep the tree (and reuse it if it already exists).')
+    args = parser.parse_args()
+
+    tree = args.tree or tempfile.mkdtemp(prefix='gitai-lang-bench-')
+    try:
+        if not os.path.isdir(os.path.join(tree, '.git')):
+            print(f'Creating {args.files} files in {tree}...')
+            start = time.perf_counter()
+            create_tree(tree, args.files)
+            print(f'Tree created in {time.perf_counter() - start:.1f}s\n')
+
+        cache_file = os.path.join(tree, '.git', 'gitai', 'language.json')
+        if os.path.exists(cache_file):
+            os.unlink(cache_file)
+
+        measure('legacy (first match in os.walk)', legacy_detect, tree)
+        measure('legacy worst case (full os.walk)', legacy_full_walk, tree)
+        measure('detect_project_language (cold)', gitai.detect_project_language, tree)
+        measure('detect_project_language (cached)', gitai.detect_project_language, tree)
+    finally:
+        if not args.keep:
+            shutil.rmtree(tree, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Startup benchmark for gitai.
+
+Measures how long it takes to import src/gitai/gitai.py and the wall time of a
+full run on the "no changes" path (status -> pull -> status) against a
+throwaway repository with a local bare remote. It also reports whether any
+provider SDK was imported, since that path never reaches the LLM.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GITAI_DIR = os.path.join(ROOT_DIR, 'src', 'gitai')
+GITAI_SCRIPT = os.path.join(GITAI_DIR, 'gitai.py')
+
+PROVIDER_SDKS = ['openai', 'groq', 'anthropic', 'httpx', 'pydantic']
+
+IMPORT_PROBE = """
+import sys, time
+sys.path.insert(0, {gitai_dir!r})
+start = time.perf_counter()
+import gitai
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(','.join(name for name in {sdks!r} if name in sys.modules))
+"""
+
+NO_CHANGES_PROBE = """
+import sys
+sys.path.insert(0, {gitai_dir!r})
+import gitai
+try:
+    gitai.main([{repo!r}, 'benchmark'])
+except SystemExit:
+    pass
+sys.stderr.write(','.join(name for name in {sdks!r} if name in sys.modules) + '\\n')
+"""
+
+
+def git(args, cwd):
+    subprocess.run(['git', *args], cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def create_repository(base_dir):
+    """Create a clone with one pushed commit and no local changes."""
+    remote = os.path.join(base_dir, 'remote.git')
+    work = os.path.join(base_dir, 'work')
+    git(['init', '--bare', remote], base_dir)
+    git(['clone', remote, work], base_dir)
+    git(['-c', 'user.name=bench', '-c', 'user.email=bench@example.com',
+         'commit', '--allow-empty', '-m', 'initial commit'], work)
+    git(['push', 'origin', 'HEAD'], work)
+    return work
+
+
+def benchmark_env():
+    env = dict(os.environ)
+    env.setdefault('PROVIDER', 'openai')
+    env.setdefault('MODEL', 'gpt-4o')
+    env.setdefault('API_KEY', 'benchmark')
+    env.setdefault('LANGUAGE', 'en')
+    env['GITAI_NO_DAEMON'] = '1'
+    return env
+
+
+def measure_import(runs, env):
+    timings = []
+    loaded = ''
+    for _ in range(runs):
+        probe = IMPORT_PROBE.format(gitai_dir=GITAI_DIR, sdks=PROVIDER_SDKS)
+        result = subprocess.run([sys.executable, '-c', probe], env=env, capture_output=True, text=True, check=True)
+        lines = result.stdout.splitlines()
+        timings.append(float(lines[0]))
+        loaded = lines[1] if len(lines) > 1 else ''
+    return timings, loaded
+
+
+def measure_no_changes(runs, repo, env):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, GITAI_SCRIPT, repo, 'benchmark'], env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+
+    probe = NO_CHANGES_PROBE.format(gitai_dir=GITAI_DIR, repo=repo, sdks=PROVIDER_SDKS)
+    result = subprocess.run([sys.executable, '-c', probe], env=env, capture_output=True, text=True)
+    loaded = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''
+    return timings, loaded
+
+
+def report(label, timings):
+    print(f"{label:<28} min {min(timings) * 1000:8.1f} ms   "
+          f"median {statistics.median(timings) * 1000:8.1f} ms   "
+          f"max {max(timings) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark gitai import time and the no-changes path.')
+    parser.add_argument('--runs', type=int, default=10, help='Number of runs for each measurement.')
+    args = parser.parse_args()
+
+    env = benchmark_env()
+    with tempfile.TemporaryDirectory(prefix='gitai-bench-') as base_dir:
+        repo = create_repository(base_dir)
+
+        import_timings, import_sdks = measure_import(args.runs, env)
+        run_timings, run_sdks = measure_no_changes(args.runs, repo, env)
+
+    print(f"Python {sys.version.split()[0]} - {args.runs} runs each\n")
+    report('import gitai', import_timings)
+    report('no-changes run (wall time)', run_timings)
+    print()
+    print(f"Provider SDK modules loaded by import:          {import_sdks or 'none'}")
+    print(f"Provider SDK modules loaded by no-changes run:  {run_sdks or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Load test for `gitai serve`, against the offline mock provider.
+
+Starts benchmarks/mock_provider.py in-process and `gitai serve` as a child
+process pointed at it, then fires concurrent POST /v1/commit-message requests
+with raw diffs. Only --distinct different diffs are sent, so identical requests
+overlap in time and the server can coalesce them. Reports:
+
+  * throughput and latency percentiles seen by the clients
+  * response statuses (503 means the server's --max-pending was exceeded)
+  * how many requests were coalesced, and how many reached the mock provider
+
+No API key or network access is needed.
+
+Usage:
+    python benchmarks/load_serve.py [--requests 200] [--concurrency 32] [--distinct 10] [--workers 4]
+                                    [--latency 0.5] [--tokens-per-second 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GITAI_SCRIPT = os.path.join(ROOT_DIR, 'src', 'gitai', 'gitai.py')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_provider import start_mock_provider  # noqa: E402
+
+
+def synthetic_diff(index, lines=40):
+    body = ''.join(f'+def handler_{index}_{line}(request):\n+    return {line}\n' for line in range(lines))
+    return (f'diff --git a/src/module_{index}.py b/src/module_{index}.py\n'
+            f'--- a/src/module_{index}.py\n+++ b/src/module_{index}.py\n'
+            f'@@ -0,0 +1,{lines * 2} @@\n{body}')
+
+
+def post_json(url, body, timeout=120):
+    """POST a JSON body and return (status, response body)."""
+    request = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+
+def wait_for_server(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'gitai serve exited with status {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'{url}/v1/health', timeout=1) as response:
+                return json.loads(response.read())
+        except OSError:
+            time.sleep(0.1)
+    sys.exit(f'gitai serve did not answer on {url} within {timeout}s')
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test gitai serve against the mock provider.')
+    parser.add_argument('--requests', type=int, default=200, help='Total requests to send.')
+    parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at the same time.')
+    parser.add_argument('--distinct', type=int, default=10, help='Number of different diffs among the requests.')
+    parser.add_argument('--workers', type=int, default=4, help='Worker pool size of gitai serve.')
+    parser.add_argument('--max-pending', type=int, default=64, help='--max-pending of gitai serve.')
+    parser.add_argument('--port', type=int, default=8797, help='Port for gitai serve.')
+    parser.add_argument('--latency', type=float, default=0.5, help='Mock provider latency before the first byte.')
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help='Mock provider throughput.')
+    args = parser.parse_args()
+
+    mock = start_mock_provider(latency=args.latency, tokens_per_second=args.tokens_per_second, seed=0)
+    url = f'http://127.0.0.1:{args.port}'
+
+    with tempfile.TemporaryDirectory(prefix='gitai-serve-home-') as home:
+        env = dict(os.environ)
+        env.update({
+            'PROVIDER': 'openai',
+            'MODEL': 'mock-model',
+            'API_KEY': 'benchmark',
+            'LANGUAGE': 'en',
+            'PROVIDER_BASE_URL': mock.url + '/v1',
+            'GITAI_NO_DAEMON': '1',
+            'HOME': home,
+        })
+        server = subprocess.Popen([sys.executable, GITAI_SCRIPT, 'serve', '--port', str(args.port),
+                                   '--workers', str(args.workers), '--max-pending', str(args.max_pending),
+                                   '--no-cache'],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_server(url, server)
+            mock.stats.reset()
+
+            def send(index):
+                started = time.perf_counter()
+                status, body = post_json(f'{url}/v1/commit-message',
+                                         {'diff': synthetic_diff(index % args.distinct), 'message': 'load test',
+                                          'project_language': 'Python'})
+                return status, body, time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                results = list(executor.map(send, range(args.requests)))
+            elapsed = time.perf_counter() - started
+
+            with urllib.request.urlopen(f'{url}/v1/health', timeout=5) as response:
+                health = json.loads(response.read())
+        finally:
+            server.terminate()
+            server.wait()
+    provider_stats = mock.stats.snapshot()
+    mock.shutdown()
+
+    latencies = [latency for status, _, latency in results if status == 200]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    coalesced = sum(1 for status, body, _ in results if status == 200 and body.get('coalesced'))
+
+    print(f'Python {sys.version.split()[0]} - {args.requests} requests, concurrency {args.concurrency}, '
+          f'{args.distinct} distinct diffs, {args.workers} workers, mock latency {args.latency}s\n')
+    print(f'{"throughput":<24} {args.requests / elapsed:10.1f} requests/s ({elapsed:.2f}s total)')
+    if latencies:
+        print(f'{"latency":<24} p50 {statistics.median(latencies) * 1000:8.1f} ms   '
+              f'p95 {percentile(latencies, 0.95) * 1000:8.1f} ms   max {max(latencies) * 1000:8.1f} ms')
+    print(f'{"statuses":<24} ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items())))
+    print(f'{"coalesced responses":<24} {coalesced:10}')
+    print(f'{"provider requests":<24} {provider_stats["requests"]:10}')
+    counters = ', '.join(f'{name}: {value}' for name, value in health.items()
+                         if name not in ('status', 'provider', 'model'))
+    print(f'{"server counters":<24} {counters}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""Offline stand-in for the OpenAI, Groq and Anthropic APIs.
+
+Serves the endpoints gitai and the releaser use, in each provider's wire format:
+
+  * POST .../chat/completions   OpenAI and Groq (JSON or server-sent events)
+  * POST .../messages           Anthropic Messages API (JSON or server-sent events)
+  * GET  .../models             model listing (used by gitai's provider warm-up)
+
+Latency, throughput, error rate and streaming behaviour are configurable, and
+every request is counted so benchmarks can report what was sent:
+
+  * GET  /_stats                request, error and token counters as JSON
+  * POST /_reset                reset the counters
+
+Point gitai at it with PROVIDER_BASE_URL. The OpenAI SDK expects the /v1
+prefix in the base URL, the Groq and Anthropic SDKs add their own paths:
+
+    PROVIDER=openai     PROVIDER_BASE_URL=http://127.0.0.1:8765/v1
+    PROVIDER=groq       PROVIDER_BASE_URL=http://127.0.0.1:8765
+    PROVIDER=anthropic  PROVIDER_BASE_URL=http://127.0.0.1:8765
+
+Usage:
+    python benchmarks/mock_provider.py [--port 8765] [--latency 0.5] [--tokens-per-second 200]
+                                       [--error-rate 0.0] [--response-tokens 60] [--buffer-stream]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMMIT_MESSAGE = (
+    "feat: add synthetic benchmark change\n\n"
+    "Update the generated modules used by the benchmark so the commit pipeline can be measured end to end."
+)
+RELEASE_NOTES = (
+    "# Release\n"
+    "A synthetic release generated by the mock provider.\n\n"
+    "### New Features\n- Synthetic feature.\n\n"
+    "### Bug Fixes\n- Synthetic fix.\n\n"
+    "### Other Changes\n- Synthetic change."
+)
+FILLER = " This sentence pads the mock response to the requested length."
+
+ERROR_STATUSES = [429, 500, 503]
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class MockSettings:
+    def __init__(self, latency=0.5, jitter=0.0, tokens_per_second=200.0, error_rate=0.0, retry_after=1,
+                 response_tokens=60, chunk_tokens=4, buffer_stream=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.response_tokens = response_tokens
+        self.chunk_tokens = chunk_tokens
+        self.buffer_stream = buffer_stream
+        self.random = random.Random(seed)
+
+
+class MockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {'requests': 0, 'streamed': 0, 'errors': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                             'prompt_bytes': 0, 'routes': {}}
+
+    def record(self, route, prompt_text=None, completion_text=None, streamed=False, error=False):
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters['routes'][route] = self.counters['routes'].get(route, 0) + 1
+            self.counters['streamed'] += int(streamed)
+            self.counters['errors'] += int(error)
+            if prompt_text is not None:
+                self.counters['prompt_tokens'] += estimate_tokens(prompt_text)
+                self.counters['prompt_bytes'] += len(prompt_text.encode('utf-8'))
+            if completion_text is not None:
+                self.counters['completion_tokens'] += estimate_tokens(completion_text)
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.counters))
+
+
+def build_response_text(prompt_text, response_tokens):
+    text = RELEASE_NOTES if 'release notes' in prompt_text.lower() else COMMIT_MESSAGE
+    while estimate_tokens(text) < response_tokens:
+        text += FILLER
+    return text
+
+
+def split_tokens(text, chunk_tokens):
+    """Split the response into stream fragments of roughly chunk_tokens tokens (4 characters each)."""
+    size = max(1, chunk_tokens * 4)
+    return [text[index:index + size] for index in range(0, len(text), size)]
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'GitaiMockProvider/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def settings(self):
+        return self.server.settings
+
+    @property
+    def stats(self):
+        return self.server.stats
+
+    def is_anthropic(self):
+        return self.path.rstrip('/').endswith('/messages') or 'anthropic-version' in self.headers
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/_stats':
+            self.send_json(200, self.stats.snapshot())
+        elif path.endswith('/models'):
+            if self.is_anthropic():
+                models = [{'type': 'model', 'id': 'mock-model', 'display_name': 'Mock model',
+                           'created_at': '2024-01-01T00:00:00Z'}]
+                self.send_json(200, {'data': models, 'has_more': False, 'first_id': 'mock-model',
+                                     'last_id': 'mock-model'})
+            else:
+                self.send_json(200, {'object': 'list', 'data': [
+                    {'id': 'mock-model', 'object': 'model', 'created': 0, 'owned_by': 'mock'}]})
+        else:
+            self.send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'not_found'}})
+
+    def do_POST(self):
+        path = self.path.split('?')[0].rstrip('/')
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if path == '/_reset':
+            self.stats.reset()
+            self.send_json(200, {'reset': True})
+            return
+
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            self.send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+            return
+
+        if path.endswith('/chat/completions'):
+            route = 'chat.completions'
+        elif path.endswith('/messages'):
+            route = 'messages'
+        else:
+            self.send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'not_found'}})
+            return
+
+        prompt_text = json.dumps(request.get('messages', [])) + json.dumps(request.get('system', ''))
+        if self.settings.random.random() < self.settings.error_rate:
+            self.stats.record(route, prompt_text, error=True)
+            self.send_error_response(route)
+            return
+
+        delay = self.settings.latency + self.settings.random.uniform(0, self.settings.jitter)
+        time.sleep(delay)
+
+        text = build_response_text(prompt_text, self.settings.response_tokens)
+        model = request.get('model', 'mock-model')
+        streamed = bool(request.get('stream'))
+        self.stats.record(route, prompt_text, text, streamed=streamed)
+
+        if route == 'chat.completions':
+            if streamed:
+                include_usage = bool((request.get('stream_options') or {}).get('include_usage'))
+                self.stream_chat_completion(text, model, prompt_text if include_usage else None)
+            else:
+                self.pace(text)
+                self.send_json(200, chat_completion_body(text, model, prompt_text))
+        else:
+            if streamed:
+                self.stream_message(text, model, prompt_text)
+            else:
+                self.pace(text)
+                self.send_json(200, message_body(text, model, prompt_text))
+
+    def send_error_response(self, route):
+        status = self.settings.random.choice(ERROR_STATUSES)
+        headers = {'Retry-After': str(self.settings.retry_after)}
+        if status == 429:
+            headers.update({'x-ratelimit-remaining-requests': '0',
+                            'x-ratelimit-reset-requests': f'{self.settings.retry_after}s'})
+        if route == 'messages':
+            error_type = 'rate_limit_error' if status == 429 else 'api_error'
+            self.send_json(status, {'type': 'error', 'error': {'type': error_type, 'message': 'Mock error'}}, headers)
+        else:
+            error_type = 'rate_limit_exceeded' if status == 429 else 'server_error'
+            self.send_json(status, {'error': {'message': 'Mock error', 'type': error_type, 'code': error_type}},
+                           headers)
+
+    def pace(self, text):
+        """Simulate generation time for a non-streamed response."""
+        if self.settings.tokens_per_second:
+            time.sleep(estimate_tokens(text) / self.settings.tokens_per_second)
+
+    def start_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+    def write_events(self, events):
+        """Write server-sent events, paced at the configured throughput (all at the end with --buffer-stream)."""
+        chunk_delay = self.settings.chunk_tokens / self.settings.tokens_per_second \
+            if self.settings.tokens_per_second else 0
+        buffered = []
+        for event, delta in events:
+            if delta and chunk_delay:
+                time.sleep(chunk_delay)
+            if self.settings.buffer_stream:
+                buffered.append(event)
+            else:
+                self.wfile.write(event.encode('utf-8'))
+                self.wfile.flush()
+        if buffered:
+            self.wfile.write(''.join(buffered).encode('utf-8'))
+            self.wfile.flush()
+
+    def stream_chat_completion(self, text, model, usage_prompt_text=None):
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:12]}'
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            return 'data: ' + json.dumps({
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }) + '\n\n'
+
+        events = [(chunk({'role': 'assistant', 'content': ''}), False)]
+        events += [(chunk({'content': fragment}), True) for fragment in split_tokens(text, self.settings.chunk_tokens)]
+        events.append((chunk({}, 'stop'), False))
+        if usage_prompt_text is not None:
+            # stream_options.include_usage: a last chunk without choices carries the usage
+            usage = chat_completion_body(text, model, usage_prompt_text)['usage']
+            events.append(('data: ' + json.dumps({'id': completion_id, 'object': 'chat.completion.chunk',
+                                                  'created': created, 'model': model, 'choices': [],
+                                                  'usage': usage}) + '\n\n', False))
+        events.append(('data: [DONE]\n\n', False))
+        self.start_stream()
+        self.write_events(events)
+
+    def stream_message(self, text, model, prompt_text):
+        def event(name, data):
+            return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+        message = message_body('', model, prompt_text)
+        message['content'] = []
+        message['stop_reason'] = None
+        events = [
+            (event('message_start', {'type': 'message_start', 'message': message}), False),
+            (event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                           'content_block': {'type': 'text', 'text': ''}}), False),
+        ]
+        events += [(event('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                                  'delta': {'type': 'text_delta', 'text': fragment}}), True)
+                   for fragment in split_tokens(text, self.settings.chunk_tokens)]
+        events += [
+            (event('content_block_stop', {'type': 'content_block_stop', 'index': 0}), False),
+            (event('message_delta', {'type': 'message_delta',
+                                     'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                     'usage': {'output_tokens': estimate_tokens(text)}}), False),
+            (event('message_stop', {'type': 'message_stop'}), False),
+        ]
+        self.start_stream()
+        self.write_events(events)
+
+
+def chat_completion_body(text, model, prompt_text):
+    prompt_tokens = estimate_tokens(prompt_text)
+    completion_tokens = estimate_tokens(text)
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex[:12]}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens,
+                  'prompt_tokens_details': {'cached_tokens': 0}},
+    }
+
+
+def message_body(text, model, prompt_text):
+    return {
+        'id': f'msg_{uuid.uuid4().hex[:12]}',
+        'type': 'message',
+        'role': 'assistant',
+        'model': model,
+        'content': [{'type': 'text', 'text': text}],
+        'stop_reason': 'end_turn',
+        'stop_sequence': None,
+        'usage': {'input_tokens': estimate_tokens(prompt_text), 'output_tokens': estimate_tokens(text)},
+    }
+
+
+def start_mock_provider(host='127.0.0.1', port=0, **settings):
+    """Start the mock provider in a background thread; returns the server (server.url, server.stats)."""
+    server = ThreadingHTTPServer((host, port), MockProviderHandler)
+    server.daemon_threads = True
+    server.settings = MockSettings(**settings)
+    server.stats = MockStats()
+    server.url = f'http://{host}:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline stand-in for the OpenAI, Groq and Anthropic APIs.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on.')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds before the first byte of a response.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency, up to this many seconds.')
+    parser.add_argument('--tokens-per-second', type=float, default=200.0,
+                        help='Generation throughput; 0 sends the whole response at once.')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with 429/500/503 and a Retry-After header.')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After value of error responses, in seconds.')
+    parser.add_argument('--response-tokens', type=int, default=60, help='Approximate length of every response.')
+    parser.add_argument('--chunk-tokens', type=int, default=4, help='Approximate tokens per streamed chunk.')
+    parser.add_argument('--buffer-stream', action='store_true', default=False,
+                        help='Send streamed responses in one piece at the end, like a buffering proxy.')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the error and jitter randomness.')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), MockProviderHandler)
+    server.daemon_threads = True
+    server.settings = MockSettings(latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+                                   error_rate=args.error_rate, retry_after=args.retry_after,
+                                   response_tokens=args.response_tokens, chunk_tokens=args.chunk_tokens,
+                                   buffer_stream=args.buffer_stream, seed=args.seed)
+    server.stats = MockStats()
+    print(f'Mock provider listening on http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
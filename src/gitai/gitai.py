@@ -1,15 +1,39 @@
 import argparse
+import asyncio
+import contextvars
+import errno
+import fnmatch
+import glob
+import hashlib
+import io
+import json
 import os
+import queue
+import random
+import re
+import socket
+import socketserver
+import struct
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from itertools import combinations
 from textwrap import dedent
 
 from colorama import Back, Fore, Style, init
-from dotenv import load_dotenv
 
-# Initialize colorama for cross-platform colored output
-init(autoreset=True)
+try:
+    import fcntl
+except ImportError:
+    # Windows: the rate limiter is then shared by the threads of one process only
+    fcntl = None
 
 
 # Utility functions for colored console output
@@ -35,6 +59,9 @@ def print_warning(message):
 
 def print_error(message):
     """Print error messages with red color and error emoji"""
+    errors = run_errors.get()
+    if errors is not None:
+        errors.append(message)
     print(f"{Fore.RED}{Style.BRIGHT}❌ {message}{Style.RESET_ALL}")
 
 
@@ -48,13 +75,50 @@ def print_ai_message(message):
     print(f"{Fore.CYAN}{Style.BRIGHT}🤖 {message}{Style.RESET_ALL}")
 
 
+def print_verbose(message):
+    """Print verbose diagnostics with dimmed color and magnifier emoji, only when --verbose is set"""
+    if verbose:
+        print(f"{Fore.WHITE}{Style.DIM}🔍 {message}{Style.RESET_ALL}")
+
+
+def print_commit_message_header():
+    """Print the banner shown above the generated commit message"""
+    print(f"\n{Fore.WHITE}{Back.BLUE}{Style.BRIGHT} Generated commit message: {Style.RESET_ALL}\n")
+
+
 def print_commit_message(message):
     """Print commit message with special formatting"""
-    print(f"\n{Fore.WHITE}{Back.BLUE}{Style.BRIGHT} Generated commit message: {Style.RESET_ALL}\n")
+    print_commit_message_header()
     print(f"{Fore.WHITE}{Style.BRIGHT}{message}{Style.RESET_ALL}")
     print()
 
 
+class CommitMessageStream:
+    """Renders a commit message token by token while the provider streams it"""
+
+    def __init__(self):
+        self.parts = []
+
+    def __call__(self, token):
+        if not self.parts:
+            print_commit_message_header()
+        self.parts.append(token)
+        sys.stdout.write(f"{Fore.WHITE}{Style.BRIGHT}{token}{Style.RESET_ALL}")
+        sys.stdout.flush()
+
+    def finish(self, commit_message):
+        """Print whatever part of the final message was not streamed (e.g. a cached message or the signature)"""
+        streamed = ''.join(self.parts).strip()
+        if not streamed:
+            print_commit_message(commit_message)
+        elif commit_message.startswith(streamed):
+            print(f"{Fore.WHITE}{Style.BRIGHT}{commit_message[len(streamed):]}{Style.RESET_ALL}")
+            print()
+        else:
+            print()
+            print_commit_message(commit_message)
+
+
 def get_language_emoji(language):
     """Get appropriate emoji for programming language"""
     language_emojis = {
@@ -89,144 +153,1444 @@ def print_detected_language(language):
 
 
 exe_dir = os.path.dirname(sys.executable)
-print_header('Gitai v.0.2.5-beta')
-print_info(f'📁 exe_dir: {exe_dir}')
-print()
 
 # Construct the path to the .env file
 env_path = os.path.join(exe_dir, '.env')
 
-# Load environment variables from the .env file
-load_dotenv(dotenv_path=env_path)
+# Directory for Gitai's per-user runtime files (daemon socket, etc.)
+gitai_home = os.path.join(os.path.expanduser('~'), '.gitai')
+daemon_socket_path = os.getenv('GITAI_SOCKET') or os.path.join(gitai_home, 'daemon.sock')
 
 # List of required environment variables
 required_env_vars = ['PROVIDER', 'MODEL', 'API_KEY', 'LANGUAGE']
 
-# Check if each required environment variable is set and not blank
-for var in required_env_vars:
-    if not os.getenv(var):
-        print_error(f'The environment variable {var} is not set or is blank.')
-        print_error(f'Please set the value in the .env file located at: {env_path}')
+supported_providers = ['openai', 'groq', 'anthropic']
+
+# Default number of diff tokens sent in a single request, per provider.
+# Diffs above the budget go through the map-reduce summarization pipeline.
+default_token_budgets = {
+    'openai': 24000,
+    'groq': 6000,
+    'anthropic': 48000,
+}
+
+# Upper bounds (in seconds) of the provider latency histogram buckets
+latency_bucket_bounds = [0.25, 0.5, 0.75, 1, 1.5, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 45, 60, float('inf')]
+
+# Number of latency samples required before the hedge delay follows the histogram instead of HEDGE_DELAY
+hedge_min_samples = 20
+
+# Provider settings, populated by load_settings()
+provider = None
+model = None
+api_key = None
+language = None
+hedge_provider = None
+hedge_model = None
+hedge_delay = 4.0
+hedge_percentile = 90
+provider_api_keys = {}
+provider_base_urls = {}
+# How often a hedged request checks whether `gitai watch` cancelled it, in seconds
+cancel_check_interval = 0.05
+provider_clients = {}
+provider_clients_lock = threading.Lock()
+# One lock per provider, so building one client (and importing its SDK) does not hold up another
+provider_client_locks = {}
+latency_histograms_lock = threading.Lock()
+token_budgets = {}
+map_reduce_concurrency = 4
+cache_max_age_days = 7
+cache_max_size_mb = 10
+rate_limit_rpm = None
+rate_limit_burst = 1
+provider_rate_limiters = {}
+provider_rate_limiters_lock = threading.Lock()
+
+# Failed provider requests are retried with exponential backoff and full jitter (PROVIDER_MAX_RETRIES), on
+# these statuses and on timeouts and connection errors. Retry-After and x-ratelimit-reset-* take precedence
+# over the backoff, up to retry_max_wait seconds; a longer wait fails the request instead of stalling the run.
+provider_max_retries = 4
+provider_timeout = 120
+retry_base_delay = 1.0
+retry_max_delay = 30.0
+retry_max_wait = 120.0
+retryable_status_codes = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Bump whenever the prompts change, so cached responses from older prompts are not reused
+prompt_template_version = 4
+
+# Every run is appended to a SQLite database for `gitai stats` (HISTORY=0 turns it off)
+record_history = True
+history_path = os.path.join(gitai_home, 'history.sqlite3')
+history_schema_version = 1
+
+# Estimated prices in USD per million input and output tokens, matched by the longest prefix of the model name.
+# MODEL_PRICES entries such as 'gpt-4o=2.5/10' take precedence.
+default_model_prices = {
+    'gpt-4o-mini': (0.15, 0.6), 'gpt-4o': (2.5, 10.0), 'gpt-4.1-nano': (0.1, 0.4), 'gpt-4.1-mini': (0.4, 1.6),
+    'gpt-4.1': (2.0, 8.0), 'gpt-4-turbo': (10.0, 30.0), 'gpt-3.5-turbo': (0.5, 1.5), 'o1': (15.0, 60.0),
+    'o1-mini': (1.1, 4.4), 'o3-mini': (1.1, 4.4), 'o4-mini': (1.1, 4.4),
+    'claude-3-haiku': (0.25, 1.25), 'claude-3-5-haiku': (0.8, 4.0), 'claude-3-5-sonnet': (3.0, 15.0),
+    'claude-3-7-sonnet': (3.0, 15.0), 'claude-sonnet-4': (3.0, 15.0), 'claude-3-opus': (15.0, 75.0),
+    'claude-opus-4': (15.0, 75.0),
+    'llama-3.1-8b-instant': (0.05, 0.08), 'llama3-8b-8192': (0.05, 0.08), 'llama-3.3-70b-versatile': (0.59, 0.79),
+    'llama3-70b-8192': (0.59, 0.79), 'gemma2-9b-it': (0.2, 0.2), 'mixtral-8x7b-32768': (0.24, 0.24),
+}
+model_prices = {}
+# Share of the input price billed for tokens read from (and written to) the provider's prompt cache
+cached_input_price_factors = {'openai': 0.5, 'anthropic': 0.1}
+cache_write_price_factors = {'anthropic': 1.25}
+# Shortest prompt prefix, in tokens, that each provider caches (matched by model name prefix first); shorter
+# prefixes are billed in full on every request
+prompt_cache_min_tokens = {'openai': 1024, 'anthropic': 1024}
+prompt_cache_min_tokens_by_model = {'claude-3-haiku': 2048, 'claude-3-5-haiku': 2048, 'claude-haiku': 2048}
+# estimate_tokens is rough, so the prefix must exceed the minimum by this margin before it is treated as cacheable
+prompt_cache_margin = 1.1
+
+# Per-run options and counters, set by main()
+verbose = False
+use_cache = True
+use_stream = False
+provider_warm_up = True
+
+# Per-run state. Context variables instead of plain globals so that `gitai batch` can run several repositories in
+# one process: asyncio tasks and asyncio.to_thread carry them over, and in_current_context does it for other threads.
+current_repo_path = contextvars.ContextVar('current_repo_path', default=None)
+current_output = contextvars.ContextVar('current_output', default=None)
+# Response cache counters of the current run or request; each entry point sets its own dict, since a mutable
+# default would be shared by every thread that never sets one
+cache_stats = contextvars.ContextVar('cache_stats', default=None)
+# Spans of the current run (None outside a run: nothing is recorded)
+trace_spans = contextvars.ContextVar('trace_spans', default=None)
+# Set by `gitai watch` for speculative generations: provider calls are streamed so they can stop between chunks
+current_cancel_event = contextvars.ContextVar('current_cancel_event', default=None)
+# Error messages printed by the current run, kept for the run history
+run_errors = contextvars.ContextVar('run_errors', default=None)
+
+
+def in_current_context(function):
+    """Wrap function so that it runs in a copy of the caller's context when called from another thread."""
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(function, *args)
+
+
+def print_banner():
+    """Print the Gitai banner with the executable directory"""
+    print_header('Gitai v.0.2.5-beta')
+    print_info(f'📁 exe_dir: {exe_dir}')
+    print()
+
+
+def load_settings():
+    """Load and validate the provider settings from the .env file located next to the executable."""
+    global provider, model, api_key, language, token_budgets, map_reduce_concurrency
+    global cache_max_age_days, cache_max_size_mb, max_diff_tokens, rate_limit_rpm, rate_limit_burst
+    global provider_max_retries, provider_timeout
+    global fast_path_setting, fast_path_policy, max_diff_size_mb, max_split_groups, record_history, model_prices
+    global hedge_provider, hedge_model, hedge_delay, hedge_percentile, provider_api_keys, provider_base_urls
+
+    from dotenv import load_dotenv
+
+    # Load environment variables from the .env file
+    load_dotenv(dotenv_path=env_path)
+
+    # Check if each required environment variable is set and not blank
+    for var in required_env_vars:
+        if not os.getenv(var):
+            print_error(f'The environment variable {var} is not set or is blank.')
+            print_error(f'Please set the value in the .env file located at: {env_path}')
+            sys.exit(1)
+
+    provider = os.getenv('PROVIDER')
+    model = os.getenv('MODEL')
+    api_key = os.getenv('API_KEY')
+    language = os.getenv('LANGUAGE')
+
+    if provider not in supported_providers:
+        print_error(f'Provider {provider} is not supported.')
         sys.exit(1)
 
-provider = os.getenv('PROVIDER')
-model = os.getenv('MODEL')
-api_key = os.getenv('API_KEY')
-language = os.getenv('LANGUAGE')
+    token_budgets = parse_token_budgets(os.getenv('TOKEN_BUDGETS', ''))
+    map_reduce_concurrency = parse_positive_int('MAP_REDUCE_CONCURRENCY', 4)
+    cache_max_age_days = parse_positive_int('CACHE_MAX_AGE_DAYS', 7)
+    cache_max_size_mb = parse_positive_int('CACHE_MAX_SIZE_MB', 10)
+    max_diff_tokens = parse_positive_int('MAX_DIFF_TOKENS', 100000)
+    max_diff_size_mb = parse_positive_int('MAX_DIFF_SIZE_MB', 8)
+    max_split_groups = parse_positive_int('MAX_SPLIT_GROUPS', 6)
+    fast_path_setting = (os.getenv('FAST_PATH_POLICY') or 'safe').strip().lower()
+    if fast_path_setting not in fast_path_policies:
+        print_error(f"The environment variable FAST_PATH_POLICY must be one of {', '.join(fast_path_policies)}, "
+                    f"got: {fast_path_setting}")
+        sys.exit(1)
+    fast_path_policy = fast_path_setting
+    rate_limit_rpm = parse_positive_int('RATE_LIMIT_RPM', None)
+    rate_limit_burst = parse_positive_int('RATE_LIMIT_BURST', 1)
+    provider_max_retries = parse_non_negative_int('PROVIDER_MAX_RETRIES', 4)
+    provider_timeout = parse_positive_int('PROVIDER_TIMEOUT', 120)
+    record_history = os.getenv('HISTORY', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+    model_prices = parse_model_prices(os.getenv('MODEL_PRICES', ''))
+
+    provider_api_keys = {provider: api_key}
+    # Alternative endpoints, e.g. a proxy or the local stand-in in benchmarks/mock_provider.py
+    provider_base_urls = {provider: os.getenv('PROVIDER_BASE_URL') or None}
+    hedge_provider = os.getenv('HEDGE_PROVIDER') or None
+    if hedge_provider:
+        if hedge_provider not in supported_providers:
+            print_error(f'Hedge provider {hedge_provider} is not supported.')
+            sys.exit(1)
+        hedge_model = os.getenv('HEDGE_MODEL')
+        hedge_api_key = os.getenv('HEDGE_API_KEY') or (api_key if hedge_provider == provider else None)
+        if not hedge_model or not hedge_api_key:
+            print_error('HEDGE_MODEL and HEDGE_API_KEY must be set when HEDGE_PROVIDER is set.')
+            print_error(f'Please set the values in the .env file located at: {env_path}')
+            sys.exit(1)
+        if hedge_provider != provider:
+            provider_api_keys[hedge_provider] = hedge_api_key
+            provider_base_urls[hedge_provider] = os.getenv('HEDGE_BASE_URL') or None
+        hedge_delay = parse_positive_float('HEDGE_DELAY', 4.0)
+        hedge_percentile = parse_positive_int('HEDGE_PERCENTILE', 90)
+        if hedge_percentile > 99:
+            print_error(f'The environment variable HEDGE_PERCENTILE must be between 1 and 99, got: {hedge_percentile}')
+            sys.exit(1)
 
-if provider == 'openai':
-    from openai import OpenAI
 
-    openai_client = OpenAI(api_key=api_key)
+def parse_positive_float(var, default):
+    """Read a positive number from the environment, exiting with a clear message on invalid values."""
+    value = os.getenv(var)
+    if not value:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        print_error(f'The environment variable {var} must be a positive number, got: {value}')
+        sys.exit(1)
+    return number
 
-elif provider == 'groq':
-    from groq import Groq
 
-    groq_client = Groq(api_key=api_key)
+def parse_positive_int(var, default):
+    """Read a positive integer from the environment, exiting with a clear message on invalid values."""
+    value = os.getenv(var)
+    if not value:
+        return default
+    if not value.isdigit() or int(value) < 1:
+        print_error(f'The environment variable {var} must be a positive integer, got: {value}')
+        sys.exit(1)
+    return int(value)
 
-elif provider == 'anthropic':
-    from anthropic import Anthropic
 
-    anthropic_client = Anthropic(api_key=api_key)
+def parse_non_negative_int(var, default):
+    """Read a non-negative integer from the environment, exiting with a clear message on invalid values."""
+    value = os.getenv(var)
+    if not value:
+        return default
+    if not value.isdigit():
+        print_error(f'The environment variable {var} must be a non-negative integer, got: {value}')
+        sys.exit(1)
+    return int(value)
 
-else:
-    print_error(f'Provider {provider} is not supported.')
-    sys.exit(1)
 
+def parse_token_budgets(value):
+    """Parse TOKEN_BUDGETS entries such as 'groq=6000,openai:gpt-4o-mini=30000'."""
+    budgets = {}
+    for entry in filter(None, (item.strip() for item in value.split(','))):
+        key, _, tokens = entry.partition('=')
+        if not tokens.strip().isdigit():
+            print_error(f'Invalid TOKEN_BUDGETS entry: {entry}')
+            print_error("Use the format provider=tokens or provider:model=tokens, separated by commas.")
+            sys.exit(1)
+        budgets[key.strip()] = int(tokens)
+    return budgets
+
+
+def parse_model_prices(value):
+    """Parse MODEL_PRICES entries such as 'gpt-4o=2.5/10,claude-3-5-haiku=0.8/4' (USD per million tokens)."""
+    prices = {}
+    for entry in filter(None, (item.strip() for item in value.split(','))):
+        name, _, price = entry.partition('=')
+        try:
+            input_price, output_price = (float(part) for part in price.split('/'))
+        except ValueError:
+            print_error(f'Invalid MODEL_PRICES entry: {entry}')
+            print_error('Use the format model=input/output, in USD per million tokens, separated by commas.')
+            sys.exit(1)
+        prices[name.strip()] = (input_price, output_price)
+    return prices
+
+
+def get_token_budget():
+    """Return the diff token budget for the configured provider and model."""
+    for key in (f'{provider}:{model}', provider):
+        if key in token_budgets:
+            return token_budgets[key]
+    return default_token_budgets.get(provider, 8000)
+
+
+class RateLimiter:
+    """Token bucket for one provider, shared by every gitai process of the user through a state file.
+
+    Requests are spaced evenly to stay under requests_per_minute, allowing bursts
+    of up to burst requests, and pause() holds every process back when the
+    provider reports that its rate limit was hit. The state file is locked with
+    fcntl, so concurrent CI jobs and batch runs take turns instead of stampeding
+    the provider. Without requests_per_minute there is nothing to share: the
+    state stays in memory and acquire() only honors this process's own pauses.
+    """
+
+    def __init__(self, name, requests_per_minute=None, burst=1):
+        self.interval = 60 / requests_per_minute if requests_per_minute else 0.0
+        self.burst_allowance = self.interval * (burst - 1)
+        self.state_path = os.path.join(gitai_home, 'rate_limits', f'{name}.json')
+        self.local_state = {'next_slot': 0.0, 'paused_until': 0.0}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def shared_state(self):
+        """Hold the state exclusively, across threads and (with fcntl) processes, saving it on exit."""
+        with self.lock:
+            state_file = None
+            if fcntl is not None and self.interval:
+                try:
+                    os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+                    state_file = open(self.state_path, 'a+', encoding='utf-8')
+                except OSError as e:
+                    print_verbose(f'Rate limiter state not shared between processes: {e}')
+            if state_file is None:
+                yield self.local_state
+                return
+
+            with state_file:
+                # The lock is released when the file is closed
+                fcntl.flock(state_file, fcntl.LOCK_EX)
+                state_file.seek(0)
+                try:
+                    state = {**self.local_state, **json.loads(state_file.read() or '{}')}
+                except ValueError:
+                    state = dict(self.local_state)
+                yield state
+                state_file.seek(0)
+                state_file.truncate()
+                json.dump(state, state_file)
+
+    def acquire(self):
+        if not self.interval and self.local_state['paused_until'] <= time.time():
+            return
+        # Wall-clock time, because the state is shared with other processes
+        with self.shared_state() as state:
+            now = time.time()
+            slot = max(now, state['next_slot'] - self.burst_allowance, state['paused_until'])
+            if self.interval:
+                state['next_slot'] = max(state['next_slot'], slot) + self.interval
+        if slot > now:
+            print_verbose(f'Rate limit: waiting {slot - now:.2f}s before the next provider request')
+            with trace_span('rate limit wait', 'provider'):
+                time.sleep(slot - now)
+
+    def pause(self, seconds):
+        with self.shared_state() as state:
+            state['paused_until'] = max(state['paused_until'], time.time() + seconds)
+
+
+def get_rate_limiter(provider_name):
+    with provider_rate_limiters_lock:
+        if provider_name not in provider_rate_limiters:
+            provider_rate_limiters[provider_name] = RateLimiter(provider_name, rate_limit_rpm, rate_limit_burst)
+        return provider_rate_limiters[provider_name]
+
+
+def parse_reset_duration(value):
+    """Parse the x-ratelimit-reset-* durations ('20ms', '1.5s', '6m0s', '1h2m3s') into seconds."""
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value or '')
+    if not parts:
+        return None
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def get_retry_after(error):
+    """How long the provider asked us to wait, from Retry-After or the x-ratelimit-* headers, or None."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    if headers.get('retry-after'):
+        try:
+            return float(headers['retry-after'])
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+
+            try:
+                return max(0.0, parsedate_to_datetime(headers['retry-after']).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # Wait for the exhausted limit to reset, or for both when the response does not say which one it was
+    resets = {kind: parse_reset_duration(headers.get(f'x-ratelimit-reset-{kind}')) for kind in ('requests', 'tokens')}
+    exhausted = [resets[kind] for kind in resets if headers.get(f'x-ratelimit-remaining-{kind}') == '0']
+    waits = [wait for wait in exhausted or resets.values() if wait is not None]
+    return max(waits) if waits else None
+
+
+def is_retryable_error(error):
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None:
+        return status_code in retryable_status_codes
+    # The three SDKs share these class names; APITimeoutError is a subclass of APIConnectionError
+    return any(cls.__name__ == 'APIConnectionError' for cls in type(error).__mro__)
+
+
+def request_with_retries(provider_name, model_name, prompt, system_prompt, max_tokens, on_token, timing,
+                         cancel_event=None, prompt_prefix=None):
+    """request_completion behind the shared rate limiter, retrying rate limits, server errors and timeouts.
+
+    A rate-limited response pauses the limiter, so that every thread and process
+    waits for the reset instead of retrying into the same limit. A stream that
+    already produced text is never retried, since it was shown to the user.
+    """
+    limiter = get_rate_limiter(provider_name)
+    for attempt in range(provider_max_retries + 1):
+        limiter.acquire()
+        try:
+            return request_completion(provider_name, model_name, prompt, system_prompt, max_tokens, on_token, timing,
+                                      cancel_event, prompt_prefix)
+        except Exception as e:
+            if attempt == provider_max_retries or not is_retryable_error(e) or 'first_token' in timing:
+                raise
+            if cancel_event is not None and cancel_event.is_set():
+                raise
+            retry_after = get_retry_after(e)
+            if retry_after is not None and retry_after > retry_max_wait:
+                raise
+            if retry_after is not None:
+                # A little jitter keeps the processes that were paused together from retrying in lockstep
+                delay = retry_after + random.uniform(0, min(1.0, retry_after * 0.1))
+                limiter.pause(delay)
+            else:
+                delay = random.uniform(0, min(retry_max_delay, retry_base_delay * 2 ** attempt))
+            print_warning(f'Request to {provider_name} failed ({getattr(e, "status_code", None) or type(e).__name__})'
+                          f', retrying in {delay:.1f}s ({attempt + 1}/{provider_max_retries})')
+            with trace_span('retry backoff', 'provider', attempt=attempt + 1, error=str(e)):
+                if cancel_event is not None:
+                    if cancel_event.wait(delay):
+                        raise
+                else:
+                    time.sleep(delay)
 
-def detect_project_language(project_path):
-    # Indicator files in the project's root directory
-    indicator_files = {
-        'Node.js': ['package.json', 'yarn.lock', 'package-lock.json', 'npm-shrinkwrap.json'],
-        'Python': ['requirements.txt', 'Pipfile', 'pyproject.toml', 'setup.py', 'setup.cfg', 'manage.py'],
-        'Java': ['pom.xml', 'build.gradle', 'build.gradle.kts', 'build.xml', '.java-version'],
-        'Go': ['go.mod', 'Gopkg.lock'],
-        'PHP': ['composer.json', 'composer.lock', 'index.php'],
-        'Ruby': ['Gemfile', 'Gemfile.lock', 'Rakefile', 'config.ru', '.ruby-version'],
-        'Rust': ['Cargo.toml', 'Cargo.lock'],
-        'Haskell': ['stack.yaml', 'cabal.project'],
-        'Swift': ['Package.swift'],
-        'Elixir': ['mix.exs'],
-        'Dart': ['pubspec.yaml'],
-        'Scala': ['build.sbt'],
-        'Perl': ['Makefile.PL', 'Build.PL'],
-        'R': ['.Rproj']
-    }
 
-    # File extension indicators in the project's root directory
-    extension_indicators = {
-        'C#': ['.csproj', '.sln'],
-        'Haskell': ['.cabal'],
-        'Swift': ['.xcodeproj', '.xcworkspace'],
-        'Kotlin': ['.kt', '.kts'],
-        'C/C++': ['.c', '.cpp', '.h', '.hpp'],
-        'JavaScript': ['.js', '.jsx'],
-        'TypeScript': ['.ts', '.tsx'],
-        'Python': ['.py'],
-        'Java': ['.java']
-    }
+def get_provider_client(provider_name=None):
+    """Return the client of a provider (the configured one by default), importing its SDK on first use.
+
+    The SDKs pull in httpx, pydantic and friends, so runs that never reach the
+    LLM (no changes, push-only, --help) must not pay for them.
+    """
+    provider_name = provider_name or provider
+
+    with provider_clients_lock:
+        if provider_name in provider_clients:
+            return provider_clients[provider_name]
+        client_lock = provider_client_locks.setdefault(provider_name, threading.Lock())
+
+    with client_lock:
+        if provider_name in provider_clients:
+            return provider_clients[provider_name]
+
+        key = provider_api_keys[provider_name]
+        # None keeps the SDK default (or its own *_BASE_URL environment variable)
+        base_url = provider_base_urls.get(provider_name)
+        if provider_name == 'openai':
+            from openai import OpenAI
+
+            client = OpenAI(api_key=key, base_url=base_url, max_retries=0, timeout=provider_timeout)
 
+        elif provider_name == 'groq':
+            from groq import Groq
+
+            client = Groq(api_key=key, base_url=base_url, max_retries=0, timeout=provider_timeout)
+
+        elif provider_name == 'anthropic':
+            from anthropic import Anthropic
+
+            client = Anthropic(api_key=key, base_url=base_url, max_retries=0, timeout=provider_timeout)
+
+        else:
+            print_error(f'Provider {provider_name} is not supported.')
+            sys.exit(1)
+
+        # Retries are left to request_with_retries, which shares the rate limit state between processes
+        provider_clients[provider_name] = client
+        return client
+
+
+# Manifest files that identify a project's language; a match in the project root weighs the most
+language_indicator_files = {
+    'package.json': 'Node.js', 'yarn.lock': 'Node.js', 'package-lock.json': 'Node.js',
+    'npm-shrinkwrap.json': 'Node.js',
+    'requirements.txt': 'Python', 'Pipfile': 'Python', 'pyproject.toml': 'Python', 'setup.py': 'Python',
+    'setup.cfg': 'Python', 'manage.py': 'Python',
+    'pom.xml': 'Java', 'build.gradle': 'Java', 'build.gradle.kts': 'Java', 'build.xml': 'Java',
+    '.java-version': 'Java',
+    'go.mod': 'Go', 'Gopkg.lock': 'Go',
+    'composer.json': 'PHP', 'composer.lock': 'PHP', 'index.php': 'PHP',
+    'Gemfile': 'Ruby', 'Gemfile.lock': 'Ruby', 'Rakefile': 'Ruby', 'config.ru': 'Ruby', '.ruby-version': 'Ruby',
+    'Cargo.toml': 'Rust', 'Cargo.lock': 'Rust',
+    'stack.yaml': 'Haskell', 'cabal.project': 'Haskell',
+    'Package.swift': 'Swift',
+    'mix.exs': 'Elixir',
+    'pubspec.yaml': 'Dart',
+    'build.sbt': 'Scala',
+    'Makefile.PL': 'Perl', 'Build.PL': 'Perl',
+}
+
+# Project/solution file extensions that identify a language as strongly as a manifest
+language_indicator_extensions = {
+    '.csproj': 'C#', '.sln': 'C#',
+    '.cabal': 'Haskell',
+    '.xcodeproj': 'Swift', '.xcworkspace': 'Swift',
+    '.Rproj': 'R',
+}
+
+# Source file extensions; each file counts once towards its language
+language_source_extensions = {
+    '.js': 'JavaScript', '.jsx': 'JavaScript', '.mjs': 'JavaScript', '.cjs': 'JavaScript',
+    '.ts': 'TypeScript', '.tsx': 'TypeScript',
+    '.py': 'Python',
+    '.java': 'Java',
+    '.kt': 'Kotlin', '.kts': 'Kotlin',
+    '.go': 'Go',
+    '.php': 'PHP',
+    '.rb': 'Ruby',
+    '.rs': 'Rust',
+    '.hs': 'Haskell',
+    '.swift': 'Swift',
+    '.ex': 'Elixir', '.exs': 'Elixir',
+    '.dart': 'Dart',
+    '.scala': 'Scala',
+    '.pl': 'Perl', '.pm': 'Perl',
+    '.r': 'R', '.R': 'R',
+    '.cs': 'C#',
+    '.c': 'C/C++', '.cpp': 'C/C++', '.cc': 'C/C++', '.h': 'C/C++', '.hpp': 'C/C++',
+}
+
+root_indicator_weight = 50
+nested_indicator_weight = 10
+source_file_weight = 1
+
+# Dependency, build and tooling directories that say nothing about the project's own language
+language_ignored_dirs = {
+    '.git', '.hg', '.svn', 'node_modules', 'bower_components', 'vendor', 'venv', '.venv', 'env', '__pycache__',
+    '.tox', '.nox', '.mypy_cache', '.pytest_cache', 'build', 'dist', 'target', 'out', 'bin', 'obj', '.gradle',
+    '.next', '.nuxt', 'coverage', 'Pods', '.idea', '.vscode', 'site-packages',
+}
+
+# Bounds for the file enumeration, so detection stays fast on huge trees
+language_scan_max_files = 20000
+language_scan_max_depth = 8
+
+
+def list_git_files(project_path, max_files):
+    """Yield tracked and untracked (non-ignored) files reported by git ls-files, stopping after max_files."""
+    process = subprocess.Popen(['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard'],
+                               cwd=project_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
     try:
-        root_files = os.listdir(project_path)
-    except Exception:
-        return "Unknown"
-
-    # Check for indicator files in the project root
-    for prog_language, indicators in indicator_files.items():
-        for indicator in indicators:
-            # If the indicator is specified with a subdirectory (e.g., 'project/build.properties')
-            if os.path.sep in indicator:
-                if os.path.exists(os.path.join(project_path, indicator)):
-                    return prog_language
+        pending = b''
+        count = 0
+        while chunk := process.stdout.read(65536):
+            *paths, pending = (pending + chunk).split(b'\0')
+            for path in paths:
+                yield path.decode('utf-8', errors='replace')
+                count += 1
+                if count >= max_files:
+                    return
+    finally:
+        process.kill()
+        process.wait()
+
+
+def scan_project_files(project_path, max_files, max_depth):
+    """Yield files with a breadth-first os.scandir walk that prunes ignored directories."""
+    count = 0
+    pending_dirs = deque([('', 0)])
+    while pending_dirs:
+        relative_dir, depth = pending_dirs.popleft()
+        try:
+            entries = list(os.scandir(os.path.join(project_path, relative_dir)))
+        except OSError:
+            continue
+        for entry in entries:
+            relative_path = os.path.join(relative_dir, entry.name)
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in language_ignored_dirs:
+                    continue
+                if depth + 1 < max_depth:
+                    pending_dirs.append((relative_path, depth + 1))
+                continue
+            yield relative_path
+            count += 1
+            if count >= max_files:
+                return
+
+
+def list_project_files(project_path):
+    """List the project's files through git when possible, falling back to a bounded directory scan."""
+    files = [path for path in list_git_files(project_path, language_scan_max_files)
+             if not language_ignored_dirs.intersection(path.split('/')[:-1])]
+    if files:
+        return files
+    return list(scan_project_files(project_path, language_scan_max_files, language_scan_max_depth))
+
+
+def score_project_languages(files):
+    """Weigh manifests (heavier in the project root) and source files to score each language."""
+    scores = {}
+    indicator_dirs = set()
+    for path in files:
+        parts = path.replace(os.sep, '/').split('/')
+        name = parts[-1]
+
+        # Indicators such as Foo.xcodeproj are directories: count each one once, not once per file inside it
+        for index, part in enumerate(parts[:-1]):
+            extension = os.path.splitext(part)[1]
+            if extension in language_indicator_extensions:
+                indicator_dir = '/'.join(parts[:index + 1])
+                if indicator_dir not in indicator_dirs:
+                    indicator_dirs.add(indicator_dir)
+                    weight = root_indicator_weight if index == 0 else nested_indicator_weight
+                    prog_language = language_indicator_extensions[extension]
+                    scores[prog_language] = scores.get(prog_language, 0) + weight
+                break
+        else:
+            prog_language = language_indicator_extensions.get(os.path.splitext(name)[1])
+            if prog_language:
+                weight = root_indicator_weight if len(parts) == 1 else nested_indicator_weight
+                scores[prog_language] = scores.get(prog_language, 0) + weight
+
+        if name in language_indicator_files:
+            weight = root_indicator_weight if len(parts) == 1 else nested_indicator_weight
+            prog_language = language_indicator_files[name]
+            scores[prog_language] = scores.get(prog_language, 0) + weight
+
+        prog_language = language_source_extensions.get(os.path.splitext(name)[1])
+        if prog_language:
+            scores[prog_language] = scores.get(prog_language, 0) + source_file_weight
+    return scores
+
+
+def get_language_cache_signature(git_dir):
+    """Modification times of the index and HEAD files; any commit, checkout, pull or add changes them."""
+    signature = []
+    for name in ['index', 'HEAD', os.path.join('logs', 'HEAD')]:
+        try:
+            signature.append(os.stat(os.path.join(git_dir, name)).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return signature
+
+
+def detect_project_language(project_path):
+    """Detect the main language of the project, cached in .git/gitai until the index or HEAD changes."""
+    project_path = os.path.abspath(project_path)
+    git_dir = get_git_dir(project_path)
+    cache_file = os.path.join(git_dir, 'gitai', 'language.json') if git_dir else None
+    signature = get_language_cache_signature(git_dir) if git_dir else None
+
+    cache = {}
+    if cache_file:
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            cache = {}
+        entry = cache.get(project_path)
+        if entry and entry.get('signature') == signature:
+            print_verbose(f"Language detection cache hit: {entry['language']}")
+            return entry['language']
+
+    scores = score_project_languages(list_project_files(project_path))
+    detected_language = max(scores, key=scores.get) if scores else 'Unknown'
+    print_verbose('Language scores: ' + ', '.join(
+        f'{name}={score}' for name, score in sorted(scores.items(), key=lambda item: -item[1])[:5]))
+
+    if cache_file:
+        cache[project_path] = {'signature': signature, 'language': detected_language}
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, 'w', encoding='utf-8') as file:
+                json.dump(cache, file)
+        except OSError as e:
+            print_verbose(f'Could not save the language detection cache: {e}')
+
+    return detected_language
+
+
+def estimate_tokens(text):
+    """Rough token estimate (about 4 characters per token) used for budgeting requests."""
+    return len(text) // 4 + 1
+
+
+# Hunk positions and blob ids change whenever an earlier part of the file does; they are left out of content keys
+diff_position_pattern = re.compile(r'^index [0-9a-f]+\.\.[0-9a-f]+.*\n|(?<=^@@ )-\d+(?:,\d+)? \+\d+(?:,\d+)? (?=@@)',
+                                   re.MULTILINE)
+
+
+def get_content_key(*parts):
+    """Hash of diff text (and whatever else shapes its summary), independent of where the hunks sit in the file."""
+    material = json.dumps([diff_position_pattern.sub('', part) if isinstance(part, str) else part for part in parts])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def pack_chunks_by_content(units, max_tokens):
+    """Pack consecutive units into chunks of at most max_tokens, with boundaries chosen by content.
+
+    Besides the size limit, a chunk ends after a unit whose hash falls below
+    its share of the budget, so most boundaries do not depend on what comes
+    before them: editing one file changes the chunks around it, and the others
+    keep hitting the summary cache.
+    """
+    target_tokens = max(1, max_tokens)
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append(''.join(current))
+            current = []
+            current_tokens = 0
+        current.append(unit)
+        current_tokens += unit_tokens
+        if int(get_content_key(unit)[:15], 16) / 16 ** 15 < unit_tokens / target_tokens:
+            chunks.append(''.join(current))
+            current = []
+            current_tokens = 0
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def split_diff(diff_output, max_tokens):
+    """Split a unified diff into chunks of whole files, falling back to hunks for files above max_tokens."""
+    max_chars = max_tokens * 4
+    units = []
+    for file_diff in re.split(r'(?m)^(?=diff --git )', diff_output):
+        if not file_diff.strip():
+            continue
+        if estimate_tokens(file_diff) <= max_tokens:
+            units.append(file_diff)
+            continue
+
+        # Repeat the file header in front of every hunk so each chunk is self-describing
+        header, *hunks = re.split(r'(?m)^(?=@@ )', file_diff)
+        for hunk in hunks or ['']:
+            unit = header + hunk
+            if len(unit) > max_chars:
+                unit = unit[:max_chars] + '\n... (hunk truncated)\n'
+            units.append(unit)
+
+    return pack_chunks_by_content(units, max_tokens)
+
+
+def summarize_diff_chunk(chunk, project_language):
+    """Map step: summarize one chunk of a large diff."""
+    # The instructions are identical for every chunk of the run: keep them in the cacheable prefix
+    prompt_prefix = dedent(f"""
+    Below is one part of the 'git diff' output of a project that uses the programming language {project_language}.
+    The full diff is too large to be analyzed at once, so each part is summarized separately.
+
+    Summarize the changes in this part as a short bullet list. For each modified file, state its name and what was
+    added, changed, or removed, and why when it is evident from the code. Do not speculate about other parts of the diff.
+    Write the summary in English; it will be used to generate the final commit message.
+
+    """).lstrip()
+
+    return call_provider_api(f"```\n{chunk}\n```", system_prompt=summary_system_prompt, max_tokens=400,
+                             prompt_prefix=prompt_prefix)
+
+
+def merge_change_summaries(summaries):
+    """Reduce step: condense several partial change summaries into one."""
+    prompt = dedent("""
+    Below are partial summaries of the changes in a single 'git diff'. Merge them into one concise bullet list,
+    grouping related changes together and keeping the names of the main modified files.
+
+    """) + '\n\n'.join(summaries)
+
+    return call_provider_api(prompt, system_prompt=summary_system_prompt, max_tokens=600)
+
+
+def summarize_cached(executor, function, items, keys):
+    """Map function over items, reusing the summaries cached under keys and caching the new ones.
+
+    Returns (results, cached_count). Only the items without a cached summary
+    reach the provider, so a rerun costs in proportion to what changed.
+    """
+    cache_dir = get_cache_dir('summaries') if use_cache else None
+    results = [load_cached_message(cache_dir, key) if cache_dir else None for key in keys]
+    missing = [index for index, result in enumerate(results) if result is None]
+    for index, result in zip(missing, executor.map(in_current_context(function), [items[i] for i in missing])):
+        results[index] = result
+        if cache_dir:
+            store_cached_message(cache_dir, keys[index], result)
+    return results, len(items) - len(missing)
+
+
+def summarize_large_diff(diff_output, project_language, token_budget):
+    """Summarize a diff that does not fit in the token budget using a concurrent map-reduce pipeline.
+
+    Chunk and merge summaries are cached by content, so a rerun after a small
+    edit only summarizes the chunks that changed.
+    """
+    chunks = split_diff(diff_output, token_budget)
+    keys = [get_content_key('chunk', chunk, project_language, provider, model, prompt_template_version)
+            for chunk in chunks]
+    print_ai_message(f'Diff too large for a single request (~{estimate_tokens(diff_output)} tokens, '
+                     f'budget {token_budget}): summarizing {len(chunks)} chunks, '
+                     f'up to {map_reduce_concurrency} at a time.')
+
+    with ThreadPoolExecutor(max_workers=map_reduce_concurrency) as executor:
+        summaries, cached = summarize_cached(executor, lambda chunk: summarize_diff_chunk(chunk, project_language),
+                                             chunks, keys)
+        if cached:
+            print_info(f'Reused the cached summaries of {cached} of {len(chunks)} chunks.')
+
+        # Keep reducing until the combined summaries fit in a single request
+        while len(summaries) > 1 and estimate_tokens('\n\n'.join(summaries)) > token_budget:
+            groups = pack_chunks_by_content([summary + '\n\n' for summary in summaries], token_budget)
+            if len(groups) == len(summaries):
+                break
+            keys = [get_content_key('merge', group, provider, model, prompt_template_version) for group in groups]
+            summaries, cached = summarize_cached(executor, lambda group: merge_change_summaries([group]), groups, keys)
+            print_verbose(f'Merged the summaries into {len(groups)} group(s), {cached} from the cache')
+
+    return '\n\n'.join(summaries)
+
+
+# Dependency lockfiles: their churn only says "dependencies were updated"
+lockfile_names = {
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'bun.lockb', 'Pipfile.lock',
+    'poetry.lock', 'uv.lock', 'pdm.lock', 'Gemfile.lock', 'Cargo.lock', 'composer.lock', 'go.sum', 'mix.lock',
+    'pubspec.lock', 'Podfile.lock', 'Package.resolved', 'gradle.lockfile', 'packages.lock.json', 'flake.lock',
+}
+
+# Generated, minified and vendored paths, matched with fnmatch against the full path
+generated_path_patterns = [
+    '*.min.js', '*.min.css', '*.map', '*.bundle.js', '*.chunk.js', '*_pb2.py', '*_pb2_grpc.py', '*.pb.go',
+    '*.pb.cc', '*.pb.h', '*.g.dart', '*.freezed.dart', '*.generated.*', '*.snap', '*.svg',
+    'vendor/*', '*/vendor/*', 'node_modules/*', '*/node_modules/*', 'third_party/*', '*/third_party/*',
+    'dist/*', 'build/*', 'generated/*', '*/generated/*', '__generated__/*', '*/__generated__/*',
+]
+
+documentation_extensions = {'.md', '.rst', '.txt', '.adoc'}
+
+# Lines that start a definition; hunks containing them usually matter most for the commit message
+definition_pattern = re.compile(
+    r'^[+-]\s*(?:export\s+)?(?:async\s+)?(?:def|class|function|func|fn|interface|struct|enum|trait|impl|module|'
+    r'public|private|protected|type)\b', re.MULTILINE)
+
+# Hard ceiling for the diff sent to the provider, after compaction (MAX_DIFF_TOKENS)
+max_diff_tokens = 100000
+
+# Memory ceiling for the raw diff read from git (MAX_DIFF_SIZE_MB); a single file may use at most a quarter of it,
+# so one huge file cannot crowd out the rest of the diff. Output beyond the ceiling is never read.
+max_diff_size_mb = 8
+
+# When trivial changes get a locally generated message instead of a provider round trip (FAST_PATH_POLICY):
+# never, safe (renames, lockfile bumps and whitespace-only changes) or always (docs-only edits as well)
+fast_path_policies = ['never', 'safe', 'always']
+fast_path_setting = 'safe'
+# The policy of the current run: --fast-path, or else the setting
+fast_path_policy = 'safe'
+fast_path_categories = {'rename': 'safe', 'lockfile': 'safe', 'whitespace': 'safe', 'docs': 'always'}
+
+# Most commits --split creates from one working tree (MAX_SPLIT_GROUPS); smaller groups beyond it are merged
+max_split_groups = 6
+# Recent commits read to find files that usually change together, and the largest commit that still counts
+split_history_commits = 200
+split_history_max_files = 30
+
+
+def classify_diff_path(path):
+    """Classify a changed path as 'lockfile', 'generated', 'docs', 'test' or 'source'."""
+    if os.path.basename(path) in lockfile_names:
+        return 'lockfile'
+    if any(fnmatch.fnmatch(path, pattern) for pattern in generated_path_patterns):
+        return 'generated'
+    if os.path.splitext(path)[1].lower() in documentation_extensions or path.startswith('docs/'):
+        return 'docs'
+    if re.search(r'(^|/)(tests?|__tests__|spec)/|(^|/)test_[^/]*$|_test\.[^/]*$|\.(test|spec)\.[^/]*$', path):
+        return 'test'
+    return 'source'
+
+
+def get_diff_base():
+    """Diff against HEAD so staged and unstaged changes (everything 'git add .' commits) are included."""
+    _, returncode = run_git_command(['git', 'rev-parse', '--verify', '--quiet', 'HEAD'], exit_on_error=False)
+    # Before the first commit there is no HEAD: only the staged changes can be diffed
+    return ['HEAD'] if returncode == 0 else ['--cached']
+
+
+def parse_numstat(numstat_output):
+    """Parse 'git diff --numstat -M -z' into dicts with path, old_path, added, deleted and binary."""
+    entries = []
+    records = iter(numstat_output.split('\0'))
+    for record in records:
+        if not record:
+            continue
+        added, deleted, path = record.split('\t', 2)
+        old_path = None
+        if not path:
+            # Renames: the old and new paths follow in their own records
+            old_path = next(records, '')
+            path = next(records, '')
+        binary = added == '-'
+        entries.append({
+            'path': path,
+            'old_path': old_path,
+            'added': 0 if binary else int(added),
+            'deleted': 0 if binary else int(deleted),
+            'binary': binary,
+        })
+    return entries
+
+
+def get_diff_numstat():
+    output, _ = run_git_command(['git', 'diff', *get_diff_base(), '--numstat', '-M', '-z'], raw_output=True)
+    return parse_numstat(output)
+
+
+def split_diff_hunks(diff_output):
+    """Split a unified diff into (file header, [hunks]) pairs."""
+    files = []
+    for file_diff in re.split(r'(?m)^(?=diff --git )', diff_output):
+        if file_diff.strip():
+            header, *hunks = re.split(r'(?m)^(?=@@ )', file_diff)
+            files.append((header, hunks))
+    return files
+
+
+def get_diff_header_path(header):
+    match = (re.search(r'^\+\+\+ b/(.*)$', header, re.MULTILINE)
+             or re.search(r'^diff --git a/.* b/(.*)$', header, re.MULTILINE))
+    return match.group(1) if match else ''
+
+
+def score_hunk(path, hunk):
+    """Importance of a hunk: source over tests over docs, definitions first, small focused hunks preferred."""
+    kind_weight = {'source': 3.0, 'test': 1.5, 'docs': 1.0}.get(classify_diff_path(path), 0.5)
+    changed_lines = sum(1 for line in hunk.splitlines() if line[:1] in ('+', '-'))
+    definitions = len(definition_pattern.findall(hunk))
+    return kind_weight * (1 + definitions) / (1 + changed_lines) ** 0.5
+
+
+def rank_hunks_to_budget(diff_output, token_budget):
+    """Keep the most important hunks that fit in the budget, in their original order.
+
+    Returns the reduced diff and the number of omitted hunks per path.
+    """
+    files = split_diff_hunks(diff_output)
+    candidates = []
+    for file_index, (header, hunks) in enumerate(files):
+        path = get_diff_header_path(header)
+        for hunk_index, hunk in enumerate(hunks):
+            candidates.append((score_hunk(path, hunk), file_index, hunk_index))
+
+    selected = set()
+    headers_used = set()
+    used_tokens = 0
+    for _, file_index, hunk_index in sorted(candidates, key=lambda candidate: -candidate[0]):
+        header, hunks = files[file_index]
+        cost = estimate_tokens(hunks[hunk_index]) + (0 if file_index in headers_used else estimate_tokens(header))
+        if used_tokens + cost > token_budget:
+            continue
+        selected.add((file_index, hunk_index))
+        headers_used.add(file_index)
+        used_tokens += cost
+
+    parts = []
+    omitted = {}
+    for file_index, (header, hunks) in enumerate(files):
+        kept = [hunk for hunk_index, hunk in enumerate(hunks) if (file_index, hunk_index) in selected]
+        if len(kept) < len(hunks):
+            omitted[get_diff_header_path(header)] = len(hunks) - len(kept)
+        if kept:
+            parts.append(header)
+            parts.extend(kept)
+        elif not hunks and used_tokens + estimate_tokens(header) <= token_budget:
+            # Headers of hunk-less changes (mode changes, empty files) use the budget too
+            parts.append(header)
+            used_tokens += estimate_tokens(header)
+    return ''.join(parts), omitted
+
+
+def build_pathspec(kept_paths, dropped_paths):
+    """Pathspec selecting the kept paths, written as exclusions when that is the shorter list."""
+    if not dropped_paths:
+        return []
+    if len(kept_paths) <= len(dropped_paths):
+        return ['--'] + [f':(literal){path}' for path in kept_paths]
+    return ['--', '.'] + [f':(exclude,literal){path}' for path in dropped_paths]
+
+
+def capture_compacted_diff(untracked_paths=(), numstat=None, only_listed=False):
+    """Capture the diff to send to the provider, without the noise that wastes tokens.
+
+    Lockfiles, generated/vendored files, binaries and pure renames become one-line
+    notes, context lines are reduced while the diff exceeds the per-request token
+    budget, and if it still exceeds MAX_DIFF_TOKENS the least important hunks are
+    dropped. With only_listed, the diff covers just the files in numstat instead
+    of the whole working tree.
+    """
+    base = get_diff_base()
+    notes = []
+    kept_paths = []
+    dropped_paths = []
+    estimated_dropped_tokens = 0
+
+    for entry in get_diff_numstat() if numstat is None else numstat:
+        path = entry['path']
+        kind = classify_diff_path(path)
+        if entry['old_path'] and entry['added'] == 0 and entry['deleted'] == 0:
+            notes.append(f"renamed: {entry['old_path']} -> {path}")
+        elif entry['binary']:
+            notes.append(f'binary file changed: {path}')
+        elif kind in ('lockfile', 'generated'):
+            label = 'lockfile' if kind == 'lockfile' else 'generated file'
+            notes.append(f"{label} updated (diff omitted, +{entry['added']} -{entry['deleted']} lines): {path}")
+        else:
+            kept_paths.append(path)
+            if entry['old_path']:
+                # Keep the old path in the pathspec too, otherwise git cannot pair the rename
+                kept_paths.append(entry['old_path'])
+            continue
+        dropped_paths.append(path)
+        if entry['old_path']:
+            dropped_paths.append(entry['old_path'])
+        # Roughly 10 tokens per changed line of a diff, used only for reporting
+        estimated_dropped_tokens += (entry['added'] + entry['deleted']) * 10
+
+    for path in untracked_paths:
+        notes.append(f'new untracked file (diff not available): {path}')
+
+    diff_output = ''
+    raw_tokens = estimated_dropped_tokens
+    if kept_paths:
+        token_budget = get_token_budget()
+        max_bytes = max_diff_size_mb * 1024 * 1024
+        pathspec = ['--'] + [f':(literal){path}' for path in kept_paths] if only_listed else \
+            build_pathspec(kept_paths, dropped_paths)
+        for context_lines in (3, 1, 0):
+            # Release the previous attempt before reading the next one, so only one copy is ever held
+            diff_output = ''
+            diff_output, truncated = read_git_diff(['git', 'diff', *base, '-M', f'-U{context_lines}', *pathspec],
+                                                   max_bytes, max_bytes // 4)
+            if context_lines == 3:
+                raw_tokens += estimate_tokens(diff_output)
+                raw_tokens += sum(skipped // 4 for skipped in truncated.values() if skipped)
+            if estimate_tokens(diff_output) <= token_budget:
+                break
+            print_verbose(f'Diff above the {token_budget} token budget with {context_lines} context line(s)')
+
+        for path, skipped in truncated.items():
+            if skipped is None:
+                notes.append(f'diff above the {max_diff_size_mb} MB limit, not read from this file on: {path}')
             else:
-                if indicator in root_files:
-                    return prog_language
-
-    # Check for file extensions in the project root
-    for prog_language, extensions in extension_indicators.items():
-        for file in root_files:
-            if any(file.endswith(ext) for ext in extensions):
-                return prog_language
-
-    # Recursive search for indicator files in subdirectories
-    for root, dirs, files in os.walk(project_path):
-        for file in files:
-            # Node.js indicators
-            if file in ['package.json', 'yarn.lock', 'package-lock.json']:
-                return 'Node.js'
-            # PHP indicator
-            if file.endswith('.php'):
-                return 'PHP'
-            # Python indicator
-            if file.endswith('.py'):
-                return 'Python'
-            # Java indicator
-            if file.endswith('.java'):
-                return 'Java'
-            # Ruby indicators
-            if file in ['Gemfile', 'Rakefile']:
-                return 'Ruby'
-            # Rust indicators
-            if file in ['Cargo.toml', 'Cargo.lock']:
-                return 'Rust'
-            # C# indicator
-            if file.endswith('.csproj'):
-                return 'C#'
-            # Dart indicator
-            if file == 'pubspec.yaml':
-                return 'Dart'
-            # Swift indicator
-            if file == 'Package.swift':
-                return 'Swift'
-
-    return "Unknown"
-
-
-def generate_commit_message(diff_output, project_language, base_message):
-    prompt = dedent(f"""
-    Based on the information provided below, create a commit message following the Conventional Commits standard, 
-    which is widely adopted to make commit messages more descriptive and useful. This standard uses specific prefixes 
-    to categorize the type of change made, followed by a brief description. 
+                notes.append(f'diff truncated, {skipped // 1024} KB above the per-file limit left out: {path}')
+
+        if estimate_tokens(diff_output) > max_diff_tokens:
+            diff_output, omitted = rank_hunks_to_budget(diff_output, max_diff_tokens)
+            for path, count in omitted.items():
+                notes.append(f'{count} less relevant hunk(s) omitted to fit the token budget: {path}')
+
+    compacted = diff_output
+    if notes:
+        compacted += '\nOther changes (summarized to save tokens):\n' + '\n'.join(f'- {note}' for note in notes)
+
+    saved_tokens = max(0, raw_tokens - estimate_tokens(compacted))
+    if saved_tokens:
+        print_info(f'Diff compaction saved ~{saved_tokens} tokens (~{raw_tokens} -> ~{estimate_tokens(compacted)}).')
+    for note in notes:
+        print_verbose(f'Compacted: {note}')
+    return compacted
+
+
+# Local commit messages of the fast path, for the languages they are available in
+fast_path_templates = {
+    'en': {
+        'rename': ('chore: rename {old} to {new}', 'chore: rename {count} files',
+                   'Rename files without changing their content:'),
+        'lockfile': ('chore(deps): update {name}', 'chore(deps): update dependency lockfiles',
+                     'Update the dependency lockfiles:'),
+        'whitespace': ('chore: fix whitespace in {name}', 'chore: fix whitespace in {count} files',
+                       'Whitespace-only changes, with no change in behavior:'),
+        'docs': ('docs: update {name}', 'docs: update documentation', 'Update the documentation:'),
+    },
+    'pt': {
+        'rename': ('chore: renomeia {old} para {new}', 'chore: renomeia {count} arquivos',
+                   'Renomeia arquivos sem alterar seu conteúdo:'),
+        'lockfile': ('chore(deps): atualiza {name}', 'chore(deps): atualiza lockfiles de dependências',
+                     'Atualiza os lockfiles de dependências:'),
+        'whitespace': ('chore: corrige espaços em branco em {name}', 'chore: corrige espaços em branco em {count} '
+                       'arquivos', 'Alterações apenas em espaços em branco, sem mudança de comportamento:'),
+        'docs': ('docs: atualiza {name}', 'docs: atualiza a documentação', 'Atualiza a documentação:'),
+    },
+}
+# LANGUAGE names that select the local messages; locale codes such as pt_BR or en-US select them by language code
+fast_path_language_names = {
+    'english': 'en', 'inglês': 'en', 'ingles': 'en',
+    'portuguese': 'pt', 'português': 'pt', 'portugues': 'pt', 'brazilian portuguese': 'pt',
+    'português brasileiro': 'pt', 'portugues brasileiro': 'pt', 'português do brasil': 'pt',
+    'portugues do brasil': 'pt',
+}
+
+
+def get_fast_path_templates(language):
+    """Return the local commit messages for a LANGUAGE value, or None when there are none for it."""
+    value = re.sub(r'\s*\(.*\)$', '', (language or '').strip().lower())
+    if value in fast_path_language_names:
+        return fast_path_templates[fast_path_language_names[value]]
+    # Locale codes: en, pt_BR, en-US, pt_BR.UTF-8
+    match = re.fullmatch(r'([a-z]{2})(?:[_-][a-z]{2})?(?:\.[\w-]+)?', value)
+    return fast_path_templates.get(match.group(1)) if match else None
+
+
+def has_only_whitespace_changes(paths):
+    """Whether the changes to the given paths disappear when trailing whitespace and blank lines are ignored.
+
+    Changes in indentation are real changes: they alter the behavior of Python
+    or YAML files. --quiet lets git stop at the first real change instead of
+    diffing every file.
+    """
+    _, returncode = run_git_command(['git', 'diff', *get_diff_base(), '--quiet', '--ignore-space-at-eol',
+                                     '--ignore-cr-at-eol', '--ignore-blank-lines',
+                                     '--', *[f':(literal){path}' for path in paths]], exit_on_error=False)
+    return returncode == 0
+
+
+def classify_trivial_change(numstat, untracked_paths):
+    """Decide whether a change is trivial enough for a local commit message.
+
+    Returns (category, reason): category is 'rename', 'lockfile', 'whitespace',
+    'docs' or None, and reason explains the decision for the verbose output.
+    """
+    paths = [entry['path'] for entry in numstat] + list(untracked_paths)
+    if not paths:
+        return None, 'no changes in the diff'
+    if any(entry['binary'] for entry in numstat):
+        return None, 'binary files changed'
+
+    if not untracked_paths and all(entry['old_path'] and not entry['added'] and not entry['deleted']
+                                   for entry in numstat):
+        return 'rename', f'{len(numstat)} file(s) renamed without content changes'
+    if all(classify_diff_path(path) == 'lockfile' for path in paths):
+        return 'lockfile', f"only dependency lockfiles changed ({', '.join(map(os.path.basename, paths))})"
+    if all(classify_diff_path(path) == 'docs' for path in paths):
+        return 'docs', f'only documentation changed ({len(paths)} file(s))'
+    if not untracked_paths and not any(entry['old_path'] for entry in numstat):
+        # The smallest change is checked on its own first: when it is real, the large ones never get diffed
+        paths = [entry['path'] for entry in sorted(numstat, key=lambda entry: entry['added'] + entry['deleted'])]
+        if has_only_whitespace_changes(paths[:1]) and (len(paths) == 1 or has_only_whitespace_changes(paths[1:])):
+            return 'whitespace', f'only whitespace changed in {len(numstat)} file(s)'
+
+    kinds = sorted({classify_diff_path(path) for path in paths})
+    return None, f"{len(paths)} file(s) changed ({', '.join(kinds)})"
+
+
+def build_fast_path_message(category, numstat, untracked_paths, templates):
+    single_subject, multiple_subject, body_intro = templates[category]
+    entries = list(numstat) + [{'path': path, 'old_path': None, 'added': None, 'deleted': None}
+                               for path in untracked_paths]
+
+    if len(entries) == 1:
+        entry = entries[0]
+        subject = single_subject.format(name=os.path.basename(entry['path']),
+                                        old=os.path.basename(entry['old_path'] or entry['path']),
+                                        new=os.path.basename(entry['path']))
+    else:
+        subject = multiple_subject.format(count=len(entries))
+
+    lines = []
+    for entry in entries:
+        if entry['old_path']:
+            lines.append(f"- {entry['old_path']} -> {entry['path']}")
+        elif entry['added'] is None:
+            lines.append(f"- {entry['path']} (new)")
+        else:
+            lines.append(f"- {entry['path']} (+{entry['added']} -{entry['deleted']})")
+    return f"{subject}\n\n{body_intro}\n" + '\n'.join(lines)
+
+
+def get_fast_path_message(numstat, untracked_paths, announce=True):
+    """Return a locally generated commit message when the change is trivial and the policy allows it."""
+    if fast_path_policy == 'never':
+        return None
+
+    category, reason = classify_trivial_change(numstat, untracked_paths)
+    if category is None:
+        print_verbose(f'Fast path: not trivial, {reason}')
+        return None
+    if fast_path_policy == 'safe' and fast_path_categories[category] != 'safe':
+        print_verbose(f'Fast path: {reason}, but FAST_PATH_POLICY=safe leaves {category} changes to the provider')
+        return None
+    templates = get_fast_path_templates(language)
+    if templates is None:
+        print_verbose(f'Fast path: {reason}, but there are no local messages for the language {language}')
+        return None
+
+    print_verbose(f'Fast path: {reason}')
+    if announce:
+        print_info(f'Trivial change ({category}): commit message generated locally, without calling the provider.')
+    return build_fast_path_message(category, numstat, untracked_paths, templates)
+
+
+@dataclass
+class ChangeGroup:
+    """Changed files that --split commits together."""
+    numstat: list = field(default_factory=list)
+    untracked_paths: list = field(default_factory=list)
+
+    @property
+    def paths(self):
+        """Every path the commit touches, including the old side of renames."""
+        paths = [entry['path'] for entry in self.numstat] + list(self.untracked_paths)
+        return paths + [entry['old_path'] for entry in self.numstat if entry['old_path']]
+
+
+def get_test_subject(path):
+    """Name of the module a test file covers (tests/test_models.py -> models), or None for other files."""
+    name = os.path.basename(path).split('.')[0]
+    match = re.fullmatch(r'test_?(.+)|(.+?)_?test|(.+?)_?spec', name, re.IGNORECASE)
+    if match is None and re.search(r'\.(test|spec)\.[^/]*$', path):
+        return name
+    return next((part for part in match.groups() if part), None) if match else None
+
+
+def get_co_change_counts(paths):
+    """Count how often the given paths, alone and in pairs, were committed together in recent history.
+
+    Commits touching more than split_history_max_files files (mass renames,
+    reformatting) say nothing about which files belong together and are skipped.
+    """
+    output, returncode = run_git_command(['git', 'log', f'-n{split_history_commits}', '--no-merges', '--name-only',
+                                          '--format=%x01', '-z'], exit_on_error=False, raw_output=True)
+    path_counts, pair_counts = Counter(), Counter()
+    if returncode != 0:
+        # No commits yet
+        return path_counts, pair_counts
+    wanted = set(paths)
+    for record in output.split('\x01'):
+        files = [name for name in record.strip('\0\n').split('\0') if name]
+        if len(files) > split_history_max_files:
+            continue
+        touched = sorted(wanted.intersection(files))
+        path_counts.update(touched)
+        pair_counts.update(combinations(touched, 2))
+    return path_counts, pair_counts
+
+
+def group_changes(numstat, untracked_paths):
+    """Cluster the changed files into logical groups, in the order --split commits them.
+
+    Files end up together when they share a directory (two levels deep) and a
+    language, when a test is named after a changed module, when a lockfile sits
+    next to a changed manifest, or when recent history shows them being
+    committed together most of the time. Dependency updates are committed
+    first and documentation last.
+    """
+    entries = [(entry, None) for entry in numstat] + [(None, path) for path in untracked_paths]
+    paths = [entry['path'] if entry else path for entry, path in entries]
+    parent = list(range(len(entries)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def union(first, second):
+        parent[find(first)] = find(second)
+
+    owners = {}
+
+    def join(key, index):
+        if key in owners:
+            union(index, owners[key])
+        else:
+            owners[key] = index
+
+    modules = {}
+    for index, path in enumerate(paths):
+        kind = classify_diff_path(path)
+        # git status lists a new directory, not the untracked files inside it
+        directory, name = (path.rstrip('/'), '') if path.endswith('/') else os.path.split(path)
+        if kind == 'lockfile' or name in language_indicator_files:
+            join(('dependencies', directory), index)
+        if kind == 'lockfile':
+            continue
+        area = '/'.join(directory.split('/')[:2])
+        extension = os.path.splitext(name)[1]
+        family = kind if kind == 'docs' else language_source_extensions.get(extension, 'other')
+        join((area, family), index)
+        if kind == 'source':
+            modules.setdefault(os.path.splitext(name)[0].lower(), []).append(index)
+
+    for index, path in enumerate(paths):
+        subject = get_test_subject(path) if classify_diff_path(path) == 'test' else None
+        for module_index in modules.get(subject.lower() if subject else None, []):
+            union(index, module_index)
+
+    path_counts, pair_counts = get_co_change_counts(paths)
+    index_of = {path: index for index, path in enumerate(paths)}
+    for (first, second), count in pair_counts.items():
+        if count >= 2 and count * 2 >= min(path_counts[first], path_counts[second]):
+            print_verbose(f'Split: {first} and {second} were committed together {count} time(s)')
+            union(index_of[first], index_of[second])
+
+    clusters = {}
+    for index in range(len(entries)):
+        clusters.setdefault(find(index), []).append(index)
+    clusters = sorted(clusters.values(), key=len, reverse=True)
+    if len(clusters) > max_split_groups:
+        # Keep the largest groups and commit the smallest ones together
+        clusters = clusters[:max_split_groups - 1] + [sum(clusters[max_split_groups - 1:], [])]
+
+    kind_order = {'lockfile': 0, 'source': 1, 'generated': 1, 'test': 2, 'docs': 3}
+    groups = []
+    for cluster in clusters:
+        group = ChangeGroup()
+        for index in sorted(cluster, key=lambda index: paths[index]):
+            entry, path = entries[index]
+            if entry:
+                group.numstat.append(entry)
+            else:
+                group.untracked_paths.append(path)
+        groups.append((min(kind_order[classify_diff_path(paths[index])] for index in cluster),
+                       min(paths[index] for index in cluster), group))
+    return [group for _, _, group in sorted(groups, key=lambda item: item[:2])]
+
+
+def generate_group_message(group, project_language, base_message):
+    """Generate the commit message of one --split group from its own diff, or locally when it is trivial."""
+    commit_message = get_fast_path_message(group.numstat, group.untracked_paths, announce=False)
+    if commit_message:
+        return commit_message + commit_signature
+    diff_output = capture_compacted_diff(group.untracked_paths, group.numstat, only_listed=True)
+    return generate_commit_message(diff_output, project_language, base_message)
+
+
+def get_git_dir(project_path='.'):
+    """Return the absolute .git directory of the repository containing project_path, or None outside a repo."""
+    output, returncode = run_git_command(['git', '-C', project_path, 'rev-parse', '--absolute-git-dir'],
+                                         exit_on_error=False)
+    if returncode != 0:
+        return None
+    return output.strip()
+
+
+def get_gitai_dir(project_path='.'):
+    """Return the .git/gitai directory of the repository, creating it if needed, or None outside a repo."""
+    git_dir = get_git_dir(project_path)
+    if git_dir is None:
+        return None
+    gitai_dir = os.path.join(git_dir, 'gitai')
+    os.makedirs(gitai_dir, exist_ok=True)
+    return gitai_dir
+
+
+def get_cache_key(diff_output, project_language, base_message):
+    """Hash everything that influences the generated message into a content-addressed cache key."""
+    normalized_diff = '\n'.join(line.rstrip() for line in diff_output.replace('\r\n', '\n').split('\n')).strip()
+    key_material = json.dumps([normalized_diff, base_message, project_language, language, provider, model,
+                               prompt_template_version])
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+
+def get_cache_dir(name='cache'):
+    """Cache directory under .git/gitai: 'cache' for commit messages, 'summaries' for diff chunk summaries.
+
+    None outside a repository, and when no repository was set for the run (raw diffs sent to `gitai serve`).
+    """
+    if current_repo_path.get() is None:
+        return None
+    gitai_dir = get_gitai_dir()
+    if gitai_dir is None:
+        return None
+    cache_dir = os.path.join(gitai_dir, name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def load_cached_message(cache_dir, cache_key):
+    """Return the cached commit message for the key, or None on a miss or an expired entry."""
+    cache_file = os.path.join(cache_dir, f'{cache_key}.json')
+    try:
+        if time.time() - os.path.getmtime(cache_file) > cache_max_age_days * 86400:
+            os.unlink(cache_file)
+            return None
+        with open(cache_file, 'r', encoding='utf-8') as file:
+            entry = json.load(file)
+        # Refresh the mtime so size-based eviction removes the least recently used entries first
+        os.utime(cache_file)
+        return entry['message']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def store_cached_message(cache_dir, cache_key, message):
+    """Atomically write a cache entry, then evict expired and least recently used entries."""
+    entry = {'message': message, 'provider': provider, 'model': model, 'created_at': time.time()}
+    with tempfile.NamedTemporaryFile(mode='w', dir=cache_dir, suffix='.tmp', delete=False,
+                                     encoding='utf-8') as temp_file:
+        json.dump(entry, temp_file)
+    os.replace(temp_file.name, os.path.join(cache_dir, f'{cache_key}.json'))
+    evict_cache_entries(cache_dir)
+
+
+def evict_cache_entries(cache_dir):
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.json'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    now = time.time()
+    max_age = cache_max_age_days * 86400
+    max_size = cache_max_size_mb * 1024 * 1024
+    total_size = sum(size for _, size, _ in entries)
+    # Oldest first: drop expired entries, then keep dropping until the cache fits in its size limit
+    for mtime, size, path in sorted(entries):
+        if now - mtime <= max_age and total_size <= max_size:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total_size -= size
+
+
+commit_signature = "\n\n🤖 Commit generated with [Gitai](https://github.com/leandrosilvaferreira/gitai)"
+
+
+def build_commit_prompt_prefix(language):
+    """Instructions and examples of the commit message request: the cacheable part that only depends on LANGUAGE.
+
+    Together with commit_system_prompt it must stay above the providers' prompt
+    cache minimum (see is_prefix_cacheable), or it is billed in full every time.
+    """
+    return dedent(f"""
+    Create a commit message following the Conventional Commits standard, which is widely adopted to make commit
+    messages more descriptive and useful. This standard uses specific prefixes to categorize the type of change made,
+    followed by a brief description. The project information and the changes are provided after these instructions.
 
     The ONLY accepted prefixes for this project are:
         - feat: A new feature
@@ -234,17 +1598,8 @@ def generate_commit_message(diff_output, project_language, base_message):
         - docs: Documentation changes
         - chore: Maintenance changes or minor fixes that do not alter functionality
 
-    For your information and better understanding, the project in question uses the programming language {project_language}.
-
-    Basic change description provided by the developer, which you should use as the basis for your message: '{base_message}'
-
-    Below are the detailed changes (including modified files and what was added, changed, or removed) generated by the 'git diff' command: 
-
-    ```
-    {diff_output}
-    ```
-
-    Based on the above information, improve the basic description to create an objective commit message.
+    Use the basic change description provided by the developer as the basis for your message and improve it to create
+    an objective commit message.
 
     Mandatory rules:
     - You must follow the Conventional Commits standard.
@@ -268,73 +1623,466 @@ def generate_commit_message(diff_output, project_language, base_message):
     feat: add defaultOrganizationName field to CreateUserDto
 
     Add defaultOrganizationName field to CreateUserDto for custom workspace naming. Allow users to specify a default organization name in CreateUserDto, which is used as the workspace name in UserService. This change provides flexibility for users to define their workspace name, enhancing user personalization and improving the user experience. Modified files include UserService.java and CreateUserDto.java.
+
+    More examples, one for each of the other prefixes:
+
+    fix: prevent duplicate invoices when a payment webhook is retried
+
+    Check the payment id before creating an invoice in PaymentWebhookHandler, since the provider resends the same webhook when it does not receive a response in time. Retried webhooks used to create a second invoice for the same payment. Modified files include PaymentWebhookHandler.ts and InvoiceRepository.ts.
+
+    docs: document the environment variables of the worker service
+
+    Add a configuration section to the README describing every environment variable read by the worker, with its default value and an example. New contributors no longer have to read the source code to configure a local environment. Modified files include README.md.
+
+    chore: upgrade eslint and apply the new formatting rules
+
+    Update eslint and its plugins to the latest major version and reformat the files affected by the new rules. There is no change in behavior; the upgrade keeps the tooling supported and removes deprecation warnings from the build. Modified files include package.json, .eslintrc.js and package-lock.json.
     </output_format>
-    """)
 
-    commit_message = call_provider_api(prompt)
-    signature = "\n\n🤖 Commit generated with [Gitai](https://github.com/leandrosilvaferreira/gitai)"
+    """).lstrip()
+
+
+def count_cache_result(kind):
+    """Count a response cache hit or miss for the current run, when it keeps counters."""
+    stats = cache_stats.get()
+    if stats is not None:
+        stats[kind] += 1
+
+
+def generate_commit_message(diff_output, project_language, base_message, on_token=None):
+    """Generate (or reuse) the commit message for the diff, with the Gitai signature appended.
+
+    A base_message of None marks a speculative generation by `gitai watch`: it is
+    stored in .git/gitai/speculative, keyed by the diff alone, and any later run
+    on the same diff reuses it whatever its base message.
+    """
+    signature = commit_signature
+
+    speculative = base_message is None
+    cache_dir = get_cache_dir('speculative' if speculative else 'cache') if use_cache else None
+    cache_key = get_cache_key(diff_output, project_language, base_message) if cache_dir else None
+    if cache_dir:
+        cached_message = load_cached_message(cache_dir, cache_key)
+        if cached_message is not None:
+            count_cache_result('hits')
+            print_verbose(f'Response cache hit: {cache_key[:12]}')
+            print_info('Reusing the commit message generated for this exact diff.')
+            return cached_message + signature
+        speculative_key = get_cache_key(diff_output, project_language, None)
+        speculative_dir = get_cache_dir('speculative') if not speculative else None
+        speculative_message = load_cached_message(speculative_dir, speculative_key) if speculative_dir else None
+        if speculative_message is not None:
+            count_cache_result('hits')
+            print_verbose(f'Speculative message hit: {speculative_key[:12]}')
+            print_info('Using the commit message pre-generated by gitai watch for this exact diff.')
+            return speculative_message + signature
+        count_cache_result('misses')
+        print_verbose(f'Response cache miss: {cache_key[:12]}')
+
+    token_budget = get_token_budget()
+    if estimate_tokens(diff_output) > token_budget:
+        changes = summarize_large_diff(diff_output, project_language, token_budget)
+        changes_description = ("Below is a summary of the changes (including modified files and what was added, "
+                               "changed, or removed), produced from the 'git diff' output, which was too large to be "
+                               "included in full:")
+    else:
+        changes = diff_output
+        changes_description = ("Below are the detailed changes (including modified files and what was added, "
+                               "changed, or removed) generated by the 'git diff' command:")
+
+    # Everything that is the same on every call comes first, so providers can serve it from their prompt cache
+    prompt_prefix = build_commit_prompt_prefix(language)
+
+    # The changes can be megabytes long: they are joined in once instead of going through the f-string and dedent
+    prompt = ''.join([dedent(f"""
+    For your information and better understanding, the project in question uses the programming language {project_language}.
+
+    Basic change description provided by the developer, which you should use as the basis for your message: '{base_message or ''}'
+
+    {changes_description}
+
+    ```
+    """), changes, dedent("""
+    ```
+
+    Based on the above information and the instructions given before it, create the commit message.
+    """)])
+
+    commit_message = call_provider_api(prompt, on_token=on_token, prompt_prefix=prompt_prefix, track_latency=True)
+    if cache_dir:
+        store_cached_message(cache_dir, cache_key, commit_message)
     return commit_message + signature
 
 
-def call_provider_api(prompt):
+# Default system prompt; it is cached together with build_commit_prompt_prefix
+commit_system_prompt = dedent("""
+    You are an assistant that helps generate commit messages for a Git repository. 
+    Commit messages must follow the Conventional Commits standard, which uses ONLY these specific prefixes to categorize the type of change made: feat, fix, docs, chore. 
+    The description must be concise and clear, explaining what was done, the reason for the change, and, if applicable, the impact of the change.
+    The messages must be generated based on the changes provided by the 'git diff' command and an optional basic description provided by the user. 
+
+    Mandatory rules:
+    - DO NOT add any comments or additional explanations beyond the generated commit message.
+    - DO NOT use symbols such as ``` or any other formatting to denote the commit message.
+    - DO NOT add line breaks or whitespace before the commit message.
+    - The output must be ONLY the final commit message as per the instructions.
+    - The first line of the message must start with one of these EXACT prefixes: feat, fix, docs, chore.
+    - After the first line, always add an objective explanation of the changes made, the reason for the change, and, if applicable, the impact of the change.
+
+    <output_format>
+    CRITICAL: Your response must follow this exact structure:
+    
+    Line 1: [prefix]: [concise description]
+    (where prefix must be exactly one of: feat, fix, docs, chore)
+    Line 2: [EMPTY LINE - mandatory line break]
+    Line 3+: [detailed explanation]
+    
+    CORRECT format example:
+    feat: add user authentication system
+
+    Implement JWT-based authentication with login and registration endpoints. Add middleware for route protection and user session management. This enhancement improves application security and enables personalized user experiences.
+    
+    INCORRECT format (everything in one line):
+    feat: add user authentication system - Implement JWT-based authentication with login and registration endpoints...
+    </output_format>
+
+    If the instructions are not followed correctly, the result will not be accepted.
+""")
+
+summary_system_prompt = dedent("""
+    You are an assistant that summarizes source code changes from 'git diff' output.
+    Be factual and concise, and only describe changes that are present in the provided content.
+    The output must be ONLY the requested summary, with no additional comments.
+""")
+
+
+class RequestCancelled(Exception):
+    """Raised inside a streaming request that lost a hedged race."""
+
+
+def discard_token(fragment):
+    """on_token for requests that are streamed only so that they can be cancelled, not to show the text."""
+
+
+def collect_stream_text(fragments, on_token, timing, cancel_event=None):
+    """Forward streamed text fragments to on_token and return the accumulated text."""
+    parts = []
+    for fragment in fragments:
+        if cancel_event is not None and cancel_event.is_set():
+            raise RequestCancelled()
+        if not fragment:
+            continue
+        if not parts:
+            timing['first_token'] = time.perf_counter()
+        parts.append(fragment)
+        on_token(fragment)
+    return ''.join(parts).strip()
+
+
+def iter_chat_stream(stream, timing):
+    """Yield the text of OpenAI/Groq stream chunks, keeping the usage reported by the final chunk."""
+    for chunk in stream:
+        x_groq = getattr(chunk, 'x_groq', None)
+        usage = getattr(chunk, 'usage', None) or getattr(x_groq, 'usage', None)
+        if usage:
+            timing['usage'] = get_usage_counts(usage)
+        if chunk.choices:
+            yield chunk.choices[0].delta.content
+
+
+def get_usage_counts(usage):
+    """Normalize OpenAI/Groq and Anthropic usage to input, cached, cache write and output token counts."""
+    if usage is None:
+        return None
+    if hasattr(usage, 'input_tokens'):
+        # Anthropic reports the cached and cache-written tokens separately from input_tokens
+        cached = getattr(usage, 'cache_read_input_tokens', None) or 0
+        written = getattr(usage, 'cache_creation_input_tokens', None) or 0
+        return {'input_tokens': usage.input_tokens + cached + written, 'cached_tokens': cached,
+                'cache_write_tokens': written, 'output_tokens': usage.output_tokens}
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {'input_tokens': usage.prompt_tokens, 'cached_tokens': getattr(details, 'cached_tokens', None) or 0,
+            'cache_write_tokens': 0, 'output_tokens': usage.completion_tokens}
+
+
+def print_token_usage(usage):
+    if not usage:
+        return
+    cached = usage['cached_tokens']
+    share = f" ({cached * 100 // usage['input_tokens']}%)" if usage['input_tokens'] else ''
+    written = f", {usage['cache_write_tokens']} written to the cache" if usage['cache_write_tokens'] else ''
+    print_verbose(f"Tokens: {usage['input_tokens']} input, {cached} cached{share}{written}, "
+                  f"{usage['output_tokens']} output")
+
+
+def call_provider_api(prompt, system_prompt=None, max_tokens=500, on_token=None, prompt_prefix=None,
+                      track_latency=False):
+    """Send the prompt to the configured provider and return the response text.
+
+    When on_token is given, the response is streamed and every text fragment is
+    passed to it as soon as it arrives. prompt_prefix is the part of the user
+    message that does not change between calls; it is sent first and marked as
+    cacheable where the provider needs it. track_latency adds the request to the
+    latency histograms that tune the hedge delay; only commit message requests
+    do, so that the shorter summary requests do not skew them.
+    """
+    if not hedge_provider:
+        # Importing the SDK on a cold start is not provider latency
+        get_provider_client(provider)
+    started = time.perf_counter()
+    timing = {}
+    shown = on_token is not None
+    cancel_event = current_cancel_event.get()
+    if cancel_event is not None and on_token is None:
+        on_token = discard_token
+    if hedge_provider:
+        content = race_providers(prompt, system_prompt, max_tokens, on_token, prompt_prefix, track_latency,
+                                 cancel_event)
+    else:
+        with trace_span(f'{provider} request', 'provider', model=model,
+                        prompt_tokens=estimate_tokens((prompt_prefix or '') + prompt),
+                        streamed=on_token is not None) as span:
+            content = request_with_retries(provider, model, prompt, system_prompt, max_tokens, on_token, timing,
+                                           cancel_event, prompt_prefix)
+            if 'first_token' in timing:
+                span.args['first_token_ms'] = round((timing['first_token'] - started) * 1000)
+            if timing.get('usage'):
+                span.args.update(timing['usage'])
+        if track_latency:
+            record_latency(provider, model, time.perf_counter() - started)
+    total = time.perf_counter() - started
+    if 'first_token' in timing:
+        # The streamed text does not end with a newline
+        if verbose and shown:
+            print()
+        print_verbose(f"Time to first token: {timing['first_token'] - started:.2f}s - Total latency: {total:.2f}s")
+    else:
+        print_verbose(f"Total latency: {total:.2f}s")
+    print_token_usage(timing.get('usage'))
+    return content
+
+
+def get_latency_histograms_path():
+    return os.path.join(gitai_home, 'latency_histograms.json')
+
+
+def load_latency_histograms():
+    try:
+        with open(get_latency_histograms_path(), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_latency(provider_name, model_name, seconds):
+    """Add a latency sample to the persisted per-provider/model histogram used to tune the hedge delay.
+
+    The read-modify-write is serialized across processes with an fcntl lock, like
+    the rate limiter state, so concurrent runs do not drop each other's samples;
+    the file itself is replaced atomically, so readers never need the lock.
+    """
+    with latency_histograms_lock:
+        try:
+            os.makedirs(gitai_home, exist_ok=True)
+            with open(get_latency_histograms_path() + '.lock', 'a', encoding='utf-8') as lock_file:
+                # The lock is released when the file is closed
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                histograms = load_latency_histograms()
+                counts = histograms.get(f'{provider_name}:{model_name}', [0] * len(latency_bucket_bounds))
+                if len(counts) != len(latency_bucket_bounds):
+                    counts = [0] * len(latency_bucket_bounds)
+                bucket = next(i for i, bound in enumerate(latency_bucket_bounds) if seconds <= bound)
+                counts[bucket] += 1
+                histograms[f'{provider_name}:{model_name}'] = counts
+
+                with tempfile.NamedTemporaryFile(mode='w', dir=gitai_home, suffix='.tmp', delete=False,
+                                                 encoding='utf-8') as temp_file:
+                    json.dump(histograms, temp_file)
+                os.replace(temp_file.name, get_latency_histograms_path())
+        except OSError as e:
+            print_verbose(f'Could not save latency histograms: {e}')
+
+
+def latency_percentile(provider_name, model_name, percentile):
+    """Return the upper bound of the histogram bucket holding the percentile, or None without enough samples."""
+    counts = load_latency_histograms().get(f'{provider_name}:{model_name}')
+    if not counts or sum(counts) < hedge_min_samples:
+        return None
+    threshold = sum(counts) * percentile / 100
+    cumulative = 0
+    for bound, count in zip(latency_bucket_bounds, counts):
+        cumulative += count
+        if cumulative >= threshold:
+            return bound if bound != float('inf') else latency_bucket_bounds[-2]
+    return None
+
+
+def race_providers(prompt, system_prompt, max_tokens, on_token, prompt_prefix=None, track_latency=False,
+                   cancel_event=None):
+    """Hedged request: fire the hedge provider when the primary is slower than its usual latency.
+
+    The first valid response wins and the other request is cancelled. Both run
+    as streams so that the loser can be interrupted between chunks; the winning
+    text is handed to on_token once it is complete. Setting cancel_event (a newer
+    save in `gitai watch`) cancels both requests and raises RequestCancelled.
+    """
+    results = queue.Queue()
+    cancel_events = []
+    in_flight = {}
+
+    def attempt(provider_name, model_name, attempt_cancel_event, client_ready):
+        try:
+            get_provider_client(provider_name)
+        except Exception as e:
+            results.put((provider_name, model_name, None, e, 0.0))
+            return
+        finally:
+            client_ready.set()
+        # Timed from here, so a cold SDK import does not count as provider latency
+        started = in_flight[(provider_name, model_name)] = time.perf_counter()
+        try:
+            with trace_span(f'{provider_name} request', 'provider', model=model_name, hedged=True) as span:
+                timing = {}
+                text = request_with_retries(provider_name, model_name, prompt, system_prompt, max_tokens,
+                                            discard_token, timing, attempt_cancel_event, prompt_prefix)
+                span.args.update(timing.get('usage') or {})
+            results.put((provider_name, model_name, text, None, time.perf_counter() - started))
+        except Exception as e:
+            results.put((provider_name, model_name, None, e, time.perf_counter() - started))
+
+    def launch(provider_name, model_name):
+        attempt_cancel_event = threading.Event()
+        cancel_events.append(attempt_cancel_event)
+        client_ready = threading.Event()
+        # The start time is set by the attempt once the provider client exists
+        in_flight[(provider_name, model_name)] = None
+        # Daemon threads: a cancelled request still blocked on the network must not delay the process exit
+        threading.Thread(target=in_current_context(attempt),
+                         args=(provider_name, model_name, attempt_cancel_event, client_ready), daemon=True).start()
+        return client_ready
+
+    delay = latency_percentile(provider, model, hedge_percentile) or hedge_delay
+    print_verbose(f'Hedging to {hedge_provider}/{hedge_model} if {provider}/{model} takes longer than {delay:.2f}s')
+
+    # The delay runs from the moment the primary client exists: a cold SDK import is not a slow provider
+    launch(provider, model).wait()
+    pending = 1
+    hedged = False
+    errors = []
+    hedge_at = time.perf_counter() + delay
+    while pending:
+        if cancel_event is not None and cancel_event.is_set():
+            for attempt_cancel_event in cancel_events:
+                attempt_cancel_event.set()
+            raise RequestCancelled()
+        try:
+            timeout = None if hedged else max(0, hedge_at - time.perf_counter())
+            if cancel_event is not None:
+                # Wake up regularly to notice a cancellation
+                timeout = cancel_check_interval if timeout is None else min(timeout, cancel_check_interval)
+            provider_name, model_name, text, error, elapsed = results.get(timeout=timeout)
+        except queue.Empty:
+            if hedged or time.perf_counter() < hedge_at:
+                continue
+            print_ai_message(f'{provider} is slower than usual, hedging the request to {hedge_provider}.')
+            launch(hedge_provider, hedge_model)
+            pending += 1
+            hedged = True
+            continue
+
+        pending -= 1
+        in_flight.pop((provider_name, model_name), None)
+        if track_latency and elapsed:
+            record_latency(provider_name, model_name, elapsed)
+        if error is None and text:
+            for attempt_cancel_event in cancel_events:
+                attempt_cancel_event.set()
+            # The loser's elapsed time is a lower bound of its latency; recording it keeps the percentile honest
+            for (loser_provider, loser_model), loser_started in list(in_flight.items()):
+                if track_latency and loser_started is not None:
+                    record_latency(loser_provider, loser_model, time.perf_counter() - loser_started)
+            print_verbose(f'Hedged request won by {provider_name}/{model_name} in {elapsed:.2f}s')
+            if on_token:
+                on_token(text)
+            return text
+
+        errors.append(error or ValueError(f'Empty response from {provider_name}'))
+        print_warning(f'Request to {provider_name} failed: {errors[-1]}')
+        if not hedged and not (cancel_event is not None and cancel_event.is_set()):
+            launch(hedge_provider, hedge_model)
+            pending += 1
+            hedged = True
+
+    raise errors[-1]
+
+
+def get_prompt_cache_min_tokens(provider_name, model_name):
+    """Return the shortest prefix the provider caches for the model, or None when it has no prompt caching."""
+    matches = [name for name in prompt_cache_min_tokens_by_model if model_name and model_name.startswith(name)]
+    if matches:
+        return prompt_cache_min_tokens_by_model[max(matches, key=len)]
+    return prompt_cache_min_tokens.get(provider_name)
+
+
+def is_prefix_cacheable(provider_name, model_name, static_text):
+    """Tell whether the static part of the request is long enough for the provider to cache it.
+
+    Below the minimum a cache breakpoint only adds the cache write surcharge
+    without ever producing a hit, so it is left out.
+    """
+    min_tokens = get_prompt_cache_min_tokens(provider_name, model_name)
+    if min_tokens is None:
+        return False
+    static_tokens = estimate_tokens(static_text)
+    if static_tokens < min_tokens * prompt_cache_margin:
+        print_verbose(f'Static prompt prefix: ~{static_tokens} tokens, not clearly above the {min_tokens}-token minimum '
+                      f'that {provider_name} caches; it is billed in full')
+        return False
+    print_verbose(f'Static prompt prefix: ~{static_tokens} tokens, cacheable by {provider_name}')
+    return True
+
+
+def request_completion(provider_name, model_name, prompt, system_prompt, max_tokens, on_token, timing,
+                       cancel_event=None, prompt_prefix=None):
+    """Perform a single completion request against one provider.
+
+    The messages are laid out static-first (system prompt, then prompt_prefix,
+    then the variable prompt) so that OpenAI's automatic prefix caching and
+    Anthropic's cache_control breakpoint can reuse the unchanged part; the
+    breakpoint is only set when that part reaches the provider's minimum. The
+    token usage, including cached tokens, is stored in timing['usage'].
+    """
     messages = [
         {
             "role": "system",
-            "content": dedent(f"""
-                            You are an assistant that helps generate commit messages for a Git repository. 
-                            Commit messages must follow the Conventional Commits standard, which uses ONLY these specific prefixes to categorize the type of change made: feat, fix, docs, chore. 
-                            The description must be concise and clear, explaining what was done, the reason for the change, and, if applicable, the impact of the change.
-                            The messages must be generated based on the changes provided by the 'git diff' command and an optional basic description provided by the user. 
-
-                            Mandatory rules:
-                            - DO NOT add any comments or additional explanations beyond the generated commit message.
-                            - DO NOT use symbols such as ``` or any other formatting to denote the commit message.
-                            - DO NOT add line breaks or whitespace before the commit message.
-                            - The output must be ONLY the final commit message as per the instructions.
-                            - The first line of the message must start with one of these EXACT prefixes: feat, fix, docs, chore.
-                            - After the first line, always add an objective explanation of the changes made, the reason for the change, and, if applicable, the impact of the change.
-
-                            <output_format>
-                            CRITICAL: Your response must follow this exact structure:
-                            
-                            Line 1: [prefix]: [concise description]
-                            (where prefix must be exactly one of: feat, fix, docs, chore)
-                            Line 2: [EMPTY LINE - mandatory line break]
-                            Line 3+: [detailed explanation]
-                            
-                            CORRECT format example:
-                            feat: add user authentication system
-
-                            Implement JWT-based authentication with login and registration endpoints. Add middleware for route protection and user session management. This enhancement improves application security and enables personalized user experiences.
-                            
-                            INCORRECT format (everything in one line):
-                            feat: add user authentication system - Implement JWT-based authentication with login and registration endpoints...
-                            </output_format>
-
-                            If the instructions are not followed correctly, the result will not be accepted.
-                        """)
+            "content": system_prompt or commit_system_prompt
         },
-        {"role": "user", "content": prompt}
+        {"role": "user", "content": (prompt_prefix or '') + prompt}
     ]
 
-    match provider:
+    client = get_provider_client(provider_name)
+    cacheable = bool(prompt_prefix) and is_prefix_cacheable(provider_name, model_name,
+                                                            messages[0]["content"] + prompt_prefix)
+
+    match provider_name:
         case 'openai':
-            print_ai_message(f'Provider: {provider} - Model: {model}')
+            print_ai_message(f'Provider: {provider_name} - Model: {model_name}')
             
             # Determine which parameter to use for max tokens
             # Newer models (o1, o3, gpt-5) use max_completion_tokens
-            is_new_model = any(model.startswith(prefix) for prefix in ['o1', 'o3', 'gpt-5'])
+            is_new_model = any(model_name.startswith(prefix) for prefix in ['o1', 'o3', 'gpt-5'])
             token_param_name = 'max_completion_tokens' if is_new_model else 'max_tokens'
             
             # Prepare arguments
             kwargs = {
                 "messages": messages,
-                "model": model,
+                "model": model_name,
                 "temperature": 0.5,
                 "top_p": 1.0,
                 "frequency_penalty": 0.0,
                 "presence_penalty": 0.0,
-                token_param_name: 500
+                token_param_name: max_tokens
             }
             
             # OpenAI's o1 series models currently do not support the 'temperature' parameter for completion, 
@@ -343,77 +2091,339 @@ def call_provider_api(prompt):
             # Note: o1-preview and o1-mini typically default temperature to 1.0 and it's not adjustable in some contexts,
             # but providing it usually doesn't error unless it's strictly enforced.
             # Let's keep temperature for now unless we find it's also unsupported.
-            
-            response = openai_client.chat.completions.create(**kwargs)
+
+            if on_token:
+                with client.chat.completions.create(**kwargs, stream=True,
+                                                    stream_options={"include_usage": True}) as stream:
+                    return collect_stream_text(iter_chat_stream(stream, timing), on_token, timing, cancel_event)
+
+            response = client.chat.completions.create(**kwargs)
+            timing['usage'] = get_usage_counts(response.usage)
             return response.choices[0].message.content.strip()
         case 'groq':
-            print_ai_message(f'Provider: {provider} - Model: {model}')
-            response = groq_client.chat.completions.create(
-                messages=messages,
-                model=model,
-                temperature=0.5,
-                max_tokens=500,
-                top_p=1.0,
-                frequency_penalty=0.0,
-                presence_penalty=0.0
-            )
+            print_ai_message(f'Provider: {provider_name} - Model: {model_name}')
+            kwargs = {
+                "messages": messages,
+                "model": model_name,
+                "temperature": 0.5,
+                "max_tokens": max_tokens,
+                "top_p": 1.0,
+                "frequency_penalty": 0.0,
+                "presence_penalty": 0.0
+            }
+
+            if on_token:
+                with client.chat.completions.create(**kwargs, stream=True) as stream:
+                    return collect_stream_text(iter_chat_stream(stream, timing), on_token, timing, cancel_event)
+
+            response = client.chat.completions.create(**kwargs)
+            timing['usage'] = get_usage_counts(response.usage)
             return response.choices[0].message.content.strip()
         case 'anthropic':
-            print(f'Provider: {provider} - Model: {model}')
-            response = anthropic_client.messages.create(
-                model=model,
-                max_tokens=500,
-                temperature=0.5,
-                system=messages[0]["content"],
-                messages=[{"role": "user", "content": messages[1]["content"]}]
-            )
+            print(f'Provider: {provider_name} - Model: {model_name}')
+            content = messages[1]["content"]
+            if cacheable:
+                # The breakpoint caches the system prompt and the static prefix; the variable prompt follows it
+                content = [
+                    {"type": "text", "text": prompt_prefix, "cache_control": {"type": "ephemeral"}},
+                    {"type": "text", "text": prompt},
+                ]
+            kwargs = {
+                "model": model_name,
+                "max_tokens": max_tokens,
+                "temperature": 0.5,
+                "system": messages[0]["content"],
+                "messages": [{"role": "user", "content": content}]
+            }
+
+            if on_token:
+                with client.messages.stream(**kwargs) as stream:
+                    text = collect_stream_text(stream.text_stream, on_token, timing, cancel_event)
+                    timing['usage'] = get_usage_counts(stream.get_final_message().usage)
+                    return text
+
+            response = client.messages.create(**kwargs)
+            timing['usage'] = get_usage_counts(response.usage)
             return response.content[0].text.strip()
 
         case _:
-            print_error(f'Provider {provider} is not supported.')
+            print_error(f'Provider {provider_name} is not supported.')
             sys.exit(1)
 
 
-def run_git_command(command, exit_on_error=True):
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+def run_git_command(command, exit_on_error=True, raw_output=False):
+    with trace_span(get_git_span_name(command), 'git', command=' '.join(command)) as span:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8',
+                                errors='replace', cwd=current_repo_path.get())
+        span.args['exit_code'] = result.returncode
     if result.returncode != 0:
         if exit_on_error:
             print_error(f"Error executing command: {' '.join(command)}")
             print_error(f"Standard output: {result.stdout}")
             print_error(f"Error output: {result.stderr}")
             sys.exit(1)
+        elif raw_output:
+            return result.stdout, result.returncode
         else:
             output = result.stdout.strip() + '\n' + result.stderr.strip()
             return output, result.returncode
+    elif raw_output:
+        return result.stdout, result.returncode
     else:
         output = result.stdout.strip() + '\n' + result.stderr.strip()
         return output, result.returncode
 
 
-def has_uncommitted_changes():
-    status_output, _ = run_git_command(['git', 'status', '--porcelain'])
-    return len(status_output.strip()) > 0
-
-
-def is_branch_ahead():
-    status_output, _ = run_git_command(['git', 'status', '-uno'])
-    return "Your branch is ahead" in status_output or "Seu branch está à frente" in status_output
-
+def read_git_diff(command, max_bytes, max_file_bytes):
+    """Run a git diff command reading its output line by line, so memory stays bounded whatever the diff size.
+
+    Each file section keeps at most max_file_bytes and the whole output at most
+    max_bytes; once the ceiling is reached git is stopped instead of read to the
+    end. Returns (output, truncated), where truncated maps each cut path to the
+    number of bytes left out (None when the rest of the diff was not read).
+    """
+    buffer = bytearray()
+    truncated = {}
+    path = ''
+    file_bytes = 0
+    with trace_span(get_git_span_name(command), 'git', command=' '.join(command)) as span, \
+            tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, cwd=current_repo_path.get())
+        with process.stdout:
+            while True:
+                # The limit keeps a single huge line (minified files) from being read into memory at once
+                line = process.stdout.readline(max_file_bytes + 1)
+                if not line:
+                    break
+                if line.startswith(b'diff --git '):
+                    path = get_diff_header_path(line.decode('utf-8', errors='replace').rstrip('\n'))
+                    file_bytes = 0
+                file_bytes += len(line)
+                if file_bytes > max_file_bytes:
+                    truncated[path] = truncated.get(path, 0) + len(line)
+                    continue
+                if len(buffer) + len(line) > max_bytes:
+                    truncated[path] = None
+                    process.kill()
+                    break
+                buffer += line
+        process.wait()
+        span.args['exit_code'] = process.returncode
+        span.args['bytes'] = len(buffer)
+        if process.returncode != 0 and None not in truncated.values():
+            stderr_file.seek(0)
+            print_error(f"Error executing command: {' '.join(command)}")
+            print_error(f"Error output: {stderr_file.read().decode('utf-8', errors='replace')}")
+            sys.exit(1)
 
-def commit_changes(commit_message):
-    run_git_command(['git', 'add', '.'])
+    output = buffer.decode('utf-8', errors='replace')
+    del buffer
+    return output, truncated
+
+
+async def run_git_command_async(command, exit_on_error=True, raw_output=False):
+    """Asyncio counterpart of run_git_command, so independent git calls can overlap.
+
+    With raw_output, the untouched standard output is returned instead of the
+    stripped stdout/stderr combination (needed for NUL-separated output).
+    """
+    with trace_span(get_git_span_name(command), 'git', command=' '.join(command)) as span:
+        process = await asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                                       cwd=current_repo_path.get())
+        stdout_bytes, stderr_bytes = await process.communicate()
+        span.args['exit_code'] = process.returncode
+    stdout = stdout_bytes.decode('utf-8', errors='replace')
+    stderr = stderr_bytes.decode('utf-8', errors='replace')
+    if process.returncode != 0 and exit_on_error:
+        print_error(f"Error executing command: {' '.join(command)}")
+        print_error(f"Standard output: {stdout}")
+        print_error(f"Error output: {stderr}")
+        sys.exit(1)
+    if raw_output:
+        return stdout, process.returncode
+    output = stdout.strip() + '\n' + stderr.strip()
+    return output, process.returncode
+
+
+@dataclass
+class RepoState:
+    """Snapshot of the working tree and branch, parsed from a single git status call."""
+    branch: str | None = None
+    upstream: str | None = None
+    ahead: int = 0
+    behind: int = 0
+    changed_paths: list = field(default_factory=list)
+    untracked_paths: list = field(default_factory=list)
+    conflicted_paths: list = field(default_factory=list)
+
+    @property
+    def has_changes(self):
+        return bool(self.changed_paths or self.untracked_paths or self.conflicted_paths)
+
+
+def parse_repo_state(status_output):
+    """Parse the output of 'git status --porcelain=v2 --branch -z'.
+
+    The v2 format is stable and independent of the user's locale, unlike the
+    human-readable 'Your branch is ahead' text.
+    """
+    state = RepoState()
+    records = iter(status_output.split('\0'))
+    for record in records:
+        if record.startswith('# branch.head '):
+            head = record[len('# branch.head '):]
+            state.branch = None if head == '(detached)' else head
+        elif record.startswith('# branch.upstream '):
+            state.upstream = record[len('# branch.upstream '):]
+        elif record.startswith('# branch.ab '):
+            ahead, behind = record[len('# branch.ab '):].split()
+            state.ahead = int(ahead)
+            state.behind = abs(int(behind))
+        elif record.startswith('1 '):
+            state.changed_paths.append(record.split(' ', 8)[8])
+        elif record.startswith('2 '):
+            state.changed_paths.append(record.split(' ', 9)[9])
+            # Renames and copies are followed by their original path in a separate record
+            next(records, None)
+        elif record.startswith('u '):
+            state.conflicted_paths.append(record.split(' ', 10)[10])
+        elif record.startswith('? '):
+            state.untracked_paths.append(record[2:])
+    return state
+
+
+async def get_repo_state():
+    """Take a RepoState snapshot; call again only after an operation that changes the repository."""
+    status_output, _ = await run_git_command_async(['git', 'status', '--porcelain=v2', '--branch', '-z'],
+                                                   raw_output=True)
+    return parse_repo_state(status_output)
+
+
+async def commit_changes(commit_message, paths=None):
+    """Commit every change, or only the changes to paths when nothing else is staged (--split)."""
+    await run_git_command_async(['git', 'add', '.'] if paths is None else
+                                ['git', 'add', '-A', '--'] + [f':(literal){path}' for path in paths])
     # Write the commit message to a temporary file
     with tempfile.NamedTemporaryFile(mode='w', delete=False, encoding='utf-8') as temp_file:
         temp_file.write(commit_message)
         temp_filename = temp_file.name
     try:
-        _, commit_result = run_git_command(['git', 'commit', '-F', temp_filename])
+        _, commit_result = await run_git_command_async(['git', 'commit', '-F', temp_filename])
     finally:
         os.unlink(temp_filename)  # Remove the temporary file
 
 
-def perform_git_pull():
-    output, returncode = run_git_command(['git', 'pull'], exit_on_error=False)
+async def fetch_upstream(repo_state):
+    """Fetch the upstream branch in the background so the later git pull has nothing left to download."""
+    if not repo_state.upstream:
+        return False
+    output, returncode = await run_git_command_async(['git', 'fetch', '--quiet'], exit_on_error=False)
+    if returncode != 0:
+        print_verbose(f'Background git fetch failed: {output.strip()}')
+    return returncode == 0
+
+
+def warm_up_provider():
+    """Import the provider SDKs and open their connections while git is still working.
+
+    Listing the models is the cheapest authenticated request; it leaves a
+    TLS connection in the client's pool for the completion request to reuse.
+    """
+    with trace_span('provider warm-up'):
+        for provider_name in filter(None, [provider, hedge_provider]):
+            try:
+                get_provider_client(provider_name).with_options(max_retries=0, timeout=10).models.list()
+            except Exception as e:
+                print_verbose(f'Provider warm-up for {provider_name} failed: {e}')
+
+
+async def is_upstream_merged(repo_state, fetched):
+    """Whether git pull would have nothing to do: the upstream branch has no commits missing from HEAD.
+
+    Unless the background fetch has just refreshed the tracking ref, git ls-remote
+    asks the remote for the head of the branch, a single round trip that
+    downloads no objects. When it still matches the tracking ref, nothing moved
+    upstream.
+    """
+    if not repo_state.upstream or not repo_state.branch:
+        return False
+    tracking_oid, returncode = await run_git_command_async(['git', 'rev-parse', '--verify', '--quiet', '@{upstream}'],
+                                                           exit_on_error=False, raw_output=True)
+    if returncode != 0:
+        # The upstream branch is gone; let git pull report it
+        return False
+
+    if not fetched:
+        output, _ = await run_git_command_async(['git', 'for-each-ref', '--format=%(upstream:remotename)%00'
+                                                 '%(upstream:remoteref)', f'refs/heads/{repo_state.branch}'],
+                                                raw_output=True)
+        remote, _, remote_ref = output.strip().partition('\0')
+        if not remote or not remote_ref:
+            return False
+        output, returncode = await run_git_command_async(['git', 'ls-remote', '--quiet', remote, remote_ref],
+                                                         exit_on_error=False, raw_output=True)
+        if returncode != 0:
+            print_verbose(f'git ls-remote {remote} failed: running git pull')
+            return False
+        remote_oid = next((line.split('\t')[0] for line in output.splitlines() if line.endswith(f'\t{remote_ref}')),
+                          None)
+        if remote_oid != tracking_oid.strip():
+            print_verbose(f'{repo_state.upstream} moved on the remote: running git pull')
+            return False
+
+    _, returncode = await run_git_command_async(['git', 'merge-base', '--is-ancestor', '@{upstream}', 'HEAD'],
+                                                exit_on_error=False)
+    return returncode == 0
+
+
+def get_pull_timing_path():
+    gitai_dir = get_gitai_dir()
+    return os.path.join(gitai_dir, 'pull_timing.json') if gitai_dir else None
+
+
+def load_pull_duration():
+    """Typical duration of a full git pull in this repository, or None before the first one is measured."""
+    path = get_pull_timing_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return float(json.load(file)['seconds'])
+    except (OSError, TypeError, ValueError, KeyError):
+        return None
+
+
+def record_pull_duration(seconds):
+    """Blend the duration of a full git pull into the typical one, weighting recent pulls the most."""
+    path = get_pull_timing_path()
+    if path is None:
+        return
+    typical = load_pull_duration()
+    typical = seconds if typical is None else typical * 0.7 + seconds * 0.3
+    try:
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'seconds': typical}, file)
+    except OSError as e:
+        print_verbose(f'Could not save the git pull duration: {e}')
+
+
+async def perform_git_pull(repo_state=None, fetched=False):
+    """Pull the upstream branch, skipping the pull when the remote has not moved and there is nothing to merge.
+
+    fetched tells whether the tracking ref was refreshed by the background fetch of this run.
+    """
+    if repo_state is not None:
+        with trace_span('upstream check') as span:
+            merged = await is_upstream_merged(repo_state, fetched)
+        if merged:
+            typical = load_pull_duration()
+            if typical is not None:
+                span.args['saved_seconds'] = max(0.0, typical - (span.end - span.start))
+            else:
+                print_verbose('No full git pull measured in this repository yet, so the time saved is unknown')
+            print_success("Remote branch unchanged: git pull skipped.")
+            return True
+
+    started = time.perf_counter()
+    output, returncode = await run_git_command_async(['git', 'pull'], exit_on_error=False)
 
     if returncode != 0:
         if 'CONFLICT' in output or 'CONFLITO' in output:
@@ -424,66 +2434,1559 @@ def perform_git_pull():
             print_error(f"Error executing git pull: {output}")
             sys.exit(1)
     else:
+        record_pull_duration(time.perf_counter() - started)
         print_success("Git pull executed successfully.")
         return True
 
 
-def main():
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in subcommands:
+        return subcommands[argv[0]](argv[1:])
+
+    print_banner()
+
     parser = argparse.ArgumentParser(
         description='Gitai commit and push script.',
-        usage="gitai <project_path> '<base_message>' [--push]"
+        usage="gitai <project_path> '<base_message>' [--push] [--split] [--no-cache] [--verbose] [--[no-]stream] "
+              "[--fast-path never|safe|always] [--timings] [--trace-file <path>]"
     )
     parser.add_argument('project_path', type=str, help='The path to the project.')
     parser.add_argument('base_message', type=str, help='The base commit message.')
     parser.add_argument('--push', action='store_true', default=False, help='Whether to push after committing.')
+    parser.add_argument('--split', action='store_true', default=False,
+                        help='Commit unrelated changes separately, one commit per logical group of files.')
+    parser.add_argument('--no-cache', action='store_true', default=False,
+                        help='Always call the provider, ignoring cached commit messages.')
+    parser.add_argument('--verbose', action='store_true', default=False, help='Print diagnostic details.')
+    parser.add_argument('--stream', action=argparse.BooleanOptionalAction, default=None,
+                        help='Render the commit message while it is generated. Defaults to the STREAM setting, '
+                             'or to streaming only on interactive terminals outside CI.')
+    parser.add_argument('--fast-path', type=str, default=None, choices=fast_path_policies,
+                        help='When to commit trivial changes with a locally generated message (default: '
+                             'FAST_PATH_POLICY, or safe).')
+    parser.add_argument('--timings', action='store_true', default=False,
+                        help='Print how long each phase, git command and provider request took.')
+    parser.add_argument('--trace-file', type=str, default=None,
+                        help='Write the timings as Chrome trace-event JSON to this file.')
+
+    args = parser.parse_args(argv)
+
+    # A warm daemon has already loaded the settings
+    if provider is None:
+        load_settings()
+
+    global verbose, use_cache, use_stream, fast_path_policy
+    verbose = args.verbose
+    # A warm daemon keeps the globals between runs: --fast-path must not outlive the run that passed it
+    fast_path_policy = args.fast_path or fast_path_setting
+    use_cache = not args.no_cache
+    use_stream = args.stream if args.stream is not None else stream_by_default()
+    stats = {'hits': 0, 'misses': 0}
+    cache_stats.set(stats)
 
-    args = parser.parse_args()
-    os.chdir(args.project_path)
+    try:
+        run_gitai(args)
+    finally:
+        print_verbose(f"Response cache: {stats['hits']} hit(s), {stats['misses']} miss(es)"
+                      + ('' if use_cache else ' (disabled by --no-cache)'))
 
-    # Check if there are uncommitted changes before git pull
-    if has_uncommitted_changes():
-        print_warning("Uncommitted local changes detected.")
-        project_language = detect_project_language(args.project_path)
-        print_detected_language(project_language)
-        diff_output, _ = run_git_command(['git', 'diff'])
-        commit_message = generate_commit_message(diff_output, project_language, args.base_message)
 
+def stream_by_default():
+    """Stream when STREAM is enabled, or when unset, on interactive terminals outside CI."""
+    setting = os.getenv('STREAM', '').strip().lower()
+    if setting:
+        return setting in ('1', 'true', 'yes', 'on')
+    return sys.stdout.isatty() and not os.getenv('CI')
+
+
+def generate_and_show_commit_message(diff_output, project_language, base_message):
+    """Generate the commit message, streaming it to the terminal when streaming is enabled."""
+    stream = CommitMessageStream() if use_stream else None
+    commit_message = generate_commit_message(diff_output, project_language, base_message, on_token=stream)
+    if stream:
+        stream.finish(commit_message)
+    else:
         print_commit_message(commit_message)
+    return commit_message
+
+
+@dataclass
+class Span:
+    """A timed section of a run: a phase of the pipeline, a git command or a provider request."""
+    name: str
+    category: str
+    start: float
+    end: float | None = None
+    thread: str = ''
+    # Spans started on an event loop may overlap on the same thread; they are exported as async trace events
+    on_event_loop: bool = False
+    args: dict = field(default_factory=dict)
+
+
+def is_event_loop_thread():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+@contextmanager
+def trace_span(name, category='phase', **args):
+    """Record a span of the current run for --timings and --trace-file; yields it so callers can add args."""
+    span = Span(name, category, time.perf_counter(), thread=threading.current_thread().name,
+                on_event_loop=is_event_loop_thread(), args=args)
+    spans = trace_spans.get()
+    if spans is not None:
+        spans.append(span)
+    try:
+        yield span
+    except Exception as e:
+        span.args.setdefault('error', f'{type(e).__name__}: {e}')
+        raise
+    finally:
+        span.end = time.perf_counter()
+
+
+async def timed(name, awaitable):
+    with trace_span(name):
+        return await awaitable
+
+
+def get_git_span_name(command):
+    """'git <subcommand>', skipping global options such as -C <path>."""
+    arguments = iter(command[1:])
+    for argument in arguments:
+        if argument in ('-C', '-c'):
+            next(arguments, None)
+        elif not argument.startswith('-'):
+            return f'git {argument}'
+    return 'git'
+
+
+def get_llm_time(phases):
+    """Time spent generating messages; the --split groups generate concurrently, so overlapping spans count once."""
+    llm_time = 0
+    covered_until = 0
+    for span in sorted((span for span in phases if span.name.startswith('generate message') and span.end),
+                       key=lambda span: span.start):
+        llm_time += max(0, span.end - max(span.start, covered_until))
+        covered_until = max(covered_until, span.end)
+    return llm_time
+
+
+def print_timings(run_started):
+    """Print the phases of the run, then the git commands and provider requests grouped by name."""
+    total = time.perf_counter() - run_started
+    spans = trace_spans.get() or []
+    phases = [span for span in spans if span.category == 'phase']
+    print_header('Timings')
+    print(f"{'Phase':<34}{'Start':>9}{'Duration':>11}")
+    for span in phases:
+        print(f"{span.name:<34}{span.start - run_started:>8.3f}s{(span.end or span.start) - span.start:>10.3f}s")
+
+    calls = {}
+    for span in spans:
+        if span.category != 'phase':
+            durations = calls.setdefault((span.category, span.name), [])
+            durations.append((span.end or span.start) - span.start)
+    if calls:
+        print(f"\n{'Git command / provider request':<34}{'Calls':>9}{'Total':>11}{'Max':>10}")
+        for (_, name), durations in sorted(calls.items(), key=lambda item: -sum(item[1])):
+            print(f"{name:<34}{len(durations):>9}{sum(durations):>10.3f}s{max(durations):>9.3f}s")
+
+    print(f"\n{'total wall time':<34}{'':>9}{total:>10.3f}s (LLM: {get_llm_time(phases):.3f}s)")
+    saved = sum(span.args.get('saved_seconds', 0) for span in phases)
+    if saved:
+        print(f"{'saved by skipping git pull':<34}{'':>9}{saved:>10.3f}s (typical pull in this repository)")
+
+
+def write_trace_file(path, run_started):
+    """Write the spans of the run as Chrome trace-event JSON (chrome://tracing, Perfetto, speedscope)."""
+    pid = os.getpid()
+    now = time.perf_counter()
+    thread_ids = {}
+    events = []
+    for index, span in enumerate(trace_spans.get() or []):
+        tid = thread_ids.setdefault(span.thread, len(thread_ids) + 1)
+        start_us = round((span.start - run_started) * 1e6)
+        end_us = round(((span.end or now) - run_started) * 1e6)
+        event = {'name': span.name, 'cat': span.category, 'pid': pid, 'tid': tid}
+        if span.on_event_loop:
+            events.append({**event, 'ph': 'b', 'id': index, 'ts': start_us, 'args': span.args})
+            events.append({**event, 'ph': 'e', 'id': index, 'ts': end_us})
+        else:
+            events.append({**event, 'ph': 'X', 'ts': start_us, 'dur': end_us - start_us, 'args': span.args})
 
-        commit_changes(commit_message)
+    metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                 'args': {'name': f'gitai {current_repo_path.get() or os.getcwd()}'}}]
+    metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}}
+                 for thread, tid in thread_ids.items()]
+    try:
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, file)
+    except OSError as e:
+        print_warning(f'Could not write the trace file {path}: {e}')
+        return
+    print_info(f'Trace written to {path}')
+
+
+history_schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    repo TEXT,
+    provider TEXT,
+    model TEXT,
+    status TEXT NOT NULL,
+    commits INTEGER NOT NULL DEFAULT 0,
+    wall_seconds REAL,
+    llm_seconds REAL,
+    diff_bytes INTEGER,
+    prompt_tokens INTEGER,
+    cached_tokens INTEGER,
+    completion_tokens INTEGER,
+    cache_hits INTEGER,
+    cache_misses INTEGER,
+    retries INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS requests (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    provider TEXT NOT NULL,
+    model TEXT,
+    seconds REAL NOT NULL,
+    first_token_ms INTEGER,
+    input_tokens INTEGER,
+    cached_tokens INTEGER,
+    cache_write_tokens INTEGER,
+    output_tokens INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs(started_at);
+CREATE INDEX IF NOT EXISTS phases_run_id ON phases(run_id);
+CREATE INDEX IF NOT EXISTS requests_run_id ON requests(run_id);
+"""
+
+
+def open_history():
+    """Open the run history database, creating it on first use.
+
+    sqlite3 is imported here so that runs with HISTORY=0 never load it. WAL
+    mode lets `gitai stats` read while batch workers and other processes write.
+    """
+    import sqlite3
+
+    os.makedirs(gitai_home, exist_ok=True)
+    connection = sqlite3.connect(history_path, timeout=10)
+    if connection.execute('PRAGMA user_version').fetchone()[0] < history_schema_version:
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.executescript(history_schema)
+        connection.execute(f'PRAGMA user_version = {history_schema_version}')
+    return connection
+
+
+def record_run(started_at, run_started, outcome, status, error):
+    """Append the current run to the history database, from its spans and cache counters.
+
+    Phases that ran more than once are added up, except message generation,
+    whose concurrent --split spans count once. Failing to write the history
+    never fails the run.
+    """
+    import sqlite3
+
+    spans = trace_spans.get() or []
+    phases = [span for span in spans if span.category == 'phase' and span.end]
+    requests = [span for span in spans if span.category == 'provider' and span.name.endswith(' request') and span.end]
+    durations = {}
+    for span in phases:
+        name = re.sub(r' \d+/\d+$', '', span.name)
+        if name != 'generate message':
+            durations[name] = durations.get(name, 0) + span.end - span.start
+    llm_time = get_llm_time(phases)
+    if llm_time:
+        durations['generate message'] = llm_time
+
+    stats = cache_stats.get() or {'hits': 0, 'misses': 0}
+    run = {
+        'started_at': started_at,
+        'repo': current_repo_path.get(),
+        'provider': provider,
+        'model': model,
+        'status': status,
+        'commits': len(outcome['commits']),
+        'wall_seconds': time.perf_counter() - run_started,
+        'llm_seconds': llm_time,
+        'diff_bytes': sum(span.args.get('bytes', 0) for span in spans
+                          if span.category == 'git' and '-U3' in span.args.get('command', '').split()),
+        'prompt_tokens': sum(span.args.get('input_tokens') or 0 for span in requests),
+        'cached_tokens': sum(span.args.get('cached_tokens') or 0 for span in requests),
+        'completion_tokens': sum(span.args.get('output_tokens') or 0 for span in requests),
+        'cache_hits': stats['hits'],
+        'cache_misses': stats['misses'],
+        'retries': sum(1 for span in spans if span.name == 'retry backoff'),
+        'error': error,
+    }
+    try:
+        connection = open_history()
+        try:
+            with connection:
+                run_id = connection.execute(f"INSERT INTO runs ({', '.join(run)}) VALUES ({', '.join('?' * len(run))})",
+                                            list(run.values())).lastrowid
+                connection.executemany('INSERT INTO phases (run_id, name, seconds) VALUES (?, ?, ?)',
+                                       [(run_id, name, seconds) for name, seconds in durations.items()])
+                connection.executemany(
+                    'INSERT INTO requests (run_id, provider, model, seconds, first_token_ms, input_tokens, '
+                    'cached_tokens, cache_write_tokens, output_tokens, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(run_id, span.name[:-len(' request')], span.args.get('model'), span.end - span.start,
+                      span.args.get('first_token_ms'), span.args.get('input_tokens'), span.args.get('cached_tokens'),
+                      span.args.get('cache_write_tokens'), span.args.get('output_tokens'), span.args.get('error'))
+                     for span in requests])
+        finally:
+            connection.close()
+    except (sqlite3.Error, OSError) as e:
+        print_verbose(f'Could not record the run in {history_path}: {e}')
+
+
+async def generate_and_commit(project_path, base_message, repo_state, commits, split=False):
+    """Commit trivial changes with a local message; otherwise detect the language and capture the diff
+    concurrently, then generate the message and commit. Returns the commit messages created.
+
+    With split, changes that form several logical groups become one commit per group.
+    """
+    with trace_span('fast path'):
+        numstat = await asyncio.to_thread(get_diff_numstat)
+        commit_message = await asyncio.to_thread(get_fast_path_message, numstat, repo_state.untracked_paths)
+    if commit_message:
+        commit_message += commit_signature
+        print_commit_message(commit_message)
+        with trace_span('git commit'):
+            await commit_changes(commit_message)
+        commits.append(commit_message)
+        return
+
+    if split:
+        with trace_span('group changes'):
+            groups = await asyncio.to_thread(get_split_groups, numstat, repo_state)
+        if len(groups) > 1:
+            await generate_and_commit_groups(project_path, base_message, groups, commits)
+            return
+
+    # Importing the SDK and connecting to the provider overlaps with the git work below. A daemon thread is
+    # used instead of the executor so that a cache hit never waits for a warm-up it did not need.
+    if provider_warm_up:
+        threading.Thread(target=in_current_context(warm_up_provider), name='provider-warm-up',
+                         daemon=True).start()
+
+    project_language, diff_output = await asyncio.gather(
+        timed('detect language', asyncio.to_thread(detect_project_language, project_path)),
+        timed('git diff', asyncio.to_thread(capture_compacted_diff, repo_state.untracked_paths, numstat)),
+    )
+    print_detected_language(project_language)
+
+    with trace_span('generate message'):
+        commit_message = await asyncio.to_thread(generate_and_show_commit_message, diff_output, project_language,
+                                                 base_message)
+    with trace_span('git commit'):
+        await commit_changes(commit_message)
+    commits.append(commit_message)
+
+
+def get_split_groups(numstat, repo_state):
+    """Group the changes for --split, or return a single group when they cannot be split."""
+    whole = [ChangeGroup(list(numstat), list(repo_state.untracked_paths))]
+    if repo_state.conflicted_paths:
+        print_info('Conflicted files detected: committing all changes together instead of splitting them.')
+        return whole
+    _, returncode = run_git_command(['git', 'rev-parse', '--verify', '--quiet', 'MERGE_HEAD'], exit_on_error=False)
+    if returncode == 0:
+        # Git refuses partial commits while a merge is being concluded
+        print_info('A merge is in progress: committing all changes together instead of splitting them.')
+        return whole
+    groups = group_changes(numstat, repo_state.untracked_paths)
+    if len(groups) == 1:
+        print_info('The changes form a single logical group: creating one commit.')
+    return groups
+
+
+async def generate_and_commit_groups(project_path, base_message, groups, commits):
+    """Generate the message of every group concurrently, then commit the groups one after the other.
+
+    Each group captures its own diff and calls the provider in its own thread, so
+    the wall time stays close to that of the slowest single request. Nothing is
+    committed until every message is ready.
+    """
+    print_info(f'Splitting the changes into {len(groups)} commits.')
+    for number, group in enumerate(groups, 1):
+        print_verbose(f"Commit {number}: {', '.join(group.paths)}")
+
+    if provider_warm_up:
+        threading.Thread(target=in_current_context(warm_up_provider), name='provider-warm-up',
+                         daemon=True).start()
+    with trace_span('detect language'):
+        project_language = await asyncio.to_thread(detect_project_language, project_path)
+    print_detected_language(project_language)
+
+    commit_messages = await asyncio.gather(*(
+        timed(f'generate message {number}/{len(groups)}',
+              asyncio.to_thread(generate_group_message, group, project_language, base_message))
+        for number, group in enumerate(groups, 1)))
+
+    # Only the files of one group are staged at a time, so each commit contains exactly its group
+    await run_git_command_async(['git', 'reset', '--quiet'])
+    for number, (group, commit_message) in enumerate(zip(groups, commit_messages), 1):
+        print_info(f'Commit {number}/{len(groups)} ({len(group.numstat) + len(group.untracked_paths)} file(s)):')
+        print_commit_message(commit_message)
+        with trace_span(f'git commit {number}/{len(groups)}'):
+            await commit_changes(commit_message, group.paths)
+        commits.append(commit_message)
+
+
+def get_run_status(outcome, failed):
+    """Status of a run for the batch report and the history.
+
+    A run that failed after committing (the pull or the push went wrong) is
+    push_failed rather than failed: its commits exist and must be reported.
+    """
+    if failed:
+        return 'push_failed' if outcome['commits'] else 'failed'
+    return 'pushed' if outcome['pushed'] else 'committed' if outcome['commits'] else 'up to date'
+
+
+def run_gitai(args, outcome=None):
+    """Commit local changes with a generated message, pull, commit conflict resolutions and optionally push.
+
+    Git runs in args.project_path without changing the working directory of the
+    process. The commit messages created and whether it pushed are filled into
+    outcome as they happen, so they survive a failure later in the run, and
+    outcome is returned.
+    """
+    if outcome is None:
+        outcome = {'commits': [], 'pushed': False}
+    if not os.path.isdir(args.project_path):
+        print_error(f'The project path {args.project_path} does not exist.')
+        sys.exit(1)
+    current_repo_path.set(os.path.abspath(args.project_path))
+    trace_spans.set([])
+    errors = []
+    run_errors.set(errors)
+    started_at = time.time()
+    run_started = time.perf_counter()
+    completed = False
+    try:
+        asyncio.run(run_gitai_async(args, outcome))
+        completed = True
+        return outcome
+    except Exception as e:
+        errors.append(f'{type(e).__name__}: {e}')
+        raise
+    finally:
+        # --timings and --trace-file come with each run's arguments, so they cannot leak into the next run of a daemon
+        if args.timings or verbose:
+            print_timings(run_started)
+        if args.trace_file:
+            write_trace_file(args.trace_file, run_started)
+        if record_history:
+            record_run(started_at, run_started, outcome, get_run_status(outcome, not completed),
+                       ' '.join(errors)[:1000] or None)
+
+
+async def run_gitai_async(args, outcome):
+    """Run the pipeline in the current repository, recording the commit messages created and whether it pushed."""
+
+    # Check if there are uncommitted changes before git pull
+    with trace_span('git status'):
+        repo_state = await get_repo_state()
+
+    fetch = None
+    if repo_state.has_changes:
+        print_warning("Uncommitted local changes detected.")
+        print_verbose(f'{len(repo_state.changed_paths)} changed, {len(repo_state.untracked_paths)} untracked, '
+                      f'{len(repo_state.conflicted_paths)} conflicted path(s)')
+        # Download upstream commits while the commit message is being generated
+        fetch = asyncio.create_task(timed('git fetch (background)', fetch_upstream(repo_state)))
+        await generate_and_commit(current_repo_path.get(), args.base_message, repo_state, outcome['commits'],
+                                  split=args.split)
         print_success("Gitai successfully committed local changes.")
     else:
         print_info("No local changes to commit before git pull.")
 
-    # Execute git pull after committing local changes
-    pull_successful = perform_git_pull()
+    fetched = await fetch if fetch else False
+
+    # Execute git pull after committing local changes, unless there is nothing new upstream
+    with trace_span('git pull'):
+        pull_successful = await perform_git_pull(repo_state, fetched)
 
     if not pull_successful:
         print_error("Git pull failed due to conflicts. Please resolve the conflicts manually.")
         sys.exit(1)
 
-    # Check if there are new conflicts after the pull
-    if has_uncommitted_changes():
-        print_warning("Conflicts or uncommitted changes detected after pull.")
-        project_language = detect_project_language(args.project_path)
-        print_detected_language(project_language)
-        diff_output, _ = run_git_command(['git', 'diff'])
-        commit_message = generate_commit_message(diff_output, project_language, "Resolving conflicts after git pull")
-
-        print_commit_message(commit_message)
+    # Check if there are new conflicts after the pull (the pull changed the repository, so take a new snapshot)
+    with trace_span('git status'):
+        repo_state = await get_repo_state()
 
-        commit_changes(commit_message)
+    if repo_state.has_changes:
+        print_warning("Conflicts or uncommitted changes detected after pull.")
+        await generate_and_commit(current_repo_path.get(), "Resolving conflicts after git pull", repo_state,
+                                  outcome['commits'])
         print_success("Gitai successfully committed changes after pull.")
+        with trace_span('git status'):
+            repo_state = await get_repo_state()
     else:
         print_info("No changes to commit after git pull.")
 
     if args.push:
-        if is_branch_ahead():
-            run_git_command(['git', 'push'])
+        if repo_state.ahead > 0:
+            with trace_span('git push'):
+                await run_git_command_async(['git', 'push'])
             print_success("Gitai successfully pushed changes.")
+            outcome['pushed'] = True
         else:
             print_info("No changes to push. The local branch is synchronized with the remote.")
 
 
+class DaemonStream(io.TextIOBase):
+    """Text stream that forwards everything written to it to a daemon client as JSON lines."""
+
+    def __init__(self, wfile, channel, tty):
+        self.wfile = wfile
+        self.channel = channel
+        self.tty = tty
+
+    def write(self, text):
+        if text:
+            self.wfile.write((json.dumps({self.channel: text}) + '\n').encode('utf-8'))
+            self.wfile.flush()
+        return len(text)
+
+    def isatty(self):
+        return self.tty
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """Runs one forwarded gitai invocation inside the warm daemon process."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+
+        command = request.get('command', 'run')
+        if command == 'status':
+            self.send({'out': f'Gitai daemon running (pid {os.getpid()}, provider {provider}, model {model}).\n'})
+            self.send({'exit': 0})
+            return
+        if command == 'stop':
+            self.send({'out': 'Gitai daemon stopping.\n'})
+            self.send({'exit': 0})
+            # shutdown() blocks until serve_forever() returns, so it must run in another thread
+            threading.Thread(target=self.server.shutdown).start()
+            return
+
+        tty = request.get('tty', False)
+        stdout = DaemonStream(self.wfile, 'out', tty)
+        stderr = DaemonStream(self.wfile, 'err', tty)
+        exit_code = 0
+        daemon_cwd = os.getcwd()
+        try:
+            os.chdir(request['cwd'])
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                main(request['argv'])
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; nothing left to report to
+            return
+        except Exception as e:
+            stderr.write(f'Gitai daemon error: {e}\n')
+            exit_code = 1
+        finally:
+            os.chdir(daemon_cwd)
+
+        try:
+            self.send({'exit': exit_code})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + '\n').encode('utf-8'))
+        self.wfile.flush()
+
+
+def send_daemon_request(request, socket_path=None):
+    """Send a request to the gitai daemon and relay its output.
+
+    Returns the exit code reported by the daemon, or None when no daemon is reachable.
+    """
+    socket_path = socket_path or daemon_socket_path
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+
+    with connection, connection.makefile('rb') as responses:
+        connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        for line in responses:
+            message = json.loads(line)
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'err' in message:
+                sys.stderr.write(message['err'])
+                sys.stderr.flush()
+            elif 'exit' in message:
+                return message['exit']
+
+    print_error('Connection to the gitai daemon was lost.')
+    return 1
+
+
+def serve_daemon(socket_path):
+    """Keep the settings and provider client warm and serve forwarded invocations on a Unix socket."""
+    if not hasattr(socket, 'AF_UNIX'):
+        print_error('The gitai daemon requires Unix domain socket support.')
+        sys.exit(1)
+
+    if send_daemon_request({'command': 'status'}, socket_path) is not None:
+        print_error(f'A gitai daemon is already listening on {socket_path}')
+        sys.exit(1)
+    if os.path.exists(socket_path):
+        # Stale socket left behind by a daemon that did not shut down cleanly
+        os.unlink(socket_path)
+
+    print_banner()
+    load_settings()
+    # Build the clients up front so forwarded runs reuse their connection pools
+    get_provider_client()
+    if hedge_provider:
+        get_provider_client(hedge_provider)
+
+    os.makedirs(os.path.dirname(socket_path), mode=0o700, exist_ok=True)
+    # Only the current user may connect: anyone who can reach the socket can commit as this user
+    previous_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, DaemonRequestHandler)
+    finally:
+        os.umask(previous_umask)
+
+    print_success(f'Gitai daemon listening on {socket_path}')
+    try:
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    print_info('Gitai daemon stopped.')
+
+
+def daemon_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='gitai daemon',
+        description='Run a resident gitai process that keeps the provider client warm.',
+        usage="gitai daemon [start|stop|status] [--socket <path>]"
+    )
+    parser.add_argument('action', nargs='?', default='start', choices=['start', 'stop', 'status'],
+                        help='start runs the daemon in the foreground; stop and status talk to a running daemon.')
+    parser.add_argument('--socket', type=str, default=daemon_socket_path, help='Path of the Unix socket.')
+    args = parser.parse_args(argv)
+
+    if args.action == 'start':
+        serve_daemon(args.socket)
+        return
+
+    exit_code = send_daemon_request({'command': args.action}, args.socket)
+    if exit_code is None:
+        print_info(f'No gitai daemon is listening on {args.socket}')
+        sys.exit(1)
+    sys.exit(exit_code)
+
+
+class ServeBusyError(Exception):
+    """Raised when the service already has as many distinct generations pending as it accepts."""
+
+
+class CommitMessageService:
+    """Commit message generation behind `gitai serve`.
+
+    Generations run in a bounded worker pool, and identical concurrent requests
+    (same diff, language and base message) wait on a single in-flight provider
+    call instead of each making their own.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gitai-serve')
+        self.max_pending = max_pending
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'coalesced': 0, 'rejected': 0, 'failed': 0}
+
+    def generate(self, diff_output, project_language, base_message):
+        """Return (message, coalesced) for the diff, raising ServeBusyError when the pool is saturated."""
+        key = get_cache_key(diff_output, project_language, base_message)
+        with self.lock:
+            self.stats['requests'] += 1
+            future = self.in_flight.get(key)
+            coalesced = future is not None
+            if coalesced:
+                self.stats['coalesced'] += 1
+            elif len(self.in_flight) >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise ServeBusyError(f'{len(self.in_flight)} generations already pending')
+            else:
+                future = self.executor.submit(in_current_context(generate_commit_message), diff_output,
+                                              project_language, base_message)
+                self.in_flight[key] = future
+        if not coalesced:
+            future.add_done_callback(lambda done: self.forget(key, done))
+
+        try:
+            return future.result(), coalesced
+        except BaseException:
+            with self.lock:
+                self.stats['failed'] += 1
+            raise
+
+    def forget(self, key, future):
+        with self.lock:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    def status(self):
+        with self.lock:
+            return {**self.stats, 'in_flight': len(self.in_flight)}
+
+
+def prepare_serve_request(request):
+    """Turn a /v1/commit-message request into (diff_output, project_language, base_message).
+
+    The request carries either a repository path, whose changes are captured
+    like a regular run, or a raw diff; a repository given along with a raw diff
+    only provides the language and the response cache. Raises ValueError with a
+    message for the client on invalid requests.
+    """
+    cache_stats.set({'hits': 0, 'misses': 0})
+    base_message = request.get('message') or ''
+    if not isinstance(base_message, str):
+        raise ValueError('"message" must be a string')
+    repo = request.get('repo')
+    diff_output = request.get('diff')
+    if not repo and not diff_output:
+        raise ValueError('Send either "repo" (a repository path) or "diff" (the output of git diff)')
+
+    if repo:
+        if not isinstance(repo, str) or not os.path.isdir(repo):
+            raise ValueError(f'The repository path {repo} does not exist')
+        current_repo_path.set(os.path.abspath(repo))
+        if get_git_dir() is None:
+            raise ValueError(f'{repo} is not a git repository')
+    else:
+        # Without a repository there is no .git/gitai to cache in: only coalescing applies
+        current_repo_path.set(None)
+
+    if diff_output is None:
+        status_output, _ = run_git_command(['git', 'status', '--porcelain=v2', '-z'], raw_output=True)
+        repo_state = parse_repo_state(status_output)
+        if not repo_state.has_changes:
+            raise ValueError(f'There are no changes to describe in {repo}')
+        diff_output = capture_compacted_diff(repo_state.untracked_paths)
+    elif not isinstance(diff_output, str):
+        raise ValueError('"diff" must be a string')
+
+    project_language = request.get('project_language') or (detect_project_language(repo) if repo else 'Unknown')
+    return diff_output, project_language, base_message
+
+
+# Largest request body `gitai serve` reads; a raw diff beyond MAX_DIFF_SIZE_MB is never read from git either, and
+# JSON escaping can double its size
+serve_max_request_mb = 16
+
+
+def create_serve_handler(service, allowed_hosts):
+    """Build the request handler of `gitai serve`; http.server is imported only by this subcommand."""
+    from http.server import BaseHTTPRequestHandler
+
+    class ServeRequestHandler(BaseHTTPRequestHandler):
+        server_version = 'gitai-serve'
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            print_verbose(f'{self.address_string()} - {format % args}')
+
+        def send_json(self, status, body, headers=None):
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def is_allowed_host(self):
+            # Rejecting foreign Host headers keeps web pages from reaching the service through DNS rebinding
+            host = (self.headers.get('Host') or '').rsplit(':', 1)[0].strip('[]')
+            return host in allowed_hosts
+
+        def do_GET(self):
+            if not self.is_allowed_host():
+                self.send_json(403, {'error': 'Host not allowed'})
+            elif self.path == '/v1/health':
+                self.send_json(200, {'status': 'ok', 'provider': provider, 'model': model, **service.status()})
+            else:
+                self.send_json(404, {'error': f'Unknown path {self.path}'})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # The body cannot be delimited, so the connection cannot be reused either
+                self.close_connection = True
+                self.send_json(400, {'error': 'Invalid Content-Length header'})
+                return
+            if length > serve_max_request_mb * 1024 * 1024:
+                self.close_connection = True
+                self.send_json(413, {'error': f'The request body exceeds {serve_max_request_mb} MB'})
+                return
+            body = self.rfile.read(length)
+            if not self.is_allowed_host():
+                self.send_json(403, {'error': 'Host not allowed'})
+                return
+            if self.path != '/v1/commit-message':
+                self.send_json(404, {'error': f'Unknown path {self.path}'})
+                return
+            # A JSON content type cannot be sent cross-origin without a CORS preflight, which is never answered
+            if not (self.headers.get('Content-Type') or '').startswith('application/json'):
+                self.send_json(415, {'error': 'Send the request as application/json'})
+                return
+
+            started = time.perf_counter()
+            try:
+                request = json.loads(body)
+                if not isinstance(request, dict):
+                    raise ValueError('The request must be a JSON object')
+                diff_output, project_language, base_message = prepare_serve_request(request)
+                message, coalesced = service.generate(diff_output, project_language, base_message)
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            except ServeBusyError as e:
+                self.send_json(503, {'error': f'Too many pending requests: {e}'}, {'Retry-After': '1'})
+                return
+            except (SystemExit, Exception) as e:
+                # The pipeline reports its own errors with print_error before exiting
+                self.send_json(502, {'error': f'Commit message generation failed: {e or "see the server output"}'})
+                return
+
+            self.send_json(200, {'message': message, 'project_language': project_language, 'coalesced': coalesced,
+                                 'duration': round(time.perf_counter() - started, 3)})
+
+    return ServeRequestHandler
+
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='gitai serve',
+        description='Serve commit message generation over a local HTTP/JSON endpoint, for IDE plugins.',
+        usage="gitai serve [--host 127.0.0.1] [--port 8787] [--workers 4] [--max-pending 64] [--no-cache] "
+              "[--verbose]"
+    )
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1).')
+    parser.add_argument('--port', type=int, default=8787, help='Port to listen on (default: 8787).')
+    parser.add_argument('--workers', type=int, default=4, help='Generations running at the same time (default: 4).')
+    parser.add_argument('--max-pending', type=int, default=64,
+                        help='Distinct generations accepted at once; more are answered with 503 (default: 64).')
+    parser.add_argument('--no-cache', action='store_true', default=False,
+                        help='Do not reuse or store cached commit messages.')
+    parser.add_argument('--verbose', action='store_true', default=False, help='Log every request.')
+    args = parser.parse_args(argv)
+
+    from http.server import ThreadingHTTPServer
+
+    class ServeHTTPServer(ThreadingHTTPServer):
+        # IDEs fire bursts of suggestions; the default backlog of 5 would reset connections under load
+        request_queue_size = 128
+        daemon_threads = True
+
+    print_banner()
+    load_settings()
+
+    global verbose, use_cache, use_stream
+    verbose = args.verbose
+    use_cache = not args.no_cache
+    # Responses are returned whole; nobody watches the server's output token by token
+    use_stream = False
+
+    # Build the clients up front so every request reuses their connection pools
+    get_provider_client()
+    if hedge_provider:
+        get_provider_client(hedge_provider)
+
+    service = CommitMessageService(args.workers, args.max_pending)
+    allowed_hosts = {'localhost', '127.0.0.1', '::1', args.host}
+    try:
+        server = ServeHTTPServer((args.host, args.port), create_serve_handler(service, allowed_hosts))
+    except OSError as e:
+        print_error(f'Could not listen on {args.host}:{args.port}: {e}')
+        sys.exit(1)
+
+    print_success(f'Gitai serving on http://{args.host}:{server.server_address[1]} '
+                  f'(POST /v1/commit-message, GET /v1/health) with {args.workers} workers')
+    try:
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.executor.shutdown(wait=False, cancel_futures=True)
+    stats = service.status()
+    print_info(f"Gitai server stopped: {stats['requests']} request(s), {stats['coalesced']} coalesced, "
+               f"{stats['rejected']} rejected, {stats['failed']} failed.")
+
+
+class InotifyWatcher:
+    """Watches the working tree with Linux's inotify, through ctypes, for `gitai watch`.
+
+    Every directory holding tracked or untracked (not ignored) files is watched,
+    plus new directories as they appear. Inside .git, only HEAD and the index
+    matter: they change on commits, checkouts and staging.
+    """
+
+    event_mask = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200  # MODIFY ATTRIB CLOSE_WRITE MOVED_* CREATE DELETE
+    is_dir_flag = 0x40000000
+    header_size = 16  # struct inotify_event: int wd, uint32 mask, cookie, len
+
+    def __init__(self, root, git_dir):
+        import ctypes
+
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.ctypes = ctypes
+        self.git_dir = git_dir
+        self.watches = {}
+
+        listing, _ = run_git_command(['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard'],
+                                     raw_output=True)
+        directories = {root, git_dir}
+        for path in filter(None, listing.split('\0')):
+            directory = os.path.dirname(path)
+            while directory and directory not in directories:
+                directories.add(directory)
+                directory = os.path.dirname(directory)
+        for directory in sorted(directories):
+            self.add_watch(os.path.join(root, directory))
+
+    def add_watch(self, path):
+        descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.event_mask)
+        if descriptor < 0:
+            error = self.ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise OSError(error, 'inotify watch limit reached (fs.inotify.max_user_watches)')
+            # The directory may already be gone again
+            return
+        self.watches[descriptor] = path
+
+    def wait(self, timeout=None):
+        """Block until events arrive (or the timeout passes) and return whether any came from the working tree.
+
+        Returns None on a timeout, False when only HEAD or the index changed.
+        """
+        import select
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return None
+
+        worktree_changed = False
+        git_changed = False
+        offset = 0
+        while offset + self.header_size <= len(data):
+            descriptor, mask, _, name_length = struct.unpack_from('iIII', data, offset)
+            name = data[offset + self.header_size:offset + self.header_size + name_length].rstrip(b'\0')
+            offset += self.header_size + name_length
+            directory = self.watches.get(descriptor)
+            if directory is None:
+                continue
+            if directory == self.git_dir:
+                git_changed = git_changed or name in (b'HEAD', b'index')
+                continue
+            worktree_changed = True
+            if mask & self.is_dir_flag and mask & 0x100:
+                self.add_watch(os.path.join(directory, os.fsdecode(name)))
+        if worktree_changed:
+            return True
+        return False if git_changed else None
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback for `gitai watch` without inotify: wakes up every interval and lets the signature decide."""
+
+    def __init__(self, interval):
+        self.interval = interval
+
+    def wait(self, timeout=None):
+        if timeout is not None:
+            # No events to wait for: the caller compares signatures before and after the quiet period
+            time.sleep(timeout)
+            return None
+        time.sleep(self.interval)
+        return False
+
+    def close(self):
+        pass
+
+
+def get_worktree_signature():
+    """Fingerprint of the changes: HEAD plus the path, size and mtime of every changed file.
+
+    The status codes are left out, since staging does not change the diff against
+    HEAD, and the sizes and mtimes catch further edits to already modified files.
+    """
+    status_output, _ = run_git_command(['git', 'status', '--porcelain=v2', '--branch', '-z'], raw_output=True)
+    repo_state = parse_repo_state(status_output)
+    head = re.search(r'# branch\.oid (\S+)', status_output)
+    files = [head.group(1) if head else None]
+    for path in repo_state.changed_paths + repo_state.untracked_paths:
+        try:
+            stat = os.stat(os.path.join(current_repo_path.get(), path))
+            files.append((path, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            files.append((path, None, None))
+    return hashlib.sha256(json.dumps(files).encode('utf-8')).hexdigest(), repo_state
+
+
+def speculate_commit_message(repo_state, cancel_event):
+    """Background generation of `gitai watch`: compact the diff and cache a message for it, keyed by the diff."""
+    current_cancel_event.set(cancel_event)
+    cache_stats.set({'hits': 0, 'misses': 0})
+    started = time.perf_counter()
+    try:
+        numstat = get_diff_numstat()
+        if get_fast_path_message(numstat, repo_state.untracked_paths, announce=False) is not None:
+            print_verbose('Trivial change: the commit will not need the provider, nothing to pre-generate')
+            return
+        diff_output = capture_compacted_diff(repo_state.untracked_paths, numstat)
+        if cancel_event.is_set():
+            return
+        project_language = detect_project_language(current_repo_path.get())
+        message = generate_commit_message(diff_output, project_language, None)
+    except RequestCancelled:
+        print_verbose('Stale speculative generation cancelled')
+        return
+    except Exception as e:
+        print_warning(f'Speculative generation failed: {e}')
+        return
+    subject = message.strip().splitlines()[0] if message.strip() else ''
+    print_success(f'Commit message ready in {time.perf_counter() - started:.1f}s: {subject}')
+
+
+def watch_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='gitai watch',
+        description='Watch a repository and pre-generate the commit message in the background as changes settle.',
+        usage="gitai watch [<project_path>] [--debounce 2] [--poll-interval 2] [--poll] [--verbose]"
+    )
+    parser.add_argument('project_path', nargs='?', default='.', help='Repository to watch (default: .).')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help='Seconds without edits before generating (default: 2).')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='Seconds between checks when inotify is not available (default: 2).')
+    parser.add_argument('--poll', action='store_true', default=False,
+                        help='Poll git status even when inotify is available.')
+    parser.add_argument('--verbose', action='store_true', default=False, help='Enable verbose output.')
+    args = parser.parse_args(argv)
+
+    print_banner()
+    if not os.path.isdir(args.project_path):
+        print_error(f'The project path {args.project_path} does not exist.')
+        sys.exit(1)
+    root = os.path.abspath(args.project_path)
+    current_repo_path.set(root)
+    git_dir = get_git_dir()
+    if git_dir is None:
+        print_error(f'{root} is not a git repository.')
+        sys.exit(1)
+    root, _ = run_git_command(['git', 'rev-parse', '--show-toplevel'])
+    root = root.strip()
+    current_repo_path.set(root)
+
+    load_settings()
+    global verbose, use_stream, provider_warm_up
+    verbose = args.verbose
+    use_stream = False
+    provider_warm_up = False
+    threading.Thread(target=in_current_context(warm_up_provider), name='provider-warm-up', daemon=True).start()
+
+    watcher = None
+    if not args.poll and sys.platform.startswith('linux'):
+        try:
+            watcher = InotifyWatcher(root, git_dir)
+            print_info(f'Watching {root} with inotify ({len(watcher.watches)} directories).')
+        except (OSError, AttributeError) as e:
+            print_warning(f'inotify is not available ({e}); polling git status instead.')
+    if watcher is None:
+        watcher = PollingWatcher(args.poll_interval)
+        print_info(f'Watching {root} by polling git status every {args.poll_interval:g}s.')
+    print_info("Run gitai as usual: when the changes still match, the pre-generated message is used right away.")
+
+    cancel_event = threading.Event()
+    speculated_signature = None
+    changed = True
+    try:
+        while True:
+            if changed is None:
+                changed = watcher.wait()
+                continue
+            signature, repo_state = get_worktree_signature()
+            if signature == speculated_signature:
+                changed = watcher.wait()
+                continue
+            # The working tree moved under the running generation, if any: its result would be stale
+            cancel_event.set()
+
+            # Let the edits settle: quiet for the debounce period, with the same signature before and after
+            while True:
+                while watcher.wait(args.debounce) is not None:
+                    pass
+                settled_signature, repo_state = get_worktree_signature()
+                if settled_signature == signature:
+                    break
+                signature = settled_signature
+
+            speculated_signature = signature
+            changed = None
+            if not repo_state.has_changes:
+                print_verbose('No changes to pre-generate a message for')
+                continue
+
+            print_ai_message(f'Changes settled ({len(repo_state.changed_paths) + len(repo_state.untracked_paths)} '
+                             f'path(s)): pre-generating the commit message in the background.')
+            cancel_event = threading.Event()
+            threading.Thread(target=in_current_context(speculate_commit_message), args=(repo_state, cancel_event),
+                             name='gitai-speculation', daemon=True).start()
+    except KeyboardInterrupt:
+        cancel_event.set()
+    finally:
+        watcher.close()
+    print_info('Gitai watch stopped.')
+
+
+class ContextOutput(io.TextIOBase):
+    """Stand-in for sys.stdout/sys.stderr that writes to the current batch job's buffer, when there is one."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        output = current_output.get()
+        return (output if output is not None else self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        return current_output.get() is None and self.stream.isatty()
+
+
+ansi_escape_pattern = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def expand_repo_paths(patterns, repos_file=None):
+    """Resolve repository paths and workspace globs into a deduplicated list of git working trees."""
+    patterns = list(patterns)
+    if repos_file:
+        with open(repos_file, 'r', encoding='utf-8') as file:
+            patterns.extend(line.strip() for line in file if line.strip() and not line.startswith('#'))
+
+    repos = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.expanduser(pattern), recursive=True)) if glob.has_magic(pattern) \
+            else [os.path.expanduser(pattern)]
+        if not matches:
+            print_warning(f'No repositories match {pattern}')
+        for path in matches:
+            real_path = os.path.realpath(path)
+            if real_path in seen:
+                continue
+            seen.add(real_path)
+            if os.path.exists(os.path.join(path, '.git')):
+                repos.append(path)
+            elif not glob.has_magic(pattern) or os.path.isdir(path):
+                print_warning(f'Skipping {path}: not a git repository')
+    return repos
+
+
+def get_batch_trace_path(trace_path, repo):
+    """Trace file of one batch repository: the --trace-file path with the repository path appended to its name."""
+    if not trace_path:
+        return None
+    root, extension = os.path.splitext(trace_path)
+    name = re.sub(r'[^\w.-]+', '_', os.path.relpath(os.path.abspath(repo))).strip('_.') or 'repo'
+    return f"{root}-{name}{extension or '.json'}"
+
+
+def run_batch_repo(repo, base_message, push, trace_path=None):
+    """Run the pipeline for one repository of a batch, capturing its output, and return its report entry."""
+    output = io.StringIO()
+    current_output.set(output)
+    cache_stats.set({'hits': 0, 'misses': 0})
+    outcome = {'commits': [], 'pushed': False}
+    entry = {'path': repo, 'status': 'failed', 'commits': outcome['commits'], 'pushed': False, 'duration': 0.0,
+             'error': None}
+    started = time.perf_counter()
+    failed = True
+    try:
+        run_gitai(argparse.Namespace(project_path=repo, base_message=base_message, push=push, split=False,
+                                     timings=False, trace_file=get_batch_trace_path(trace_path, repo)), outcome)
+        failed = False
+    except SystemExit:
+        # The pipeline reports errors with print_error before exiting; the commits it made are kept in outcome
+        pass
+    except Exception as e:
+        print_error(f'Unexpected error: {e}')
+    finally:
+        current_output.set(None)
+        entry['duration'] = round(time.perf_counter() - started, 3)
+        entry['pushed'] = outcome['pushed']
+        entry['status'] = get_run_status(outcome, failed)
+
+    log = ansi_escape_pattern.sub('', output.getvalue())
+    entry['log'] = log
+    if failed:
+        lines = [line.strip() for line in log.splitlines() if line.strip()]
+        error_index = next((index for index, line in enumerate(lines) if line.startswith('❌')), None)
+        if error_index is None:
+            entry['error'] = 'Unknown error'
+        else:
+            error = lines[error_index].lstrip('❌ ')
+            # Git errors are printed as a heading followed by git's own output
+            if error.endswith(':') and error_index + 1 < len(lines):
+                error += ' ' + lines[error_index + 1]
+            entry['error'] = error
+    return entry
+
+
+batch_status_styles = {
+    'pushed': Fore.GREEN,
+    'committed': Fore.GREEN,
+    'up to date': Fore.BLUE,
+    'push_failed': Fore.YELLOW,
+    'failed': Fore.RED,
+}
+
+
+def print_batch_summary(entries, total_time):
+    width = max([len('Repository')] + [len(entry['path']) for entry in entries])
+    print_header(f"{'Repository':<{width}}  {'Status':<11} {'Commits':>7} {'Time':>8}  Details")
+    for entry in sorted(entries, key=lambda entry: entry['path']):
+        details = entry['error'] or (entry['commits'][-1].splitlines()[0] if entry['commits'] else '')
+        print(f"{entry['path']:<{width}}  {batch_status_styles[entry['status']]}{entry['status']:<11}"
+              f"{Style.RESET_ALL} {len(entry['commits']):>7} {entry['duration']:>7.1f}s  {details}")
+    counts = {status: sum(1 for entry in entries if entry['status'] == status) for status in batch_status_styles}
+    print_info(', '.join(f'{count} {status}' for status, count in counts.items() if count)
+               + f' - {len(entries)} repositories in {total_time:.1f}s')
+
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='gitai batch',
+        description='Run the gitai commit/pull/push pipeline for many repositories in one process.',
+        usage="gitai batch <repo_or_glob>... -m '<base_message>' [--push] [--workers N] [--rate-limit RPM] "
+              "[--json <report_path>] [--trace-file <path>]"
+    )
+    parser.add_argument('repos', nargs='*', help="Repository paths or workspace globs such as 'services/*'.")
+    parser.add_argument('-m', '--message', type=str, required=True, help='The base commit message.')
+    parser.add_argument('--repos-file', type=str, default=None, help='File with one repository path or glob per line.')
+    parser.add_argument('--push', action='store_true', default=False, help='Whether to push after committing.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of repositories processed at the same time.')
+    parser.add_argument('--rate-limit', type=int, default=None,
+                        help='Maximum provider requests per minute across all workers (default: RATE_LIMIT_RPM).')
+    parser.add_argument('--json', type=str, default=None, dest='report_path',
+                        help="Write a machine-readable report to this file ('-' for standard output).")
+    parser.add_argument('--no-cache', action='store_true', default=False,
+                        help='Always call the provider, ignoring cached commit messages.')
+    parser.add_argument('--verbose', action='store_true', default=False,
+                        help='Include diagnostic details in the per-repository logs of the report.')
+    parser.add_argument('--trace-file', type=str, default=None,
+                        help='Write one Chrome trace-event JSON file per repository, named after this path with the '
+                             'repository appended (trace.json -> trace-services_api.json).')
+    args = parser.parse_args(argv)
+
+    if args.workers < 1 or (args.rate_limit is not None and args.rate_limit < 1):
+        parser.error('--workers and --rate-limit must be positive integers')
+
+    print_banner()
+    repos = expand_repo_paths(args.repos, args.repos_file)
+    if not repos:
+        print_error('No git repositories to process.')
+        sys.exit(1)
+
+    if provider is None:
+        load_settings()
+
+    global verbose, use_cache, use_stream, rate_limit_rpm, provider_warm_up
+    verbose = args.verbose
+    use_cache = not args.no_cache
+    # Interleaved streams from several repositories would be unreadable
+    use_stream = False
+    if args.rate_limit:
+        rate_limit_rpm = args.rate_limit
+        provider_rate_limiters.clear()
+
+    workers = min(args.workers, len(repos))
+    limit = f', at most {rate_limit_rpm} provider requests/min' if rate_limit_rpm else ''
+    print_info(f'Processing {len(repos)} repositories with {workers} workers{limit}.')
+
+    # One warm-up for the whole batch; every worker shares the same provider clients and connection pools
+    threading.Thread(target=warm_up_provider, name='provider-warm-up', daemon=True).start()
+    previous_warm_up, provider_warm_up = provider_warm_up, False
+
+    started_at = datetime.now(timezone.utc)
+    batch_started = time.perf_counter()
+    entries = []
+    try:
+        with redirect_stdout(ContextOutput(sys.stdout)), redirect_stderr(ContextOutput(sys.stderr)), \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_batch_repo, repo, args.message, args.push, args.trace_file) for repo in repos]
+            for future in as_completed(futures):
+                entry = future.result()
+                entries.append(entry)
+                message = f"[{len(entries)}/{len(repos)}] {entry['path']}: {entry['status']}"
+                if entry['error']:
+                    print_error(f"{message} - {entry['error']}")
+                else:
+                    print_success(message)
+    finally:
+        provider_warm_up = previous_warm_up
+    total_time = time.perf_counter() - batch_started
+
+    print_batch_summary(entries, total_time)
+
+    if args.report_path:
+        report = {
+            'started_at': started_at.isoformat(),
+            'duration': round(total_time, 3),
+            'provider': provider,
+            'model': model,
+            'workers': workers,
+            'summary': {status: sum(1 for entry in entries if entry['status'] == status)
+                        for status in batch_status_styles},
+            'repositories': sorted(entries, key=lambda entry: entry['path']),
+        }
+        if args.report_path == '-':
+            print(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            with open(args.report_path, 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+            print_info(f'Report written to {args.report_path}')
+
+    if any(entry['error'] for entry in entries):
+        sys.exit(1)
+
+
+def get_model_price(model_name):
+    """(input, output) price of a model in USD per million tokens, or None when it is unknown."""
+    for prices in (model_prices, default_model_prices):
+        matches = [name for name in prices if model_name and model_name.startswith(name)]
+        if matches:
+            return prices[max(matches, key=len)]
+    return None
+
+
+def estimate_request_cost(provider_name, model_name, input_tokens, cached_tokens, cache_write_tokens, output_tokens):
+    """Estimated cost of a provider request in USD, or None when the price of the model is unknown."""
+    price = get_model_price(model_name)
+    if price is None:
+        return None
+    input_price, output_price = price
+    cached_tokens = cached_tokens or 0
+    cache_write_tokens = cache_write_tokens or 0
+    billed_input = ((input_tokens or 0) - cached_tokens - cache_write_tokens
+                    + cached_tokens * cached_input_price_factors.get(provider_name, 1.0)
+                    + cache_write_tokens * cache_write_price_factors.get(provider_name, 1.0))
+    return (billed_input * input_price + (output_tokens or 0) * output_price) / 1_000_000
+
+
+def nearest_rank(values, percentile):
+    """Nearest-rank percentile of a non-empty list of numbers."""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * percentile // 100) - 1)]
+
+
+def format_cost(cost):
+    return '-' if cost is None else f'${cost:.4f}'
+
+
+def stats_main(argv):
+    parser = argparse.ArgumentParser(
+        prog='gitai stats',
+        description='Summarize the run history: latency percentiles per provider and model, phase durations, '
+                    'token trends and estimated cost.',
+        usage="gitai stats [--days 30] [--repo <path>]"
+    )
+    parser.add_argument('--days', type=int, default=30, help='Only include runs from the last N days (default: 30).')
+    parser.add_argument('--repo', type=str, default=None, help='Only include runs in this repository.')
+    args = parser.parse_args(argv)
+    if args.days < 1:
+        parser.error('--days must be a positive integer')
+
+    print_banner()
+    # Only the prices are read from the .env: the history can be summarized without provider credentials
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=env_path)
+    global model_prices
+    model_prices = parse_model_prices(os.getenv('MODEL_PRICES', ''))
+    if not os.path.exists(history_path):
+        print_info(f'No runs recorded yet in {history_path}.')
+        return
+
+    conditions = 'runs.started_at >= ?'
+    parameters = [time.time() - args.days * 86400]
+    if args.repo:
+        conditions += ' AND runs.repo = ?'
+        parameters.append(os.path.abspath(args.repo))
+    connection = open_history()
+    try:
+        runs = connection.execute(f'SELECT status, commits, cache_hits, cache_misses, retries FROM runs '
+                                  f'WHERE {conditions}', parameters).fetchall()
+        phases = connection.execute(f'SELECT phases.name, phases.seconds FROM phases JOIN runs ON runs.id = '
+                                    f'phases.run_id WHERE {conditions}', parameters).fetchall()
+        requests = connection.execute(
+            f'SELECT runs.started_at, requests.provider, requests.model, requests.seconds, requests.first_token_ms, '
+            f'requests.input_tokens, requests.cached_tokens, requests.cache_write_tokens, requests.output_tokens, '
+            f'requests.error FROM requests JOIN runs ON runs.id = requests.run_id WHERE {conditions}',
+            parameters).fetchall()
+    finally:
+        connection.close()
+
+    scope = f' in {os.path.abspath(args.repo)}' if args.repo else ''
+    print_header(f'Run history: last {args.days} day(s){scope}')
+    if not runs:
+        print_info('No runs recorded in this period.')
+        return
+    statuses = {}
+    for status, *_ in runs:
+        statuses[status] = statuses.get(status, 0) + 1
+    print_info(f'{len(runs)} run(s): ' + ', '.join(f'{count} {status}' for status, count in sorted(statuses.items()))
+               + f'; {sum(run[1] for run in runs)} commit(s)')
+    print_info(f'Response cache: {sum(run[2] for run in runs)} hit(s), {sum(run[3] for run in runs)} miss(es); '
+               f'{sum(run[4] for run in runs)} provider request retry(ies)')
+
+    by_model = {}
+    by_day = {}
+    unpriced = set()
+    for started_at, provider_name, model_name, seconds, first_token_ms, input_tokens, cached_tokens, \
+            cache_write_tokens, output_tokens, error in requests:
+        if error and error.startswith('RequestCancelled'):
+            # The losing side of a hedged race
+            continue
+        cost = estimate_request_cost(provider_name, model_name, input_tokens, cached_tokens, cache_write_tokens,
+                                     output_tokens)
+        if cost is None:
+            unpriced.add(model_name)
+        for totals in (by_model.setdefault(f'{provider_name}:{model_name}', {}),
+                       by_day.setdefault(datetime.fromtimestamp(started_at).strftime('%Y-%m-%d'), {})):
+            totals['requests'] = totals.get('requests', 0) + 1
+            totals['prompt'] = totals.get('prompt', 0) + (input_tokens or 0)
+            totals['cached'] = totals.get('cached', 0) + (cached_tokens or 0)
+            totals['completion'] = totals.get('completion', 0) + (output_tokens or 0)
+            totals['cost'] = None if cost is None or totals.get('cost', 0) is None else totals.get('cost', 0) + cost
+        totals = by_model[f'{provider_name}:{model_name}']
+        if error:
+            totals['errors'] = totals.get('errors', 0) + 1
+        else:
+            totals.setdefault('latencies', []).append(seconds)
+            if first_token_ms is not None:
+                totals.setdefault('first_tokens', []).append(first_token_ms / 1000)
+
+    if by_model:
+        print(f"\n{'Provider request latency':<40}{'Requests':>9}{'Errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+              f"{'TTFT p50':>10}")
+        for name, totals in sorted(by_model.items()):
+            latencies = totals.get('latencies')
+            percentiles = ''.join(f'{nearest_rank(latencies, p):>8.2f}s' if latencies else f"{'-':>9}"
+                                  for p in (50, 95, 99))
+            first_tokens = totals.get('first_tokens')
+            first_token = f'{nearest_rank(first_tokens, 50):>9.2f}s' if first_tokens else f"{'-':>10}"
+            print(f"{name:<40}{totals['requests']:>9}{totals.get('errors', 0):>8}{percentiles}{first_token}")
+
+    durations = {}
+    for name, seconds in phases:
+        durations.setdefault(name, []).append(seconds)
+    if durations:
+        print(f"\n{'Phase':<40}{'Runs':>9}{'':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            percentiles = ''.join(f'{nearest_rank(values, p):>8.2f}s' for p in (50, 95, 99))
+            print(f"{name:<40}{len(values):>9}{'':>8}{percentiles}")
+
+    if by_day:
+        print(f"\n{'Tokens per day':<40}{'Requests':>9}{'Prompt':>12}{'Cached':>8}{'Completion':>12}"
+              f"{'Est. cost':>12}")
+        for day, totals in sorted(by_day.items()):
+            cached_share = totals['cached'] / totals['prompt'] if totals['prompt'] else 0
+            print(f"{day:<40}{totals['requests']:>9}{totals['prompt']:>12,}{cached_share:>8.0%}"
+                  f"{totals['completion']:>12,}{format_cost(totals['cost']):>12}")
+
+        print(f"\n{'Estimated cost':<40}{'Requests':>9}{'Prompt':>12}{'':>8}{'Completion':>12}{'Total':>12}"
+              f"{'Per request':>13}")
+        for name, totals in sorted(by_model.items()):
+            per_request = None if totals['cost'] is None else totals['cost'] / totals['requests']
+            print(f"{name:<40}{totals['requests']:>9}{totals['prompt']:>12,}{'':>8}{totals['completion']:>12,}"
+                  f"{format_cost(totals['cost']):>12}{format_cost(per_request):>13}")
+    if unpriced:
+        print()
+        print_warning(f"No price known for {', '.join(sorted(map(str, unpriced)))}: set MODEL_PRICES in the .env file "
+                      f"(model=input/output, in USD per million tokens) to estimate its cost.")
+
+
+subcommands = {
+    'daemon': daemon_main,
+    'batch': batch_main,
+    'serve': serve_main,
+    'watch': watch_main,
+    'stats': stats_main,
+}
+
+
+def cli():
+    """Entry point: forward to a running daemon when possible, otherwise run in-process."""
+    # Initialize colorama for cross-platform colored output
+    init(autoreset=True)
+
+    argv = sys.argv[1:]
+    if not os.getenv('GITAI_NO_DAEMON') and not (argv and argv[0] in subcommands):
+        request = {'argv': argv, 'cwd': os.getcwd(), 'tty': sys.stdout.isatty()}
+        exit_code = send_daemon_request(request)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    main(argv)
+
+
 if __name__ == "__main__":
-    main()
+    cli()
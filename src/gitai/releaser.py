@@ -1,8 +1,10 @@
 import os
+import re
 import subprocess
 import sys
 from textwrap import dedent
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from dotenv import load_dotenv
@@ -14,21 +16,23 @@ provider = os.getenv('PROVIDER')
 model = os.getenv('MODEL')
 api_key = os.getenv('API_KEY')
 language = os.getenv('LANGUAGE')
+# Alternative endpoint, e.g. a proxy or the local stand-in in benchmarks/mock_provider.py
+base_url = os.getenv('PROVIDER_BASE_URL') or None
 
 if provider == 'openai':
     from openai import OpenAI
 
-    openai_client = OpenAI(api_key=api_key)
+    openai_client = OpenAI(api_key=api_key, base_url=base_url)
 
 elif provider == 'groq':
     from groq import Groq
 
-    groq_client = Groq(api_key=api_key)
+    groq_client = Groq(api_key=api_key, base_url=base_url)
 
 elif provider == 'anthropic':
     from anthropic import Anthropic
 
-    anthropic_client = Anthropic(api_key=api_key)
+    anthropic_client = Anthropic(api_key=api_key, base_url=base_url)
 
 else:
     print(f'Error: Provider {provider} not supported.')
@@ -36,6 +40,49 @@ else:
     sys.exit(1)
 
 
+def parse_positive_int(var, default):
+    """Read a positive integer from the environment, exiting with a clear message on invalid values."""
+    value = os.getenv(var)
+    if not value:
+        return default
+    if not value.isdigit() or int(value) < 1:
+        print(f'Error: The environment variable {var} must be a positive integer, got: {value}')
+        sys.exit(1)
+    return int(value)
+
+
+# Maximum number of commit tokens sent in a single request; larger ranges are summarized in batches (map-reduce)
+default_token_budgets = {'openai': 24000, 'groq': 6000, 'anthropic': 48000}
+token_budget = parse_positive_int('RELEASE_TOKEN_BUDGET', default_token_budgets[provider])
+map_reduce_concurrency = parse_positive_int('MAP_REDUCE_CONCURRENCY', 4)
+
+# The release notes of a map-reduce run cover many more changes than a regular release
+release_max_tokens = 1000
+large_release_max_tokens = 4000
+batch_summary_max_tokens = 1500
+
+
+# Conventional Commit subjects, as printed by get_commit_messages_since_tag ("<hash> <subject>")
+conventional_commit_pattern = re.compile(
+    r'^(?P<hash>\S+) (?P<type>[a-zA-Z]+)(?:\((?P<scope>[^()]*)\))?(?P<breaking>!)?: *(?P<description>\S.*)$')
+
+# Release notes category of each Conventional Commit type; other types are left to the model
+commit_type_categories = {
+    'feat': 'New Features',
+    'fix': 'Bug Fixes',
+    'docs': 'Other Changes',
+    'chore': 'Other Changes',
+    'refactor': 'Other Changes',
+    'perf': 'Other Changes',
+    'style': 'Other Changes',
+    'test': 'Other Changes',
+    'build': 'Other Changes',
+    'ci': 'Other Changes',
+    'revert': 'Other Changes',
+}
+release_categories = ['New Features', 'Bug Fixes', 'Other Changes']
+
+
 def run_git_command(command):
     """Executes a git command and returns its output."""
     try:
@@ -53,12 +100,166 @@ def get_commit_messages_since_tag(tag):
     return run_git_command(command).split('\n')
 
 
-def generate_release_notes(commits, new_version, tag):
-    """Generates release notes based on the provided commits."""
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token), good enough for budgeting requests."""
+    return len(text) // 4 + 1
+
+
+def batch_lines(lines, max_tokens, key=lambda line: line):
+    """Group lines into consecutive batches of at most max_tokens each (key returns the text of an item)."""
+    batches = []
+    current = []
+    current_tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(key(line) + '\n')
+        if current and current_tokens + line_tokens > max_tokens:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def classify_commits(commits):
+    """Bucket commits locally by their Conventional Commit type and scope.
+
+    Returns the categorized entries as (category, scope, item) tuples, sorted by
+    category and scope, and the commits that do not follow the convention.
+    """
+    categorized = []
+    uncategorized = []
+    for commit in commits:
+        match = conventional_commit_pattern.match(commit.strip())
+        category = match and commit_type_categories.get(match['type'].lower())
+        if not category:
+            uncategorized.append(commit)
+            continue
+        scope = (match['scope'] or '').strip()
+        item = f"- {f'**{scope}**: ' if scope else ''}{match['description'].strip()} ({match['hash']})"
+        if match['breaking']:
+            item += ' [BREAKING CHANGE]'
+        categorized.append((category, scope, item))
+    categorized.sort(key=lambda entry: (release_categories.index(entry[0]), entry[1]))
+    return categorized, uncategorized
+
+
+def format_categorized_commits(categorized):
+    """Format categorized entries as markdown sections, one per category."""
+    sections = []
+    for category in release_categories:
+        items = [item for entry_category, _, item in categorized if entry_category == category]
+        if items:
+            sections.append(f'### {category}\n' + '\n'.join(items))
+    return '\n\n'.join(sections)
+
+
+def summarize_commit_batch(commits, tag):
+    """Map step: categorize one batch of commits into partial release notes."""
+    prompt = dedent(f"""
+    Below is a batch of the commits made since the tag {tag}. It is one of several batches, so do not add any title,
+    introduction or conclusion.
+    Organize these commits into the following categories, in markdown, in the language '{language}':
+
+    ### New Features
+    - Description of new features (commits).
+
+    ### Bug Fixes
+    - Description of bug fixes (commits).
+
+    ### Other Changes
+    - Description of other changes (commits).
+
+    Rules:
+        - Group related commits into a single item and keep the short commit hashes of the item in parentheses.
+        - Leave out categories without changes.
+        - DO NOT add any additional comments or explanations.
+
+    Commits:
+    {chr(10).join(commits)}
+    """)
+    return call_provider_api(prompt, max_tokens=batch_summary_max_tokens)
+
+
+def merge_partial_notes(partial_notes):
+    """Reduce step: merge several categorized partial release notes into one."""
+    prompt = dedent(f"""
+    Below are partial release notes, each covering a consecutive range of commits.
+    Merge them into a single list with the categories New Features, Bug Fixes and Other Changes, in markdown, in the
+    language '{language}'. Combine duplicated or closely related items and keep their commit hashes.
+    DO NOT add any title, introduction, conclusion or additional comments.
+
+    Partial release notes:
+    {(chr(10) * 2).join(partial_notes)}
+    """)
+    return call_provider_api(prompt, max_tokens=batch_summary_max_tokens)
+
+
+def summarize_commits(commits, tag, local_notes=()):
+    """Summarize a commit range that does not fit in the token budget, batch by batch and concurrently.
+
+    Only the commits that could not be categorized locally are sent to the
+    model; local_notes (already categorized) join their partial notes in the
+    merge rounds.
+    """
+    batches = batch_lines(commits, token_budget)
+    print(f"Changes do not fit in a single request (budget {token_budget} tokens): categorizing {len(commits)} "
+          f"commits in {len(batches)} batch(es), up to {map_reduce_concurrency} at a time.")
+
+    with ThreadPoolExecutor(max_workers=map_reduce_concurrency) as executor:
+        partial_notes = list(local_notes) + list(executor.map(lambda batch: summarize_commit_batch(batch, tag),
+                                                              batches))
+
+        # Keep merging until the partial notes fit in the final request
+        while len(partial_notes) > 1 and estimate_tokens('\n\n'.join(partial_notes)) > token_budget:
+            groups = batch_lines(partial_notes, token_budget)
+            if len(groups) == len(partial_notes):
+                break
+            print(f"Merging {len(partial_notes)} partial release notes into {len(groups)}.")
+            partial_notes = list(executor.map(merge_partial_notes, groups))
+
+    return '\n\n'.join(partial_notes)
+
+
+def generate_release_notes(commits, new_version, tag, map_reduce=None):
+    """Generates release notes based on the provided commits.
+
+    Commits that follow the Conventional Commits standard are categorized
+    locally, so the model only categorizes the remaining ones and writes the
+    summary. When the changes do not fit in the token budget (or map_reduce is
+    True), the remaining commits are categorized in batches and the final notes
+    are written from the merged partial notes.
+    """
+    commit_lines = [line for line in commits.split('\n') if line.strip()]
+    categorized, uncategorized = classify_commits(commit_lines)
+    print(f"{len(categorized)} of {len(commit_lines)} commits categorized locally from their Conventional Commit "
+          f"prefix; {len(uncategorized)} left to the model.")
+
+    categorized_notes = format_categorized_commits(categorized)
+    if map_reduce is None:
+        map_reduce = estimate_tokens(categorized_notes + '\n'.join(uncategorized)) > token_budget
+
+    max_tokens = release_max_tokens
+    if map_reduce:
+        local_notes = [format_categorized_commits(batch)
+                       for batch in batch_lines(categorized, token_budget, key=lambda entry: entry[2])]
+        changes = "Categorized changes:\n" + summarize_commits(uncategorized, tag, local_notes)
+        max_tokens = large_release_max_tokens
+    else:
+        sections = []
+        if categorized:
+            sections.append("Changes already categorized from their Conventional Commit prefix:\n" + categorized_notes)
+        if uncategorized:
+            sections.append("Commits to categorize:\n" + '\n'.join(uncategorized))
+        changes = '\n\n'.join(sections)
+
     prompt = dedent(f"""
     You are an assistant that helps generate release notes for a Git repository.
-    Below are the commits since the last tag {tag}.
-    Please organize the commits into the following categories: New Features, Bug Fixes, and Other Changes.
+    Below are the changes since the last tag {tag}.
+    Please organize the changes into the following categories: New Features, Bug Fixes, and Other Changes.
+    Keep the changes that are already categorized in their category; only improve their wording and group related items.
     Generate a release message in markdown format in the language '{language}' using the following template:
 
     ```
@@ -79,8 +280,7 @@ def generate_release_notes(commits, new_version, tag):
     **Full Changelog:** [See commits for {new_version}](https://github.com/leandrosilvaferreira/gitai/compare/{tag}...{new_version})
     ```
 
-    Commits:
-    {commits}
+    {changes}
 
     Important rules:
         - The generated content must be in the language '{language}'.
@@ -93,10 +293,10 @@ def generate_release_notes(commits, new_version, tag):
     If the instructions are not followed correctly, the result will not be accepted.
     """)
 
-    return call_provider_api(prompt)
+    return call_provider_api(prompt, max_tokens=max_tokens)
 
 
-def call_provider_api(prompt):
+def call_provider_api(prompt, max_tokens=release_max_tokens):
     messages = [
         {
             "role": "system",
@@ -116,7 +316,7 @@ def call_provider_api(prompt):
                 messages=messages,
                 model=model,
                 temperature=1,
-                max_completion_tokens=1000,
+                max_completion_tokens=max_tokens,
                 top_p=1.0,
                 frequency_penalty=0.0,
                 presence_penalty=0.0)
@@ -126,7 +326,7 @@ def call_provider_api(prompt):
                 messages=messages,
                 model=model,
                 temperature=1,
-                max_tokens=1000,
+                max_tokens=max_tokens,
                 top_p=1.0,
                 frequency_penalty=0.0,
                 presence_penalty=0.0
@@ -135,7 +335,7 @@ def call_provider_api(prompt):
         case 'anthropic':
             response = anthropic_client.messages.create(
                 model=model,
-                max_tokens=1000,
+                max_tokens=max_tokens,
                 temperature=1,
                 system=messages[0]["content"],
                 messages=[{"role": "user", "content": messages[1]["content"]}]
@@ -150,17 +350,20 @@ def call_provider_api(prompt):
 def main():
     parser = argparse.ArgumentParser(
         description='Git release notes generator.',
-        usage="releaser.py <old_tag> <new_version>"
+        usage="releaser.py <old_tag> <new_version> [--[no-]map-reduce]"
     )
     parser.add_argument('old_tag', type=str, help='The old Git tag.')
     parser.add_argument('new_version', type=str, help='The new release version.')
+    parser.add_argument('--map-reduce', action=argparse.BooleanOptionalAction, default=None,
+                        help='Summarize the commits in batches before writing the notes. '
+                             'By default, only when they do not fit in RELEASE_TOKEN_BUDGET.')
 
     args = parser.parse_args()
 
     commits = get_commit_messages_since_tag(args.old_tag)
     formatted_commits = '\n'.join(commits)
 
-    release_notes = generate_release_notes(formatted_commits, args.new_version, args.old_tag)
+    release_notes = generate_release_notes(formatted_commits, args.new_version, args.old_tag, args.map_reduce)
 
     release_filename = os.path.join('dist', f"release_{args.new_version}.md")
     os.makedirs('dist', exist_ok=True)  # Ensure the 'dist' folder exists
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'gitai'))
+
+import gitai  # noqa: E402
+
+
+def git(repo, *args):
+    """Run a git command in repo and return its standard output."""
+    return subprocess.run(['git', *args], cwd=repo, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """An empty repository that gitai's git helpers run in."""
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    git(repo, 'init', '-q', '-b', 'main')
+    git(repo, 'config', 'user.name', 'Test')
+    git(repo, 'config', 'user.email', 'test@example.com')
+    git(repo, 'config', 'commit.gpgsign', 'false')
+    token = gitai.current_repo_path.set(str(repo))
+    yield repo
+    gitai.current_repo_path.reset(token)
@@ -0,0 +1,52 @@
+import sys
+from contextlib import redirect_stdout
+
+from conftest import git
+import gitai
+
+
+def run_batch_repo(repo, monkeypatch, push, trace_path=None):
+    monkeypatch.setattr(gitai, 'language', 'en')
+    monkeypatch.setattr(gitai, 'record_history', False)
+    with redirect_stdout(gitai.ContextOutput(sys.stdout)):
+        return gitai.run_batch_repo(str(repo), 'Rename', push, trace_path)
+
+
+def test_commits_made_before_a_failed_pull_are_reported(git_repo, monkeypatch):
+    (git_repo / 'a.txt').write_text('content\n')
+    git(git_repo, 'add', 'a.txt')
+    git(git_repo, 'commit', '-q', '-m', 'add a.txt')
+    # A pure rename takes the fast path, so no provider is needed; the pull then fails without an upstream
+    git(git_repo, 'mv', 'a.txt', 'b.txt')
+
+    entry = run_batch_repo(git_repo, monkeypatch, push=True, trace_path=str(git_repo.parent / 'trace.json'))
+
+    assert entry['status'] == 'push_failed'
+    assert len(list(git_repo.parent.glob('trace-*repo.json'))) == 1
+    assert [commit.splitlines()[0] for commit in entry['commits']] == ['chore: rename a.txt to b.txt']
+    assert 'git pull' in entry['error']
+    assert git(git_repo, 'log', '-1', '--format=%s').strip() == 'chore: rename a.txt to b.txt'
+
+
+def test_failure_before_any_commit_is_failed(tmp_path, monkeypatch):
+    entry = run_batch_repo(tmp_path / 'missing', monkeypatch, push=False)
+
+    assert entry['status'] == 'failed'
+    assert entry['commits'] == []
+    assert 'does not exist' in entry['error']
+
+
+def test_run_status():
+    assert gitai.get_run_status({'commits': ['feat: x'], 'pushed': True}, False) == 'pushed'
+    assert gitai.get_run_status({'commits': ['feat: x'], 'pushed': False}, False) == 'committed'
+    assert gitai.get_run_status({'commits': [], 'pushed': False}, False) == 'up to date'
+    assert gitai.get_run_status({'commits': ['feat: x'], 'pushed': False}, True) == 'push_failed'
+    assert gitai.get_run_status({'commits': [], 'pushed': False}, True) == 'failed'
+
+
+def test_batch_trace_paths_are_named_after_the_repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert gitai.get_batch_trace_path('out/trace.json', 'services/api') == 'out/trace-services_api.json'
+    assert gitai.get_batch_trace_path('trace', 'lib') == 'trace-lib.json'
+    assert gitai.get_batch_trace_path(None, 'lib') is None
@@ -0,0 +1,31 @@
+import gitai
+
+
+def mode_change(index):
+    return f'diff --git a/bin/tool_{index}.sh b/bin/tool_{index}.sh\nold mode 100644\nnew mode 100755\n'
+
+
+def edit(index, lines=10):
+    body = ''.join(f'+def handler_{index}_{line}():\n' for line in range(lines))
+    return (f'diff --git a/src/module_{index}.py b/src/module_{index}.py\n'
+            f'--- a/src/module_{index}.py\n+++ b/src/module_{index}.py\n@@ -0,0 +1,{lines} @@\n{body}')
+
+
+def test_hunkless_headers_count_against_the_budget():
+    diff = edit(0) + ''.join(mode_change(index) for index in range(200))
+    budget = gitai.estimate_tokens(edit(0)) + 5 * gitai.estimate_tokens(mode_change(0))
+
+    reduced, _ = gitai.rank_hunks_to_budget(diff, budget)
+
+    assert gitai.estimate_tokens(reduced) <= budget
+    assert reduced.count('new mode 100755') == 5
+
+
+def test_most_important_hunks_are_kept_in_order():
+    diff = edit(1, lines=4) + edit(2, lines=400)
+    budget = gitai.estimate_tokens(edit(1, lines=4)) + 10
+
+    reduced, omitted = gitai.rank_hunks_to_budget(diff, budget)
+
+    assert reduced == edit(1, lines=4)
+    assert omitted == {'src/module_2.py': 1}
@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import git
+import gitai
+
+
+@pytest.mark.parametrize('language', ['en', 'EN', 'English', 'inglês', 'en_US', 'en-GB', 'en_US.UTF-8'])
+def test_english_language_values(language):
+    assert gitai.get_fast_path_templates(language) is gitai.fast_path_templates['en']
+
+
+@pytest.mark.parametrize('language', ['pt', 'pt_BR', 'pt-PT', 'Portuguese', 'Português', 'portugues',
+                                      'Português (Brasil)', 'Brazilian Portuguese'])
+def test_portuguese_language_values(language):
+    assert gitai.get_fast_path_templates(language) is gitai.fast_path_templates['pt']
+
+
+@pytest.mark.parametrize('language', ['Polish', 'po', 'es', 'Spanish', '', None])
+def test_languages_without_local_messages(language):
+    assert gitai.get_fast_path_templates(language) is None
+
+
+def commit_file(repo, name, content):
+    (repo / name).write_text(content)
+    git(repo, 'add', name)
+    git(repo, 'commit', '-q', '-m', f'add {name}')
+
+
+def test_trailing_whitespace_and_blank_lines_are_whitespace_only(git_repo):
+    commit_file(git_repo, 'app.py', 'def f(x):\n    return x\n')
+    (git_repo / 'app.py').write_text('def f(x):   \r\n\n    return x\n\n')
+
+    assert gitai.has_only_whitespace_changes(['app.py'])
+
+
+def test_reindenting_python_is_a_real_change(git_repo):
+    commit_file(git_repo, 'app.py', 'def f(x):\n    if x:\n        x += 1\n        return x\n    return 0\n')
+    (git_repo / 'app.py').write_text('def f(x):\n    if x:\n        x += 1\n    return x\n    return 0\n')
+
+    assert not gitai.has_only_whitespace_changes(['app.py'])
+
+
+def test_reindenting_yaml_is_a_real_change(git_repo):
+    commit_file(git_repo, 'ci.yml', 'jobs:\n  test:\n    steps: []\n')
+    (git_repo / 'ci.yml').write_text('jobs:\n  test:\nsteps: []\n')
+
+    assert not gitai.has_only_whitespace_changes(['ci.yml'])
@@ -0,0 +1,57 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import gitai
+
+
+@pytest.fixture
+def hedged(monkeypatch):
+    """Primary and hedge providers whose requests are recorded instead of sent."""
+    monkeypatch.setattr(gitai, 'provider', 'openai')
+    monkeypatch.setattr(gitai, 'model', 'gpt-4o-mini')
+    monkeypatch.setattr(gitai, 'hedge_provider', 'anthropic')
+    monkeypatch.setattr(gitai, 'hedge_model', 'claude-3-5-haiku')
+    monkeypatch.setattr(gitai, 'hedge_delay', 0.1)
+    monkeypatch.setattr(gitai, 'latency_percentile', lambda *args: None)
+    calls = SimpleNamespace(requests=[], cancelled=[], delays={'openai': 0.05, 'anthropic': 5})
+
+    def request_with_retries(provider_name, model_name, prompt, system_prompt, max_tokens, on_token, timing,
+                             cancel_event=None, prompt_prefix=None):
+        calls.requests.append(provider_name)
+        if cancel_event.wait(calls.delays[provider_name]):
+            calls.cancelled.append(provider_name)
+            raise gitai.RequestCancelled()
+        return f'feat: message from {provider_name}'
+
+    monkeypatch.setattr(gitai, 'request_with_retries', request_with_retries)
+    return calls
+
+
+def test_cold_client_setup_does_not_trigger_the_hedge(hedged, monkeypatch):
+    # Only the primary SDK is cold
+    monkeypatch.setattr(gitai, 'get_provider_client',
+                        lambda provider_name=None: time.sleep(0.3 if provider_name == 'openai' else 0))
+
+    text = gitai.race_providers('prompt', None, 100, None)
+
+    assert text == 'feat: message from openai'
+    assert hedged.requests == ['openai']
+
+
+def test_cancel_event_stops_the_race_before_the_hedge(hedged, monkeypatch):
+    monkeypatch.setattr(gitai, 'get_provider_client', lambda provider_name=None: None)
+    hedged.delays['openai'] = 5
+    cancel_event = threading.Event()
+    threading.Timer(0.05, cancel_event.set).start()
+
+    started = time.perf_counter()
+    with pytest.raises(gitai.RequestCancelled):
+        gitai.race_providers('prompt', None, 100, None, cancel_event=cancel_event)
+
+    assert time.perf_counter() - started < 1
+    assert hedged.requests == ['openai']
+    time.sleep(0.1)
+    assert hedged.cancelled == ['openai']
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+
+import gitai
+
+
+def test_cache_minimum_depends_on_provider_and_model():
+    assert gitai.get_prompt_cache_min_tokens('openai', 'gpt-4o-mini') == 1024
+    assert gitai.get_prompt_cache_min_tokens('anthropic', 'claude-sonnet-4-20250514') == 1024
+    assert gitai.get_prompt_cache_min_tokens('anthropic', 'claude-3-5-haiku-latest') == 2048
+    assert gitai.get_prompt_cache_min_tokens('groq', 'llama-3.1-8b-instant') is None
+
+
+def test_prefix_must_clearly_exceed_the_minimum():
+    assert not gitai.is_prefix_cacheable('anthropic', 'claude-sonnet-4', 'x' * 4 * 1024)
+    assert gitai.is_prefix_cacheable('anthropic', 'claude-sonnet-4', 'x' * 4 * 1200)
+    assert not gitai.is_prefix_cacheable('anthropic', 'claude-3-haiku', 'x' * 4 * 1200)
+    assert not gitai.is_prefix_cacheable('groq', 'llama3-8b-8192', 'x' * 4 * 5000)
+
+
+@pytest.mark.parametrize('language', ['en', 'pt_BR'])
+def test_default_commit_prompt_is_cacheable(language):
+    static_text = gitai.commit_system_prompt + gitai.build_commit_prompt_prefix(language)
+
+    assert gitai.is_prefix_cacheable('anthropic', 'claude-sonnet-4-20250514', static_text)
+    assert gitai.is_prefix_cacheable('openai', 'gpt-4o-mini', static_text)
+
+
+def test_commit_prompt_sets_the_anthropic_breakpoint(monkeypatch):
+    requests = []
+
+    class Messages:
+        def create(self, **kwargs):
+            requests.append(kwargs)
+            usage = SimpleNamespace(input_tokens=10, cache_read_input_tokens=0, cache_creation_input_tokens=0,
+                                    output_tokens=5)
+            return SimpleNamespace(content=[SimpleNamespace(text='feat: x')], usage=usage)
+
+    monkeypatch.setattr(gitai, 'get_provider_client', lambda provider_name=None: SimpleNamespace(messages=Messages()))
+
+    gitai.request_completion('anthropic', 'claude-sonnet-4-20250514', 'diff', None, 100, None, {},
+                             prompt_prefix=gitai.build_commit_prompt_prefix('en'))
+
+    prefix, variable = requests[0]['messages'][0]['content']
+    assert prefix['cache_control'] == {'type': 'ephemeral'}
+    assert variable == {'type': 'text', 'text': 'diff'}
+    assert requests[0]['system'] == gitai.commit_system_prompt
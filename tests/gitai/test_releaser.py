@@ -0,0 +1,52 @@
+import os
+
+# releaser creates its provider client on import
+os.environ.setdefault('PROVIDER', 'openai')
+os.environ.setdefault('API_KEY', 'test')
+
+import releaser  # noqa: E402
+
+
+def test_commits_are_bucketed_by_type_and_sorted_by_scope():
+    categorized, uncategorized = releaser.classify_commits([
+        'a1 fix(ui): align the header',
+        'b2 feat: add export',
+        'c3 chore(deps): bump requests',
+        'd4 feat(api): add pagination',
+        'e5 Merge branch main',
+        'f6 wip: experiments',
+    ])
+
+    assert categorized == [
+        ('New Features', '', '- add export (b2)'),
+        ('New Features', 'api', '- **api**: add pagination (d4)'),
+        ('Bug Fixes', 'ui', '- **ui**: align the header (a1)'),
+        ('Other Changes', 'deps', '- **deps**: bump requests (c3)'),
+    ]
+    assert uncategorized == ['e5 Merge branch main', 'f6 wip: experiments']
+
+
+def test_breaking_changes_and_uppercase_types():
+    categorized, uncategorized = releaser.classify_commits(['a1 FEAT(core)!:  drop Python 3.8 support\n'])
+
+    assert categorized == [('New Features', 'core', '- **core**: drop Python 3.8 support (a1) [BREAKING CHANGE]')]
+    assert uncategorized == []
+
+
+def test_commits_without_description_are_left_to_the_model():
+    _, uncategorized = releaser.classify_commits(['a1 fix:', 'b2 fix(): '])
+
+    assert uncategorized == ['a1 fix:', 'b2 fix(): ']
+
+
+def test_format_categorized_commits_skips_empty_categories():
+    categorized, _ = releaser.classify_commits(['a1 docs: update the README', 'b2 feat: add export'])
+
+    assert releaser.format_categorized_commits(categorized) == (
+        '### New Features\n- add export (b2)\n\n'
+        '### Other Changes\n- update the README (a1)'
+    )
+
+
+def test_format_categorized_commits_of_nothing_is_empty():
+    assert releaser.format_categorized_commits([]) == ''
@@ -0,0 +1,78 @@
+import asyncio
+
+from conftest import git
+import gitai
+
+OID = 'a' * 40
+
+
+def status(*records):
+    return '\0'.join(records) + '\0'
+
+
+def test_branch_with_upstream_and_divergence():
+    state = gitai.parse_repo_state(status(f'# branch.oid {OID}', '# branch.head main',
+                                          '# branch.upstream origin/main', '# branch.ab +2 -3'))
+
+    assert state.branch == 'main'
+    assert state.upstream == 'origin/main'
+    assert (state.ahead, state.behind) == (2, 3)
+    assert not state.has_changes
+
+
+def test_missing_upstream_leaves_defaults():
+    state = gitai.parse_repo_state(status(f'# branch.oid {OID}', '# branch.head feature'))
+
+    assert state.branch == 'feature'
+    assert state.upstream is None
+    assert (state.ahead, state.behind) == (0, 0)
+
+
+def test_detached_head_has_no_branch():
+    state = gitai.parse_repo_state(status(f'# branch.oid {OID}', '# branch.head (detached)'))
+
+    assert state.branch is None
+
+
+def test_ordinary_changes_keep_spaces_in_paths():
+    state = gitai.parse_repo_state(status(f'1 .M N... 100644 100644 100644 {OID} {OID} src/app.py',
+                                          f'1 A. N... 000000 100644 100644 {"0" * 40} {OID} docs/read me.md'))
+
+    assert state.changed_paths == ['src/app.py', 'docs/read me.md']
+    assert state.has_changes
+
+
+def test_rename_skips_the_original_path_record():
+    state = gitai.parse_repo_state(status(f'2 R. N... 100644 100644 100644 {OID} {OID} R100 new name.py',
+                                          'old name.py', '? notes.txt'))
+
+    assert state.changed_paths == ['new name.py']
+    assert state.untracked_paths == ['notes.txt']
+
+
+def test_unmerged_and_untracked_entries():
+    state = gitai.parse_repo_state(status(f'u UU N... 100644 100644 100644 100644 {OID} {OID} {OID} conflict.py',
+                                          '? new dir/', '? b.txt'))
+
+    assert state.conflicted_paths == ['conflict.py']
+    assert state.untracked_paths == ['new dir/', 'b.txt']
+    assert state.changed_paths == []
+    assert state.has_changes
+
+
+def test_matches_real_git_status(git_repo):
+    (git_repo / 'kept.py').write_text('a = 1\n')
+    (git_repo / 'moved.py').write_text('b = 2\n' * 20)
+    git(git_repo, 'add', '.')
+    git(git_repo, 'commit', '-q', '-m', 'initial')
+    (git_repo / 'kept.py').write_text('a = 2\n')
+    git(git_repo, 'mv', 'moved.py', 'renamed.py')
+    (git_repo / 'untracked.txt').write_text('new\n')
+
+    state = asyncio.run(gitai.get_repo_state())
+
+    assert state.branch == 'main'
+    assert state.upstream is None
+    assert sorted(state.changed_paths) == ['kept.py', 'renamed.py']
+    assert state.untracked_paths == ['untracked.txt']
+    assert state.conflicted_paths == []
@@ -0,0 +1,23 @@
+import contextvars
+
+import gitai
+
+
+def test_cache_counters_are_not_shared_between_contexts():
+    def run(hits):
+        stats = {'hits': 0, 'misses': 0}
+        gitai.cache_stats.set(stats)
+        for _ in range(hits):
+            gitai.count_cache_result('hits')
+        return stats
+
+    assert contextvars.copy_context().run(run, 2) == {'hits': 2, 'misses': 0}
+    assert contextvars.copy_context().run(run, 1) == {'hits': 1, 'misses': 0}
+
+
+def test_results_are_not_counted_without_counters():
+    # A fresh context, like a server thread that never set its counters
+    context = contextvars.Context()
+    context.run(gitai.count_cache_result, 'misses')
+
+    assert context.run(gitai.cache_stats.get) is None
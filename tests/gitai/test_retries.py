@@ -0,0 +1,80 @@
+import os
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import pytest
+
+import gitai
+
+
+def retry_after(**headers):
+    return gitai.get_retry_after(SimpleNamespace(response=SimpleNamespace(headers=headers)))
+
+
+def test_retry_after_in_seconds_and_milliseconds():
+    assert retry_after(**{'retry-after': '7'}) == 7.0
+    assert retry_after(**{'retry-after': '1.5'}) == 1.5
+    assert retry_after(**{'retry-after-ms': '250', 'retry-after': '7'}) == 0.25
+
+
+def test_retry_after_as_http_date():
+    wait = retry_after(**{'retry-after': formatdate(time.time() + 30, usegmt=True)})
+
+    assert 28 <= wait <= 30
+
+
+def test_past_http_date_does_not_wait():
+    assert retry_after(**{'retry-after': formatdate(time.time() - 30, usegmt=True)}) == 0.0
+
+
+def test_reset_of_the_exhausted_limit_wins():
+    headers = {'x-ratelimit-reset-requests': '2s', 'x-ratelimit-reset-tokens': '6m0s',
+               'x-ratelimit-remaining-requests': '0', 'x-ratelimit-remaining-tokens': '1200'}
+
+    assert retry_after(**headers) == 2.0
+
+
+def test_without_remaining_counts_the_longest_reset_wins():
+    assert retry_after(**{'x-ratelimit-reset-requests': '20ms', 'x-ratelimit-reset-tokens': '1h2m3.5s'}) == 3723.5
+
+
+def test_no_headers_or_unparseable_values():
+    assert gitai.get_retry_after(Exception()) is None
+    assert retry_after() is None
+    assert retry_after(**{'retry-after': 'soon', 'x-ratelimit-reset-requests': 'later'}) is None
+
+
+def test_max_retries_accepts_zero(monkeypatch):
+    monkeypatch.setenv('PROVIDER_MAX_RETRIES', '0')
+
+    assert gitai.parse_non_negative_int('PROVIDER_MAX_RETRIES', 4) == 0
+
+
+def test_max_retries_rejects_negative_values(monkeypatch):
+    monkeypatch.setenv('PROVIDER_MAX_RETRIES', '-1')
+
+    with pytest.raises(SystemExit):
+        gitai.parse_non_negative_int('PROVIDER_MAX_RETRIES', 4)
+
+
+def test_rate_limiter_without_a_limit_touches_no_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(gitai, 'gitai_home', str(tmp_path))
+    limiter = gitai.RateLimiter('openai')
+
+    limiter.acquire()
+    limiter.pause(0.05)
+    started = time.time()
+    limiter.acquire()
+
+    assert time.time() - started >= 0.04
+    assert not os.path.exists(limiter.state_path)
+
+
+def test_rate_limiter_with_a_limit_shares_its_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(gitai, 'gitai_home', str(tmp_path))
+    limiter = gitai.RateLimiter('openai', requests_per_minute=600)
+
+    limiter.acquire()
+
+    assert os.path.exists(limiter.state_path)
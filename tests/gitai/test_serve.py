@@ -0,0 +1,52 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import gitai
+
+
+@pytest.fixture
+def server():
+    """A `gitai serve` handler listening on a free local port."""
+    handler = gitai.create_serve_handler(gitai.CommitMessageService(1, 1), {'127.0.0.1'})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(server, content_length, body=b''):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+    connection.putrequest('POST', '/v1/commit-message')
+    connection.putheader('Content-Type', 'application/json')
+    connection.putheader('Content-Length', content_length)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read())
+    connection.close()
+    return result
+
+
+@pytest.mark.parametrize('content_length', ['abc', '-5', '1.5'])
+def test_malformed_content_length_is_rejected(server, content_length):
+    status, body = post(server, content_length)
+
+    assert status == 400
+    assert 'Content-Length' in body['error']
+
+
+def test_oversized_request_is_rejected_without_reading_it(server):
+    status, body = post(server, str(gitai.serve_max_request_mb * 1024 * 1024 + 1))
+
+    assert status == 413
+
+
+def test_valid_request_still_reaches_the_endpoint(server):
+    status, body = post(server, '2', b'[]')
+
+    assert status == 400
+    assert body['error'] == 'The request must be a JSON object'
@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import git
+import gitai
+
+
+def changed(path, old_path=None):
+    return {'path': path, 'old_path': old_path, 'added': 1, 'deleted': 0, 'binary': False}
+
+
+def group_paths(groups):
+    return [group.paths for group in groups]
+
+
+@pytest.mark.parametrize('path, subject', [
+    ('tests/test_models.py', 'models'),
+    ('pkg/models_test.go', 'models'),
+    ('src/Button.test.tsx', 'Button'),
+    ('src/app.spec.ts', 'app'),
+    ('src/models.py', None),
+])
+def test_test_subject(path, subject):
+    assert gitai.get_test_subject(path) == subject
+
+
+def test_groups_by_area_test_subject_and_dependencies(git_repo):
+    numstat = [changed(path) for path in ('README.md', 'package-lock.json', 'package.json', 'src/app/models.py',
+                                          'tests/test_models.py', 'web/ui/view.ts')]
+
+    groups = gitai.group_changes(numstat, [])
+
+    assert group_paths(groups) == [['package-lock.json', 'package.json'],
+                                   ['src/app/models.py', 'tests/test_models.py'],
+                                   ['web/ui/view.ts'],
+                                   ['README.md']]
+
+
+def test_untracked_files_and_renames_are_grouped(git_repo):
+    groups = gitai.group_changes([changed('src/core/new_name.py', old_path='src/core/old_name.py')],
+                                 ['src/core/helpers.py', 'docs/'])
+
+    assert group_paths(groups) == [['src/core/new_name.py', 'src/core/helpers.py', 'src/core/old_name.py'],
+                                   ['docs/']]
+
+
+def test_files_usually_committed_together_are_grouped(git_repo):
+    for index in range(2):
+        for path in ('api/handlers.py', 'client/calls.go'):
+            (git_repo / path).parent.mkdir(exist_ok=True)
+            (git_repo / path).write_text(f'{index}\n')
+        git(git_repo, 'add', '-A')
+        git(git_repo, 'commit', '-q', '-m', f'change {index}')
+    (git_repo / 'lib').mkdir()
+    (git_repo / 'lib/tool.rb').write_text('puts 1\n')
+    git(git_repo, 'add', '-A')
+    git(git_repo, 'commit', '-q', '-m', 'add tool')
+
+    numstat = [changed(path) for path in ('api/handlers.py', 'client/calls.go', 'lib/tool.rb')]
+    counts, pairs = gitai.get_co_change_counts([entry['path'] for entry in numstat])
+    groups = gitai.group_changes(numstat, [])
+
+    assert counts['api/handlers.py'] == 2 and counts['lib/tool.rb'] == 1
+    assert pairs[('api/handlers.py', 'client/calls.go')] == 2
+    assert group_paths(groups) == [['api/handlers.py', 'client/calls.go'], ['lib/tool.rb']]
+
+
+def test_smallest_groups_beyond_the_limit_are_merged(git_repo, monkeypatch):
+    monkeypatch.setattr(gitai, 'max_split_groups', 2)
+    numstat = [changed(path) for path in ('a/one.py', 'a/two.py', 'b/three.go', 'c/four.rb')]
+
+    groups = gitai.group_changes(numstat, [])
+
+    assert group_paths(groups) == [['a/one.py', 'a/two.py'], ['b/three.go', 'c/four.rb']]
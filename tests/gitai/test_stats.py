@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+import gitai
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    """An empty history location, with no provider settings in the environment or the .env file."""
+    monkeypatch.setattr(gitai, 'gitai_home', str(tmp_path))
+    monkeypatch.setattr(gitai, 'history_path', str(tmp_path / 'history.sqlite3'))
+    monkeypatch.setattr(gitai, 'env_path', str(tmp_path / '.env'))
+    for var in ('PROVIDER', 'MODEL', 'API_KEY', 'LANGUAGE', 'MODEL_PRICES'):
+        monkeypatch.delenv(var, raising=False)
+    return tmp_path
+
+
+def test_stats_without_history_or_settings(history, capsys):
+    gitai.stats_main([])
+
+    assert 'No runs recorded yet' in capsys.readouterr().out
+
+
+def test_stats_summarize_recorded_runs_without_settings(history, monkeypatch, capsys):
+    monkeypatch.setattr(gitai, 'provider', 'openai')
+    monkeypatch.setattr(gitai, 'model', 'gpt-4o-mini')
+    started = time.perf_counter()
+    request = gitai.Span('openai request', 'provider', started, started + 1.5,
+                         args={'model': 'gpt-4o-mini', 'input_tokens': 1200, 'cached_tokens': 0,
+                               'cache_write_tokens': 0, 'output_tokens': 80})
+    spans_token = gitai.trace_spans.set([request])
+    stats_token = gitai.cache_stats.set({'hits': 0, 'misses': 1})
+    try:
+        gitai.record_run(time.time(), started, {'pushed': False, 'commits': ['abc123']}, 'committed', None)
+    finally:
+        gitai.trace_spans.reset(spans_token)
+        gitai.cache_stats.reset(stats_token)
+    monkeypatch.setattr(gitai, 'provider', None)
+    monkeypatch.setattr(gitai, 'model', None)
+
+    gitai.stats_main(['--days', '1'])
+
+    output = capsys.readouterr().out
+    assert 'openai:gpt-4o-mini' in output
+    assert '1,200' in output